@@ -0,0 +1,30 @@
+"""
+Narzędzie kopii zapasowych.
+
+Silnik (backup.engine) nie importuje tkinter ani winreg, więc można go używać
+na serwerach i w skryptach; GUI jest w backup.backup, a CLI/demon w `python -m backup`.
+"""
+from .engine import (
+    BackupHandler,
+    CopyStats,
+    EventCoalescer,
+    DEFAULT_COPY_WORKERS,
+    copy_files,
+    copy_files_incremental,
+    copy_paths,
+    delta_copy,
+    backup_to_store,
+    backup_to_archive,
+    restore_from_archive,
+    restore_snapshot,
+    verify_store,
+    verify_snapshot,
+    list_store_snapshots,
+    find_previous_snapshot,
+    list_snapshots,
+    RetentionPolicy,
+    Pruner,
+    start_watching,
+    stop_watching,
+)
+from .metrics import BackupMetrics, JsonLinesWriter, serve_prometheus
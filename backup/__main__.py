@@ -0,0 +1,260 @@
+"""
+CLI / demon kopii zapasowych bez GUI.
+
+    python -m backup                                   # okno (Tkinter)
+    python -m backup run SRC DST --once                # jedna migawka i koniec
+    python -m backup run SRC DST --watch               # tryb obserwacji zmian ('automatic')
+    python -m backup run SRC DST --at 17:00            # codziennie o HH:MM ('interval')
+    python -m backup run SRC DST --once --archive tar.zst   # migawka jako jedno archiwum
+    python -m backup restore DST SNAPSHOT TARGET [--path a/b ...]   # SNAPSHOT: migawka magazynu lub plik archiwum
+    python -m backup verify DST [--snapshot NAME]                     # bloki magazynu
+    python -m backup verify DST --snapshot backup_… --src SRC         # migawka-folder vs źródło
+    python -m backup run SRC DST --watch --metrics-jsonl m.jsonl --prometheus-port 9469   # metryki
+    python -m backup prune DST --keep-last 7 --daily 14 --weekly 8 --monthly 12 --max-size 500G [--dry-run]
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+from .engine import (BackupHandler, DEFAULT_COPY_WORKERS, ARCHIVE_FORMATS, start_watching, stop_watching,
+                     restore_snapshot, restore_from_archive, verify_store, verify_snapshot, list_store_snapshots,
+                     RetentionPolicy, Pruner)
+from .metrics import BackupMetrics, JsonLinesWriter, serve_prometheus
+
+log = logging.getLogger('backup')
+
+# Standardowe atrybuty LogRecord – wszystko poza nimi to pola przekazane przez extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Jedna linia JSON na komunikat (dla journald / zbieraczy logów)."""
+    def format(self, record):
+        data = {
+            'ts': datetime.datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        data.update({k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS})
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def setup_logging(fmt, log_file=None, level=logging.INFO):
+    handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+    if fmt == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    log.addHandler(handler)
+    log.setLevel(level)
+
+
+def parse_hhmm(value):
+    try:
+        return datetime.datetime.strptime(value, '%H:%M').time()
+    except ValueError:
+        raise argparse.ArgumentTypeError("czas musi mieć format HH:MM")
+
+
+def parse_size(value):
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = value.strip().upper().rstrip('B')
+    unit = value[-1:] if value[-1:] in units else ''
+    try:
+        return int(float(value[:len(value) - len(unit)]) * units[unit])
+    except ValueError:
+        raise argparse.ArgumentTypeError("rozmiar w formacie np. 500G, 1.5T, 200M")
+
+
+def retention_from_args(args):
+    return RetentionPolicy(keep_last=args.keep_last, hourly=args.hourly, daily=args.daily,
+                           weekly=args.weekly, monthly=args.monthly, max_total_size=args.max_size)
+
+
+def add_retention_args(parser):
+    group = parser.add_argument_group("retencja (usuwanie starych migawek)")
+    group.add_argument('--keep-last', type=int, default=0, metavar='N')
+    group.add_argument('--hourly', type=int, default=0, metavar='N')
+    group.add_argument('--daily', type=int, default=0, metavar='N')
+    group.add_argument('--weekly', type=int, default=0, metavar='N')
+    group.add_argument('--monthly', type=int, default=0, metavar='N')
+    group.add_argument('--max-size', type=parse_size, metavar='SIZE', help="np. 500G")
+    group.add_argument('--prune-rate', type=float, default=200, metavar='N/s',
+                       help="limit usuwanych plików na sekundę (0 = bez limitu)")
+
+
+def wait_for_signal():
+    # Demon działa do SIGINT/SIGTERM (Ctrl+C, systemctl stop)
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+    while not stop.wait(1.0):
+        pass
+
+
+def metrics_from_args(args):
+    if not args.metrics_jsonl and args.prometheus_port is None:
+        return None
+    metrics = BackupMetrics()
+    if args.metrics_jsonl:
+        metrics.subscribe(JsonLinesWriter(args.metrics_jsonl))
+    if args.prometheus_port is not None:
+        serve_prometheus(metrics, args.prometheus_port, host=args.prometheus_host)
+    return metrics
+
+
+def cmd_run(args):
+    mode = 'interval' if args.at else 'automatic'
+    metrics = metrics_from_args(args)
+    handler = BackupHandler(args.src, args.dst, mode, args.at,
+                            incremental=args.incremental, use_hash=args.hash,
+                            quiet_window=args.quiet_window, workers=args.workers, dedupe=args.dedupe,
+                            archive=args.archive, retention=retention_from_args(args), delta=args.delta,
+                            verify=args.verify, observer=metrics.emit if metrics else None)
+    if handler.pruner:
+        handler.pruner.limiter.rate = args.prune_rate
+    if args.once:
+        stats = handler.perform_backup()
+        if handler.pruner:
+            handler.pruner.run_once()
+        report = stats.verify_report if stats is not None else None
+        failed = report and (report['mismatches'] or report['missing'] or report['errors']
+                             or report['permission_errors'])
+        return 1 if stats is None or stats.errors or failed else 0
+
+    if args.at:
+        handler.start_backup_thread()
+        observer = None
+    else:
+        observer = start_watching(handler)
+    log.info("Tworzenie kopii zapasowej uruchomione.", extra={'mode': mode})
+    try:
+        wait_for_signal()
+    finally:
+        stop_watching(handler, observer)
+        log.info("Tworzenie kopii zapasowej zatrzymane.")
+    return 0
+
+
+def cmd_restore(args):
+    archive_path = os.path.join(args.dst, args.snapshot)
+    if args.snapshot.endswith(tuple('.' + fmt for fmt in ARCHIVE_FORMATS)) and os.path.isfile(archive_path):
+        stats = restore_from_archive(archive_path, args.target, paths=args.path or None)
+        return 1 if stats.errors else 0
+    stats = restore_snapshot(args.dst, args.snapshot, args.target, paths=args.path or None,
+                             workers=args.workers)
+    return 1 if stats.errors else 0
+
+
+def cmd_verify(args):
+    if args.src:
+        if not args.snapshot:
+            log.error("Weryfikacja względem źródła wymaga --snapshot.")
+            return 2
+        report = verify_snapshot(args.src, os.path.join(args.dst, args.snapshot), workers=args.workers)
+        for item in report['mismatches']:
+            log.error(f"Niezgodny plik: {item['path']}", extra=item)
+        return 1 if (report['mismatches'] or report['missing'] or report['errors']
+                     or report['permission_errors']) else 0
+    if not list_store_snapshots(args.dst):
+        log.error("Brak migawek w magazynie.")
+        return 1
+    problems = verify_store(args.dst, snapshot_name=args.snapshot, workers=args.workers)
+    for digest, problem, example in problems:
+        log.error(f"{problem}: {digest} ({example})", extra={'digest': digest})
+    return 1 if problems else 0
+
+
+def cmd_prune(args):
+    policy = retention_from_args(args)
+    if not policy.active():
+        log.error("Podaj przynajmniej jedną regułę retencji (--keep-last/--daily/.../--max-size).")
+        return 2
+    pruner = Pruner(args.dst, policy, max_deletes_per_s=args.prune_rate)
+    removed = pruner.run_once(dry_run=args.dry_run)
+    if args.dry_run:
+        for snapshot in removed:
+            log.info(f"Do usunięcia: {snapshot.name} ({snapshot.kind})")
+    return 0
+
+
+def cmd_gui(args):
+    from .backup import main as gui_main  # tkinter ładowany dopiero tutaj
+    gui_main()
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='python -m backup', description="Kopie zapasowe bez GUI.")
+    parser.add_argument('--log-format', choices=['text', 'json'], default='text')
+    parser.add_argument('--log-file', help="zapisuj logi do pliku zamiast na stderr")
+    sub = parser.add_subparsers(dest='command')
+
+    run = sub.add_parser('run', help="utwórz migawkę / działaj jako demon")
+    run.add_argument('src')
+    run.add_argument('dst')
+    mode = run.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--once', action='store_true', help="jedna migawka i koniec")
+    mode.add_argument('--watch', action='store_true', help="kopiuj po zmianach plików (tryb 'automatic')")
+    mode.add_argument('--at', type=parse_hhmm, metavar='HH:MM', help="codziennie o podanej godzinie (tryb 'interval')")
+    run.add_argument('--incremental', action='store_true', help="hard-linki do poprzedniej migawki")
+    run.add_argument('--hash', action='store_true', help="porównuj zawartość (SHA-256)")
+    run.add_argument('--delta', action='store_true',
+                     help="duże pliki kopiuj blokami – tylko zmienione bloki (reflink lub zapis rzadki); włącza --incremental")
+    run.add_argument('--verify', action='store_true',
+                     help="po kopii porównaj migawkę ze źródłem (raport .backup_verify.json)")
+    run.add_argument('--dedupe', action='store_true', help="magazyn z deduplikacją zamiast folderów")
+    run.add_argument('--archive', choices=ARCHIVE_FORMATS, help="migawka jako jedno archiwum (tar.zst wymaga 'zstandard')")
+    run.add_argument('--quiet-window', type=float, default=2.0, help="okno ciszy dla zdarzeń [s]")
+    run.add_argument('--workers', type=int, default=DEFAULT_COPY_WORKERS)
+    run.add_argument('--metrics-jsonl', metavar='PATH', help="dopisuj zdarzenia postępu i metryki (JSON lines)")
+    run.add_argument('--prometheus-port', type=int, metavar='PORT',
+                     help="udostępnij metryki w formacie Prometheusa pod http://HOST:PORT/metrics")
+    run.add_argument('--prometheus-host', default='127.0.0.1', help="adres nasłuchu endpointu metryk")
+    add_retention_args(run)
+    run.set_defaults(func=cmd_run)
+
+    restore = sub.add_parser('restore', help="przywróć migawkę z magazynu lub z archiwum")
+    restore.add_argument('dst')
+    restore.add_argument('snapshot')
+    restore.add_argument('target')
+    restore.add_argument('--path', action='append', help="tylko ta ścieżka względna (można powtarzać)")
+    restore.add_argument('--workers', type=int, default=DEFAULT_COPY_WORKERS)
+    restore.set_defaults(func=cmd_restore)
+
+    verify = sub.add_parser('verify', help="sprawdź bloki magazynu lub migawkę względem źródła")
+    verify.add_argument('dst')
+    verify.add_argument('--snapshot')
+    verify.add_argument('--src', help="folder źródłowy – porównaj z nim migawkę-folder (SHA-256)")
+    verify.add_argument('--workers', type=int, default=DEFAULT_COPY_WORKERS)
+    verify.set_defaults(func=cmd_verify)
+
+    prune = sub.add_parser('prune', help="usuń migawki spoza polityki retencji")
+    prune.add_argument('dst')
+    prune.add_argument('--dry-run', action='store_true', help="tylko pokaż, co zostałoby usunięte")
+    add_retention_args(prune)
+    prune.set_defaults(func=cmd_prune)
+
+    gui = sub.add_parser('gui', help="uruchom okno (domyślnie)")
+    gui.set_defaults(func=cmd_gui)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        return cmd_gui(args)
+    setup_logging(args.log_format, args.log_file)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,90 +1,16 @@
-import shutil
 import os
 import datetime
+import logging
 import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
-import winreg
-import time
-import sys
-
-class BackupHandler(FileSystemEventHandler):
-    def __init__(self, src_folder, dst_folder, status_label, backup_mode, backup_time=None):
-        self.src_folder = src_folder
-        self.dst_folder = dst_folder
-        self.status_label = status_label
-        self.backup_mode = backup_mode
-        self.backup_time = backup_time
-        self.backup_thread = None
-        self.stop_event = threading.Event()
-
-    def start_backup_thread(self):
-        self.stop_event.clear()
-        self.backup_thread = threading.Thread(target=self.run_backup_loop)
-        self.backup_thread.start()
-
-    def stop_backup_thread(self):
-        self.stop_event.set()
-        if self.backup_thread:
-            self.backup_thread.join()
-        time.sleep(0.5)
-
-    def run_backup_loop(self):
-        if self.backup_mode == 'interval':
-            while not self.stop_event.is_set():
-                now = datetime.datetime.now()
-                next_backup = now.replace(hour=self.backup_time.hour, minute=self.backup_time.minute, second=0, microsecond=0)
-                if now > next_backup:
-                    next_backup += datetime.timedelta(days=1)
-                sleep_time = (next_backup - now).total_seconds()
-                self.status_label.config(text=f"Oczekiwanie do {next_backup.strftime('%H:%M:%S')} na następne kopiowanie...")
-                self.stop_event.wait(sleep_time)
-                if not self.stop_event.is_set():
-                    self.perform_backup()
-        else:
-            self.perform_backup()
-            self.stop_event.wait(60)
-
-    def on_any_event(self, event):
-        if self.backup_mode == 'automatic':
-            if event.event_type in ['modified', 'created', 'deleted']:
-                self.perform_backup()
-
-    def perform_backup(self):
-        now = datetime.datetime.now()
-        backup_folder = f'{self.dst_folder}/backup_{now.strftime("%Y%m%d_%H%M%S")}'
-        copy_files(self.src_folder, backup_folder, self.status_label)
-        self.status_label.config(text="Kopia zapasowa utworzona.")
-
-def copy_files(src_folder, dst_folder, status_label):
-    if not os.path.exists(src_folder):
-        status_label.config(text="Folder źródłowy nie istnieje!")
-        return
 
-    try:
-        if not os.path.exists(dst_folder):
-            os.makedirs(dst_folder)
-
-        for item in os.listdir(src_folder):
-            src_path = os.path.join(src_folder, item)
-            dst_path = os.path.join(dst_folder, item)
-
-            try:
-                if os.path.isdir(src_path):
-                    if os.path.exists(dst_path):
-                        shutil.rmtree(dst_path)
-                    shutil.copytree(src_path, dst_path)
-                elif os.path.isfile(src_path):
-                    if os.access(src_path, os.R_OK):
-                        shutil.copy2(src_path, dst_path)
-            except PermissionError:
-                status_label.config(text=f"Brak dostępu do pliku: {src_path}")
-            except Exception as e:
-                status_label.config(text=f"Błąd przy kopiowaniu {src_path} do {dst_path}: {e}")
-    except Exception as e:
-        status_label.config(text=f"Błąd podczas tworzenia kopii zapasowej: {e}")
+try:
+    from .engine import (BackupHandler, DEFAULT_COPY_WORKERS, ARCHIVE_FORMATS, start_watching, stop_watching,
+                         store_path, restore_snapshot, verify_store, RetentionPolicy)
+except ImportError:  # uruchomienie jako skrypt: python backup.py
+    from engine import (BackupHandler, DEFAULT_COPY_WORKERS, ARCHIVE_FORMATS, start_watching, stop_watching,
+                        store_path, restore_snapshot, verify_store, RetentionPolicy)
 
 def on_close():
     if handler:
@@ -125,24 +51,44 @@ def start_monitoring():
     if handler:
         stop_monitoring()
 
-    handler = BackupHandler(src_folder_path, dst_folder_path, status_label, backup_mode, backup_time)
-    observer = Observer()
-    observer.schedule(handler, path=src_folder_path, recursive=True)
-    observer.start()
-    handler.start_backup_thread()
+    try:
+        quiet_window = float(quiet_entry.get().replace(',', '.'))
+        if quiet_window < 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showwarning("Uwaga", "Okno ciszy musi być nieujemną liczbą sekund!")
+        return
+    try:
+        workers = int(workers_entry.get())
+        if workers < 1:
+            raise ValueError
+    except ValueError:
+        messagebox.showwarning("Uwaga", "Liczba wątków kopiujących musi być dodatnią liczbą całkowitą!")
+        return
+    try:
+        keep_last = int(keep_entry.get() or 0)
+        if keep_last < 0:
+            raise ValueError
+    except ValueError:
+        messagebox.showwarning("Uwaga", "Liczba zachowywanych kopii musi być liczbą całkowitą ≥ 0!")
+        return
+
+    handler = BackupHandler(src_folder_path, dst_folder_path, backup_mode, backup_time,
+                            incremental=bool(incremental_var.get()), use_hash=bool(hash_var.get()),
+                            quiet_window=quiet_window, workers=workers, dedupe=bool(dedupe_var.get()),
+                            archive=None if archive_var.get() == 'folder' else archive_var.get(),
+                            retention=RetentionPolicy(keep_last=keep_last), delta=bool(delta_var.get()),
+                            verify=bool(verify_var.get()))
+    observer = start_watching(handler)
     status_label.config(text="Tworzenie kopii zapasowej uruchomione.")
     monitoring_active = True
     toggle_controls(False)
 
 def stop_monitoring():
     global observer, handler, monitoring_active
-    if handler:
-        handler.stop_backup_thread()
-        handler = None
-    if observer:
-        observer.stop()
-        observer.join()
-        observer = None
+    stop_watching(handler, observer)
+    handler = None
+    observer = None
     status_label.config(text="Tworzenie kopii zapasowej zatrzymane.")
     monitoring_active = False
     toggle_controls(True)
@@ -152,12 +98,45 @@ def toggle_controls(state):
     dst_button.config(state=tk.NORMAL if state else tk.DISABLED)
     auto_radio.config(state=tk.NORMAL if state else tk.DISABLED)
     interval_radio.config(state=tk.NORMAL if state else tk.DISABLED)
+    incremental_check.config(state=tk.NORMAL if state else tk.DISABLED)
+    hash_check.config(state=tk.NORMAL if state else tk.DISABLED)
+    delta_check.config(state=tk.NORMAL if state else tk.DISABLED)
+    verify_check.config(state=tk.NORMAL if state else tk.DISABLED)
+    dedupe_check.config(state=tk.NORMAL if state else tk.DISABLED)
+    archive_menu.config(state=tk.NORMAL if state else tk.DISABLED)
     hour_entry.config(state=tk.NORMAL if state else tk.DISABLED)
     minute_entry.config(state=tk.NORMAL if state else tk.DISABLED)
+    quiet_entry.config(state=tk.NORMAL if state else tk.DISABLED)
+    workers_entry.config(state=tk.NORMAL if state else tk.DISABLED)
+    keep_entry.config(state=tk.NORMAL if state else tk.DISABLED)
     start_button.config(state=tk.NORMAL if state else tk.DISABLED)
     stop_button.config(state=tk.NORMAL if not state else tk.DISABLED)
 
+def restore_from_store():
+    if not dst_folder_path:
+        messagebox.showwarning("Uwaga", "Najpierw wybierz folder docelowy (z magazynem)!")
+        return
+    snapshot_file = filedialog.askopenfilename(
+        title="Wybierz migawkę do przywrócenia",
+        initialdir=os.path.join(store_path(dst_folder_path), 'snapshots'),
+        filetypes=[("Migawki", "*.json")])
+    if not snapshot_file:
+        return
+    target = filedialog.askdirectory(title="Wybierz folder, do którego przywrócić pliki")
+    if not target:
+        return
+    snapshot_name = os.path.splitext(os.path.basename(snapshot_file))[0]
+    threading.Thread(target=restore_snapshot,
+                     args=(dst_folder_path, snapshot_name, target), daemon=True).start()
+
+def verify_store_clicked():
+    if not dst_folder_path:
+        messagebox.showwarning("Uwaga", "Najpierw wybierz folder docelowy (z magazynem)!")
+        return
+    threading.Thread(target=verify_store, args=(dst_folder_path,), daemon=True).start()
+
 def add_to_autostart():
+    import winreg  # tylko Windows – importowany dopiero przy użyciu
     try:
         if not os.access(__file__, os.W_OK):
             raise PermissionError("Brak dostępu do pliku lub wymagane są uprawnienia administratora.")
@@ -172,56 +151,117 @@ def add_to_autostart():
     except Exception as e:
         messagebox.showerror("Błąd", f"Nie udało się dodać programu do autostartu: {e}")
 
-stop_event = threading.Event()
+class StatusLabelHandler(logging.Handler):
+    """Przekazuje komunikaty silnika (logging) do etykiety statusu w oknie."""
+    def __init__(self, label):
+        super().__init__(level=logging.INFO)
+        self.label = label
+
+    def emit(self, record):
+        try:
+            self.label.config(text=self.format(record))
+        except Exception:
+            pass  # okno już zamknięte
+
 handler = None
 observer = None
 monitoring_active = False
 
-root = tk.Tk()
-root.title("Monitorowanie i Kopiowanie Plików")
-root.geometry("600x500")
-
 # Wybieranie folderów przez użytkownika
 src_folder_path = ''
 dst_folder_path = ''
 
-# Ustawienie etykiet
-src_folder_label = tk.Label(root, text="Folder źródłowy: (nie wybrano)")
-src_folder_label.pack(pady=5)
-dst_folder_label = tk.Label(root, text="Folder docelowy: (nie wybrano)")
-dst_folder_label.pack(pady=5)
-
-src_button = tk.Button(root, text="Wybierz folder źródłowy", command=choose_src_folder)
-src_button.pack(pady=10)
-dst_button = tk.Button(root, text="Wybierz folder docelowy", command=choose_dst_folder)
-dst_button.pack(pady=10)
-
-mode_var = tk.StringVar(value='interval')
-auto_radio = tk.Radiobutton(root, text="Tryb obserwacji zmian plików", variable=mode_var, value='automatic')
-auto_radio.pack(pady=5)
-interval_radio = tk.Radiobutton(root, text="Interwał godzinowy", variable=mode_var, value='interval')
-interval_radio.pack(pady=5)
-
-time_frame = tk.Frame(root)
-time_frame.pack(pady=10)
-tk.Label(time_frame, text="Godzina:").pack(side=tk.LEFT)
-hour_entry = tk.Entry(time_frame, width=5)
-hour_entry.insert(0, "17")
-hour_entry.pack(side=tk.LEFT)
-tk.Label(time_frame, text="Minuta:").pack(side=tk.LEFT)
-minute_entry = tk.Entry(time_frame, width=5)
-minute_entry.insert(0, "00")
-minute_entry.pack(side=tk.LEFT)
-
-start_button = tk.Button(root, text="Rozpocznij backup", command=start_monitoring)
-start_button.pack(pady=10)
-stop_button = tk.Button(root, text="Zatrzymaj backup", command=stop_monitoring)
-stop_button.pack(pady=10)
-end_button = tk.Button(root, text="Zamknij", command=on_close)
-end_button.pack(pady=10)
-
-status_label = tk.Label(root, text="Status: Backup nie uruchomiony.")
-status_label.pack(pady=10)
-
-root.protocol("WM_DELETE_WINDOW", on_close)
-root.mainloop()
+def main():
+    global root, src_folder_label, dst_folder_label, src_button, dst_button, mode_var, auto_radio, interval_radio
+    global incremental_var, incremental_check, hash_var, hash_check, delta_var, delta_check, verify_var, verify_check, dedupe_var, dedupe_check, archive_var, archive_menu
+    global hour_entry, minute_entry, quiet_entry, workers_entry, keep_entry, start_button, stop_button, status_label
+    root = tk.Tk()
+    root.title("Monitorowanie i Kopiowanie Plików")
+    root.geometry("760x820")
+
+    # Ustawienie etykiet
+    src_folder_label = tk.Label(root, text="Folder źródłowy: (nie wybrano)")
+    src_folder_label.pack(pady=5)
+    dst_folder_label = tk.Label(root, text="Folder docelowy: (nie wybrano)")
+    dst_folder_label.pack(pady=5)
+
+    src_button = tk.Button(root, text="Wybierz folder źródłowy", command=choose_src_folder)
+    src_button.pack(pady=10)
+    dst_button = tk.Button(root, text="Wybierz folder docelowy", command=choose_dst_folder)
+    dst_button.pack(pady=10)
+
+    mode_var = tk.StringVar(value='interval')
+    auto_radio = tk.Radiobutton(root, text="Tryb obserwacji zmian plików", variable=mode_var, value='automatic')
+    auto_radio.pack(pady=5)
+    interval_radio = tk.Radiobutton(root, text="Interwał godzinowy", variable=mode_var, value='interval')
+    interval_radio.pack(pady=5)
+
+    incremental_var = tk.IntVar(value=0)
+    incremental_check = tk.Checkbutton(root, text="Kopia przyrostowa (hard-linki do poprzedniej kopii)", variable=incremental_var)
+    incremental_check.pack(pady=5)
+    hash_var = tk.IntVar(value=0)
+    hash_check = tk.Checkbutton(root, text="Porównuj zawartość (SHA-256)", variable=hash_var)
+    hash_check.pack(pady=5)
+    delta_var = tk.IntVar(value=0)
+    delta_check = tk.Checkbutton(root, text="Duże pliki: kopiuj tylko zmienione bloki (delta)", variable=delta_var)
+    delta_check.pack(pady=5)
+    verify_var = tk.IntVar(value=0)
+    verify_check = tk.Checkbutton(root, text="Weryfikuj kopię ze źródłem (raport .backup_verify.json)", variable=verify_var)
+    verify_check.pack(pady=5)
+    dedupe_var = tk.IntVar(value=0)
+    dedupe_check = tk.Checkbutton(root, text="Magazyn z deduplikacją (bloki wg SHA-256)", variable=dedupe_var)
+    dedupe_check.pack(pady=5)
+    archive_frame = tk.Frame(root)
+    archive_frame.pack(pady=5)
+    tk.Label(archive_frame, text="Format migawki:").pack(side=tk.LEFT)
+    archive_var = tk.StringVar(value='folder')
+    archive_menu = tk.OptionMenu(archive_frame, archive_var, 'folder', *ARCHIVE_FORMATS)
+    archive_menu.pack(side=tk.LEFT)
+
+    time_frame = tk.Frame(root)
+    time_frame.pack(pady=10)
+    tk.Label(time_frame, text="Godzina:").pack(side=tk.LEFT)
+    hour_entry = tk.Entry(time_frame, width=5)
+    hour_entry.insert(0, "17")
+    hour_entry.pack(side=tk.LEFT)
+    tk.Label(time_frame, text="Minuta:").pack(side=tk.LEFT)
+    minute_entry = tk.Entry(time_frame, width=5)
+    minute_entry.insert(0, "00")
+    minute_entry.pack(side=tk.LEFT)
+
+    quiet_frame = tk.Frame(root)
+    quiet_frame.pack(pady=5)
+    tk.Label(quiet_frame, text="Okno ciszy dla zdarzeń (s):").pack(side=tk.LEFT)
+    quiet_entry = tk.Entry(quiet_frame, width=5)
+    quiet_entry.insert(0, "2")
+    quiet_entry.pack(side=tk.LEFT)
+    tk.Label(quiet_frame, text="Wątki kopiujące:").pack(side=tk.LEFT)
+    workers_entry = tk.Entry(quiet_frame, width=5)
+    workers_entry.insert(0, str(DEFAULT_COPY_WORKERS))
+    workers_entry.pack(side=tk.LEFT)
+    tk.Label(quiet_frame, text="Zachowaj ostatnie (0 = wszystkie):").pack(side=tk.LEFT)
+    keep_entry = tk.Entry(quiet_frame, width=5)
+    keep_entry.insert(0, "0")
+    keep_entry.pack(side=tk.LEFT)
+
+    start_button = tk.Button(root, text="Rozpocznij backup", command=start_monitoring)
+    start_button.pack(pady=10)
+    stop_button = tk.Button(root, text="Zatrzymaj backup", command=stop_monitoring)
+    stop_button.pack(pady=10)
+    store_frame = tk.Frame(root)
+    store_frame.pack(pady=5)
+    tk.Button(store_frame, text="Przywróć z magazynu…", command=restore_from_store).pack(side=tk.LEFT, padx=5)
+    tk.Button(store_frame, text="Weryfikuj magazyn", command=verify_store_clicked).pack(side=tk.LEFT, padx=5)
+    end_button = tk.Button(root, text="Zamknij", command=on_close)
+    end_button.pack(pady=10)
+
+    status_label = tk.Label(root, text="Status: Backup nie uruchomiony.")
+    status_label.pack(pady=10)
+    logging.getLogger('backup').addHandler(StatusLabelHandler(status_label))
+    logging.getLogger('backup').setLevel(logging.INFO)
+
+    root.protocol("WM_DELETE_WINDOW", on_close)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
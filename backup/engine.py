@@ -0,0 +1,1588 @@
+"""
+Silnik kopii zapasowych (bez GUI): migawki pełne, przyrostowe (hard-linki),
+magazyn z deduplikacją oraz obserwacja zmian przez watchdog.
+
+Komunikaty idą przez moduł logging (logger "backup"); GUI i CLI podpinają
+własne handlery.
+"""
+import shutil
+import os
+import datetime
+import threading
+import time
+import json
+import hashlib
+import queue
+import heapq
+try:
+    import fcntl
+except ImportError:  # Windows – brak reflinków, zostaje zapis rzadki
+    fcntl = None
+import logging
+import re
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from watchdog.observers import Observer
+from watchdog.events import FileSystemEventHandler
+
+log = logging.getLogger('backup')
+
+MANIFEST_NAME = '.backup_manifest.json'
+VERIFY_REPORT_NAME = '.backup_verify.json'
+DEFAULT_COPY_WORKERS = 8
+STORE_DIR = 'store'
+CHUNK_SIZE = 4 * 1024 * 1024
+DELTA_BLOCK_SIZE = 1024 * 1024
+DELTA_MIN_SIZE = 64 * 1024 * 1024  # tryb delta tylko dla plików od 64 MiB
+FICLONE = 0x40049409  # ioctl Linuksa: klon pliku (reflink)
+ARCHIVE_FORMATS = ('tar.zst', 'zip')
+ARCHIVE_FRAME_SIZE = 8 * 1024 * 1024  # tar.zst: nowa ramka zstd co ~8 MiB danych (punkty wejścia indeksu)
+PROGRESS_INTERVAL = 0.5  # s – odstęp zdarzeń 'progress' dla obserwatora metryk
+SLOWEST_FILES = 10
+
+class BackupHandler(FileSystemEventHandler):
+    def __init__(self, src_folder, dst_folder, backup_mode, backup_time=None,
+                 incremental=False, use_hash=False, quiet_window=2.0, workers=DEFAULT_COPY_WORKERS,
+                 dedupe=False, archive=None, retention=None, delta=False, verify=False, observer=None):
+        self.src_folder = src_folder
+        # observer(zdarzenie, **pola) – metryki i postęp (np. BackupMetrics.emit); wołany z wątków roboczych
+        self.observer = observer
+        self.dst_folder = dst_folder
+        self.backup_mode = backup_mode
+        self.backup_time = backup_time
+        self.incremental = incremental or delta  # delta potrzebuje poprzedniej migawki
+        self.delta = delta
+        self.verify = verify  # weryfikacja po kopii (tylko migawki-foldery)
+        self.use_hash = use_hash
+        self.workers = workers
+        self.dedupe = dedupe
+        self.archive = archive  # None (drzewo plików) / 'tar.zst' / 'zip'
+        self.backup_thread = None
+        self.stop_event = threading.Event()
+        self.backup_lock = threading.Lock()
+        self.coalescer = EventCoalescer(self.perform_backup, quiet_window=quiet_window, observer=observer)
+        # sprzątanie starych migawek w tle, ze wspólną blokadą (nie usuwa w trakcie kopiowania)
+        self.pruner = (Pruner(dst_folder, retention, self.backup_lock, observer=observer)
+                       if retention and retention.active() else None)
+
+    def start_backup_thread(self):
+        self.stop_event.clear()
+        if self.backup_mode == 'automatic':
+            self.coalescer.start()
+        self.backup_thread = threading.Thread(target=self.run_backup_loop)
+        self.backup_thread.start()
+        if self.pruner:
+            self.pruner.start()
+
+    def stop_backup_thread(self):
+        self.stop_event.set()
+        if self.backup_thread:
+            self.backup_thread.join()
+        self.coalescer.stop()
+        if self.pruner:
+            self.pruner.stop()
+        time.sleep(0.5)
+
+    def run_backup_loop(self):
+        if self.backup_mode == 'interval':
+            while not self.stop_event.is_set():
+                now = datetime.datetime.now()
+                next_backup = now.replace(hour=self.backup_time.hour, minute=self.backup_time.minute, second=0, microsecond=0)
+                if now > next_backup:
+                    next_backup += datetime.timedelta(days=1)
+                sleep_time = (next_backup - now).total_seconds()
+                log.info(f"Oczekiwanie do {next_backup.strftime('%H:%M:%S')} na następne kopiowanie...")
+                self.stop_event.wait(sleep_time)
+                if not self.stop_event.is_set():
+                    self.perform_backup()
+        else:
+            self.perform_backup()
+            self.stop_event.wait(60)
+
+    def on_any_event(self, event):
+        if self.backup_mode != 'automatic':
+            return
+        if event.event_type not in ['modified', 'created', 'deleted', 'moved']:
+            return
+        # zmiana mtime katalogu przychodzi razem ze zdarzeniami jego plików
+        if event.is_directory and event.event_type == 'modified':
+            return
+        paths = [event.src_path]
+        if event.event_type == 'moved':
+            paths.append(event.dest_path)
+        for path in paths:
+            rel_path = os.path.relpath(path, self.src_folder).replace(os.sep, '/')
+            if rel_path != '.' and not rel_path.startswith('../'):
+                self.coalescer.put(rel_path)
+
+    def perform_backup(self, changed_paths=None):
+        """Pełna migawka lub – gdy podano changed_paths – tylko zmienione ścieżki."""
+        with self.backup_lock:
+            if self.observer:
+                self.observer('backup_started', paths=None if changed_paths is None else len(changed_paths))
+            stats = self._run_backup(changed_paths)
+            if self.observer:
+                self._report_stats(stats)
+        if self.pruner:
+            self.pruner.request()
+        return stats
+
+    def _report_stats(self, stats):
+        if stats is None:
+            self.observer('backup_finished', ok=False)
+            return
+        for phase, seconds in stats.phases.items():
+            self.observer('phase', phase=phase, seconds=seconds)
+        self.observer('backup_finished', ok=not stats.errors, scanned=stats.scanned, skipped=stats.linked,
+                      slowest=stats.slowest_files(), **stats.as_fields())
+
+    def _run_backup(self, changed_paths):
+        if self.dedupe:
+            stats = backup_to_store(self.src_folder, self.dst_folder, changed_paths=changed_paths,
+                                    workers=self.workers, observer=self.observer)
+            if stats is not None:
+                log.info(f"Migawka zapisana w magazynie. {stats.summary()}", extra=stats.as_fields())
+            return stats
+        if self.archive:
+            stats = backup_to_archive(self.src_folder, self.dst_folder, self.archive, changed_paths=changed_paths,
+                                      workers=self.workers, observer=self.observer)
+            if stats is not None:
+                log.info(f"Archiwum utworzone: {os.path.basename(stats.archive or '')}. {stats.summary()}",
+                         extra=stats.as_fields())
+            return stats
+        backup_folder = new_backup_folder(self.dst_folder)
+        if self.incremental:
+            prev_folder = find_previous_snapshot(self.dst_folder, exclude=backup_folder)
+            stats = copy_files_incremental(self.src_folder, backup_folder,
+                                           prev_folder=prev_folder, use_hash=self.use_hash,
+                                           changed_paths=changed_paths, workers=self.workers,
+                                           delta=self.delta, hash_copy=self.verify, observer=self.observer)
+        elif changed_paths is not None:
+            stats = copy_paths(self.src_folder, backup_folder, changed_paths,
+                               workers=self.workers, hash_copy=self.verify, observer=self.observer)
+        else:
+            stats = copy_files(self.src_folder, backup_folder, workers=self.workers, hash_copy=self.verify,
+                               observer=self.observer)
+        if stats is not None:
+            log.info(f"Kopia zapasowa utworzona. {stats.summary()}", extra=stats.as_fields())
+            if self.verify:
+                # migawka przyrostowa jest zawsze pełna; z copy_paths – tylko zmienione ścieżki
+                started = time.monotonic()
+                stats.verify_report = verify_snapshot(
+                    self.src_folder, backup_folder, known_hashes=stats.hashes, copy_errors=stats.errors,
+                    full=self.incremental or changed_paths is None, workers=self.workers)
+                stats.add_phase('verify', time.monotonic() - started)
+        return stats
+
+def start_watching(handler):
+    """Uruchamia obserwatora zmian (watchdog) i wątek kopii dla handlera."""
+    observer = Observer()
+    observer.schedule(handler, path=handler.src_folder, recursive=True)
+    observer.start()
+    handler.start_backup_thread()
+    return observer
+
+def stop_watching(handler, observer):
+    if handler:
+        handler.stop_backup_thread()
+    if observer:
+        observer.stop()
+        observer.join()
+
+def new_backup_folder(dst_folder, suffix=''):
+    # Kilka migawek w tej samej sekundzie dostaje sufiks _1, _2, ...
+    now = datetime.datetime.now()
+    base = f'{dst_folder}/backup_{now.strftime("%Y%m%d_%H%M%S")}'
+    backup_folder, n = base + suffix, 0
+    while os.path.exists(backup_folder):
+        n += 1
+        backup_folder = f'{base}_{n}{suffix}'
+    return backup_folder
+
+# ====== Równoległe kopiowanie (pula wątków) ==================================
+
+class CopyStats:
+    """
+    Liczniki jednego przebiegu kopiowania + błędy per plik (nie przerywają kopii).
+    observer – opcjonalna funkcja observer(zdarzenie, **pola); dostaje co PROGRESS_INTERVAL
+    sekund zdarzenie 'progress' z bieżącymi licznikami.
+    """
+    def __init__(self, observer=None):
+        self.observer = observer
+        self.scanned = 0  # pozycje pobrane ze skanera (pliki do skopiowania/podlinkowania)
+        self.files = 0
+        self.linked = 0
+        self.bytes = 0
+        self.errors = []  # [(ścieżka, komunikat, typ_wyjątku)]
+        self.hashes = {}  # {ścieżka_względna: SHA-256 źródła} – liczone w trakcie kopiowania
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+        self.archive = None  # ścieżka archiwum (tryb archiwum)
+        self.verify_report = None  # raport verify_snapshot (gdy włączona weryfikacja)
+        self.phases = {}  # {faza: sekundy} – scan (czas skanera), copy, verify
+        self.slowest = []  # kopiec (sekundy, ścieżka) – SLOWEST_FILES najwolniejszych plików
+        self._last_tick = self.started
+
+    def record_file(self, rel_path, seconds):
+        # wołane w wątku wywołującym (on_result) – bez blokady
+        item = (seconds, rel_path)
+        if len(self.slowest) < SLOWEST_FILES:
+            heapq.heappush(self.slowest, item)
+        elif item > self.slowest[0]:
+            heapq.heapreplace(self.slowest, item)
+
+    def add_phase(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def tick(self):
+        # zdarzenie 'progress' najwyżej co PROGRESS_INTERVAL s
+        if self.observer is None:
+            return
+        now = time.monotonic()
+        if now - self._last_tick >= PROGRESS_INTERVAL:
+            self._last_tick = now
+            self.observer('progress', scanned=self.scanned, files=self.files, linked=self.linked,
+                          bytes=self.bytes, errors=len(self.errors))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+        self.phases['copy'] = self.elapsed
+        return self
+
+    def slowest_files(self):
+        return [{'path': path, 'seconds': round(seconds, 3)} for seconds, path in sorted(self.slowest, reverse=True)]
+
+    def as_fields(self):
+        # pola dla logów strukturalnych (JSON)
+        return {'files': self.files, 'linked': self.linked, 'bytes': self.bytes,
+                'errors': len(self.errors), 'elapsed_s': round(self.elapsed, 3)}
+
+    def summary(self):
+        elapsed = max(self.elapsed, 1e-6)
+        mb = self.bytes / (1024 * 1024)
+        text = (f"Skopiowano {self.files} plików ({mb:.1f} MB) w {self.elapsed:.1f} s – "
+                f"{self.files / elapsed:.1f} plików/s, {mb / elapsed:.1f} MB/s")
+        if self.linked:
+            text += f", podlinkowano {self.linked}"
+        if self.errors:
+            text += f", błędów: {len(self.errors)}"
+        return text
+
+def scan_tree(src_folder, start=''):
+    """
+    Skanuje drzewo przez os.scandir; zwraca (ścieżka_względna, DirEntry) dla katalogów
+    i plików. Katalog jest zwracany przed swoją zawartością.
+    """
+    stack = [start]
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(src_folder, rel_dir) if rel_dir else src_folder) as it:
+            for entry in it:
+                rel_path = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+                if entry.is_dir():
+                    yield rel_path, entry
+                    stack.append(rel_path)
+                elif entry.is_file():
+                    yield rel_path, entry
+
+def run_parallel(func, items, workers, on_result, on_error, stats=None):
+    """
+    Wykonuje func(item) w ograniczonej puli wątków. Liczba zadań w locie jest
+    ograniczona, więc ogromne drzewa nie trafiają w całości do pamięci.
+    on_result(item, wynik) / on_error(item, wyjątek) są wołane w wątku wywołującym.
+    stats – opcjonalny CopyStats: liczy pobrane pozycje, czas skanera (faza 'scan'),
+    czas każdego pliku (ścieżka = item[-1]) i wysyła zdarzenia postępu.
+    """
+    if stats is not None:
+        items = _timed_items(items, stats)
+        func = _timed(func)
+
+    def handle(future, item):
+        try:
+            result = future.result()
+            if stats is not None:
+                seconds, result = result
+                stats.record_file(item[-1] if isinstance(item, tuple) else item, seconds)
+            on_result(item, result)
+        except Exception as e:
+            on_error(item, e)
+        if stats is not None:
+            stats.tick()
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = {}
+        for item in items:
+            if len(pending) >= max(1, workers) * 4:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    handle(future, pending.pop(future))
+            pending[pool.submit(func, item)] = item
+        for future in as_completed(pending):
+            handle(future, pending[future])
+
+def _timed_items(items, stats):
+    # skaner jest leniwym generatorem – czas pobierania kolejnych pozycji to faza 'scan'
+    items = iter(items)
+    while True:
+        started = time.monotonic()
+        try:
+            item = next(items)
+        except StopIteration:
+            stats.add_phase('scan', time.monotonic() - started)
+            return
+        stats.add_phase('scan', time.monotonic() - started)
+        stats.scanned += 1
+        yield item
+
+def _timed(func):
+    def wrapper(item):
+        started = time.monotonic()
+        result = func(item)
+        return time.monotonic() - started, result
+    return wrapper
+
+def _report_error(stats, src_path, dst_path, error):
+    if isinstance(error, PermissionError):
+        msg = f"Brak dostępu do pliku: {src_path}"
+    else:
+        msg = f"Błąd przy kopiowaniu {src_path} do {dst_path}: {error}"
+    stats.errors.append((src_path, str(error), type(error).__name__))
+    log.warning(msg, extra={'path': src_path})
+
+def copy_and_hash(src_path, dst_path, chunk_size=1024 * 1024):
+    """Kopia jak shutil.copy2, ale z SHA-256 liczonym z tych samych odczytów (źródło czytane raz)."""
+    h = hashlib.sha256()
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        for chunk in iter(lambda: src.read(chunk_size), b''):
+            h.update(chunk)
+            dst.write(chunk)
+    shutil.copystat(src_path, dst_path)
+    return h.hexdigest()
+
+def _copy_one(src_path, dst_path, hash_copy=False):
+    # zwraca (rozmiar, SHA-256 źródła lub None)
+    if not os.access(src_path, os.R_OK):
+        raise PermissionError(src_path)
+    if hash_copy:
+        digest = copy_and_hash(src_path, dst_path)
+    else:
+        shutil.copy2(src_path, dst_path)
+        digest = None
+    return os.path.getsize(dst_path), digest
+
+def _iter_copy_jobs(src_folder, dst_folder, start=''):
+    # Katalogi tworzymy od razu (przed plikami w nich), pliki idą do puli
+    for rel_path, entry in scan_tree(src_folder, start):
+        if entry.is_dir():
+            os.makedirs(os.path.join(dst_folder, rel_path), exist_ok=True)
+        else:
+            yield entry.path, os.path.join(dst_folder, rel_path), rel_path
+
+def copy_files(src_folder, dst_folder, workers=DEFAULT_COPY_WORKERS, hash_copy=False, observer=None):
+    """
+    Pełna kopia drzewa; pliki kopiowane równolegle. Zwraca CopyStats (lub None).
+    hash_copy – SHA-256 źródła liczony przy kopiowaniu (stats.hashes, do weryfikacji).
+    observer – opcjonalna funkcja zdarzeń postępu (patrz CopyStats).
+    """
+    if not os.path.exists(src_folder):
+        log.error("Folder źródłowy nie istnieje!")
+        return None
+
+    stats = CopyStats(observer)
+
+    def on_result(job, result):
+        size, digest = result
+        stats.files += 1
+        stats.bytes += size
+        if digest:
+            stats.hashes[job[2]] = digest
+
+    def on_error(job, error):
+        _report_error(stats, job[0], job[1], error)
+
+    try:
+        os.makedirs(dst_folder, exist_ok=True)
+        run_parallel(lambda job: _copy_one(job[0], job[1], hash_copy), _iter_copy_jobs(src_folder, dst_folder),
+                     workers, on_result, on_error, stats=stats)
+    except Exception as e:
+        log.error(f"Błąd podczas tworzenia kopii zapasowej: {e}")
+    return stats.finish()
+
+# ====== Kopia przyrostowa (manifest + hard-linki, jak rsync --link-dest) ======
+
+def file_hash(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(snapshot_folder):
+    """Wczytuje manifest migawki: {ścieżka_względna: {'size', 'mtime_ns', 'hash'}}."""
+    path = os.path.join(snapshot_folder, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError):
+        return {}
+
+def write_json_atomic(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def save_manifest(snapshot_folder, files):
+    write_json_atomic(os.path.join(snapshot_folder, MANIFEST_NAME), {'version': 1, 'files': files})
+
+def find_previous_snapshot(dst_root, exclude=None):
+    """Zwraca najnowszy folder backup_* z manifestem (lub None)."""
+    if not os.path.isdir(dst_root):
+        return None
+    exclude = os.path.normpath(exclude) if exclude else None
+    candidates = sorted(
+        (entry.path for entry in os.scandir(dst_root)
+         if entry.is_dir() and entry.name.startswith('backup_')),
+        reverse=True,
+    )
+    for path in candidates:
+        if os.path.normpath(path) == exclude:
+            continue
+        if os.path.isfile(os.path.join(path, MANIFEST_NAME)):
+            return path
+    return None
+
+def link_or_copy(prev_path, src_path, dst_path):
+    # Hard-link z poprzedniej migawki; gdy system plików nie pozwala – zwykła kopia
+    try:
+        os.link(prev_path, dst_path)
+        return True
+    except OSError:
+        shutil.copy2(src_path, dst_path)
+        return False
+
+def _clone_file(src_path, dst_path):
+    """Klon copy-on-write (reflink, Linux FICLONE: btrfs/XFS/…); True, jeśli się udało."""
+    if fcntl is None:
+        return False
+    try:
+        with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return True
+    except OSError:
+        try:
+            os.remove(dst_path)
+        except OSError:
+            pass
+        return False
+
+def block_hashes(path, block_size=DELTA_BLOCK_SIZE):
+    with open(path, 'rb') as f:
+        return [hashlib.blake2b(data, digest_size=16).hexdigest()
+                for data in iter(lambda: f.read(block_size), b'')]
+
+def delta_copy(src_path, dst_path, prev_path=None, prev_blocks=None, block_size=DELTA_BLOCK_SIZE,
+               whole_hash=False):
+    """
+    Kopia dużego pliku blokami. Jeśli jest poprzednia wersja i system plików
+    obsługuje reflink, dst jest jej klonem i nadpisywane są tylko bloki, których
+    suma kontrolna się zmieniła. W przeciwnym razie zapis rzadki (bloki zerowe
+    jako dziury). Źródło jest czytane raz. Zwraca (sumy_bloków, zapisane_bajty,
+    SHA-256 całego pliku lub None – gdy whole_hash=False).
+    """
+    prev_blocks = prev_blocks or []
+    cloned = bool(prev_path and prev_blocks) and _clone_file(prev_path, dst_path)
+    zero_block = bytes(block_size)
+    whole = hashlib.sha256() if whole_hash else None
+    blocks = []
+    written = 0
+    offset = 0
+    with open(src_path, 'rb') as src, open(dst_path, 'r+b' if cloned else 'wb') as dst:
+        for data in iter(lambda: src.read(block_size), b''):
+            digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+            if whole:
+                whole.update(data)
+            index = len(blocks)
+            blocks.append(digest)
+            if cloned and index < len(prev_blocks) and prev_blocks[index] == digest:
+                pass  # blok bez zmian – zostaje współdzielony z poprzednią wersją
+            elif not cloned and data == zero_block[:len(data)]:
+                pass  # dziura w pliku rzadkim
+            else:
+                dst.seek(offset)
+                dst.write(data)
+                written += len(data)
+            offset += len(data)
+        dst.truncate(offset)
+    shutil.copystat(src_path, dst_path)
+    return blocks, written, whole.hexdigest() if whole else None
+
+def _backup_one_file(src_path, dst_path, rel_path, prev_files, prev_folder, use_hash, delta=False,
+                     hash_copy=False):
+    """
+    Kopiuje lub linkuje jeden plik; zwraca (wpis_manifestu, czy_podlinkowano,
+    zapisane_bajty, SHA-256 źródła lub None).
+    """
+    if not os.access(src_path, os.R_OK):
+        raise PermissionError(src_path)
+    st = os.stat(src_path)
+    entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'hash': None}
+    prev = prev_files.get(rel_path)
+    prev_path = os.path.join(prev_folder, rel_path) if prev else None
+    prev_ok = bool(prev) and os.path.isfile(prev_path)
+
+    unchanged = False
+    if prev_ok and prev['size'] == st.st_size:
+        if prev['mtime_ns'] == st.st_mtime_ns:
+            unchanged = True
+            entry['hash'] = prev.get('hash')
+        elif use_hash and prev.get('hash'):
+            # mtime się zmienił, ale zawartość mogła zostać ta sama
+            entry['hash'] = file_hash(src_path)
+            unchanged = entry['hash'] == prev['hash']
+    if unchanged and prev.get('blocks'):
+        entry['blocks'] = prev['blocks']
+
+    # hash policzony z odczytu źródła (a nie przepisany z manifestu) nadaje się do weryfikacji
+    src_digest = entry['hash'] if unchanged and prev['mtime_ns'] != st.st_mtime_ns else None
+    if unchanged and link_or_copy(prev_path, src_path, dst_path):
+        return entry, True, 0, src_digest
+    if not unchanged and delta and st.st_size >= DELTA_MIN_SIZE:
+        entry['blocks'], written, src_digest = delta_copy(src_path, dst_path,
+                                                          prev_path if prev_ok else None,
+                                                          prev.get('blocks') if prev_ok else None,
+                                                          whole_hash=hash_copy or use_hash)
+        entry['hash'] = src_digest
+    elif not unchanged and hash_copy:
+        src_digest = entry['hash'] = copy_and_hash(src_path, dst_path)
+        written = st.st_size
+    elif not unchanged:
+        shutil.copy2(src_path, dst_path)
+        written = st.st_size
+    else:
+        written = st.st_size  # hard-link niemożliwy – pełna kopia
+    if use_hash and entry['hash'] is None:
+        entry['hash'] = file_hash(dst_path)
+    return entry, False, written, src_digest
+
+def _is_affected(rel_path, changed_paths):
+    # Plik jest "dotknięty", jeśli on sam lub któryś z jego katalogów nadrzędnych jest w paczce zmian
+    while rel_path:
+        if rel_path in changed_paths:
+            return True
+        rel_path = rel_path.rpartition('/')[0]
+    return False
+
+def copy_files_incremental(src_folder, dst_folder, prev_folder=None, use_hash=False,
+                           changed_paths=None, workers=DEFAULT_COPY_WORKERS, delta=False, hash_copy=False,
+                           observer=None):
+    """
+    Tworzy pełną, przeglądalną migawkę kopiując tylko nowe/zmienione pliki.
+    Niezmienione pliki (rozmiar + mtime, opcjonalnie hash) są hard-linkowane
+    z poprzedniej migawki.
+
+    changed_paths – opcjonalny zbiór ścieżek względnych (z obserwatora zmian);
+    wtedy źródło nie jest skanowane w całości: pliki spoza zbioru są linkowane
+    wprost z manifestu poprzedniej migawki, a skanowane są tylko zmienione ścieżki.
+
+    delta – duże pliki (≥ DELTA_MIN_SIZE) są kopiowane blokami (delta_copy):
+    przepisywane są tylko bloki zmienione względem poprzedniej migawki.
+    """
+    if not os.path.exists(src_folder):
+        log.error("Folder źródłowy nie istnieje!")
+        return None
+
+    prev_files = load_manifest(prev_folder) if prev_folder else {}
+    if changed_paths is not None and not prev_files:
+        changed_paths = None  # brak poprzedniej migawki – pełne skanowanie
+    files = {}
+    stats = CopyStats(observer)
+
+    def backup_job(job):
+        kind, rel_path = job
+        src_path = os.path.join(src_folder, rel_path)
+        dst_path = os.path.join(dst_folder, rel_path)
+        if kind == 'link':
+            # niezmieniony wg obserwatora – wpis przepisujemy z poprzedniego manifestu
+            was_linked = link_or_copy(os.path.join(prev_folder, rel_path), src_path, dst_path)
+            entry = prev_files[rel_path]
+            return entry, was_linked, 0 if was_linked else entry['size'], None
+        return _backup_one_file(src_path, dst_path, rel_path, prev_files, prev_folder, use_hash, delta,
+                                hash_copy)
+
+    def on_result(job, result):
+        entry, was_linked, written, src_digest = result
+        files[job[1]] = entry
+        if src_digest:
+            stats.hashes[job[1]] = src_digest
+        if was_linked:
+            stats.linked += 1
+        else:
+            stats.files += 1
+            stats.bytes += written
+
+    def on_error(job, error):
+        rel_path = job[1]
+        _report_error(stats, os.path.join(src_folder, rel_path),
+                      os.path.join(dst_folder, rel_path), error)
+
+    def scan(start=''):
+        for rel_path, entry in scan_tree(src_folder, start):
+            if entry.is_dir():
+                os.makedirs(os.path.join(dst_folder, rel_path), exist_ok=True)
+            else:
+                yield 'copy', rel_path
+
+    def watched_jobs():
+        for rel_path in prev_files:
+            if not _is_affected(rel_path, changed_paths):
+                os.makedirs(os.path.dirname(os.path.join(dst_folder, rel_path)), exist_ok=True)
+                yield 'link', rel_path
+        for rel_path in sorted(changed_paths):
+            src_path = os.path.join(src_folder, rel_path)
+            if os.path.isdir(src_path):
+                os.makedirs(os.path.join(dst_folder, rel_path), exist_ok=True)
+                yield from scan(rel_path)
+            elif os.path.isfile(src_path) and not _is_affected(rel_path.rpartition('/')[0], changed_paths):
+                os.makedirs(os.path.dirname(os.path.join(dst_folder, rel_path)), exist_ok=True)
+                yield 'copy', rel_path
+            # usunięte ścieżki po prostu nie trafiają do nowej migawki
+
+    try:
+        os.makedirs(dst_folder, exist_ok=True)
+        jobs = scan() if changed_paths is None else watched_jobs()
+        run_parallel(backup_job, jobs, workers, on_result, on_error, stats=stats)
+        save_manifest(dst_folder, files)
+    except Exception as e:
+        log.error(f"Błąd podczas tworzenia kopii zapasowej: {e}")
+    return stats.finish()
+
+def copy_paths(src_folder, dst_folder, rel_paths, workers=DEFAULT_COPY_WORKERS, hash_copy=False,
+               observer=None):
+    """Kopiuje do migawki wyłącznie wskazane ścieżki względne (pliki lub katalogi)."""
+    if not os.path.exists(src_folder):
+        log.error("Folder źródłowy nie istnieje!")
+        return None
+
+    stats = CopyStats(observer)
+
+    def jobs():
+        for rel_path in sorted(rel_paths):
+            if _is_affected(rel_path.rpartition('/')[0], rel_paths):
+                continue  # obejmuje go już katalog nadrzędny z paczki
+            src_path = os.path.join(src_folder, rel_path)
+            dst_path = os.path.join(dst_folder, rel_path)
+            if os.path.isdir(src_path):
+                os.makedirs(dst_path, exist_ok=True)
+                yield from _iter_copy_jobs(src_folder, dst_folder, rel_path)
+            elif os.path.isfile(src_path):
+                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+                yield src_path, dst_path, rel_path
+
+    def on_result(job, result):
+        size, digest = result
+        stats.files += 1
+        stats.bytes += size
+        if digest:
+            stats.hashes[job[2]] = digest
+
+    def on_error(job, error):
+        _report_error(stats, job[0], job[1], error)
+
+    try:
+        run_parallel(lambda job: _copy_one(job[0], job[1], hash_copy), jobs(), workers, on_result, on_error,
+                     stats=stats)
+    except Exception as e:
+        log.error(f"Błąd podczas tworzenia kopii zapasowej: {e}")
+    return stats.finish()
+
+# ====== Weryfikacja migawki (źródło vs kopia) ================================
+
+def verify_snapshot(src_folder, snapshot_folder, known_hashes=None, copy_errors=(), full=True,
+                    workers=DEFAULT_COPY_WORKERS):
+    """
+    Porównuje pliki migawki ze źródłem (SHA-256, równolegle). Dla plików, których
+    hash źródła policzono już w trakcie kopiowania (known_hashes), czytana jest
+    tylko kopia. Pliki zmienione w źródle po kopii są pomijane, a nie zgłaszane
+    jako niezgodne. full=True: brak pliku źródłowego w migawce to błąd (dla
+    migawek częściowych z obserwatora – False).
+
+    Raport trafia do <migawka>/.backup_verify.json i jest zwracany jako dict.
+    """
+    known_hashes = known_hashes or {}
+    report = {
+        'snapshot': os.path.basename(os.path.normpath(snapshot_folder)),
+        'started': datetime.datetime.now().isoformat(timespec='seconds'),
+        'ok': 0,
+        'mismatches': [],
+        'missing': [],
+        'skipped': [],
+        'permission_errors': [],
+        'errors': [],
+    }
+    for path, msg, kind in copy_errors:
+        target = report['permission_errors'] if kind == 'PermissionError' else report['errors']
+        target.append({'path': path, 'phase': 'copy', 'error': msg})
+
+    failed_copy = {os.path.normpath(path) for path, _, _ in copy_errors}
+    snapshot_files = set()
+    for rel_path, entry in scan_tree(snapshot_folder):
+        if not entry.is_dir() and rel_path not in (MANIFEST_NAME, VERIFY_REPORT_NAME):
+            snapshot_files.add(rel_path)
+    if full:
+        for rel_path, entry in scan_tree(src_folder):
+            if (not entry.is_dir() and rel_path not in snapshot_files
+                    and os.path.normpath(entry.path) not in failed_copy):
+                report['missing'].append(rel_path)
+
+    def check(rel_path):
+        src_path = os.path.join(src_folder, rel_path)
+        dst_path = os.path.join(snapshot_folder, rel_path)
+        try:
+            src_st = os.stat(src_path)
+        except FileNotFoundError:
+            return 'skipped', 'plik źródłowy usunięty po kopii'
+        dst_st = os.stat(dst_path)
+        if src_st.st_mtime_ns != dst_st.st_mtime_ns or src_st.st_size != dst_st.st_size:
+            if rel_path not in known_hashes:
+                return 'skipped', 'plik źródłowy zmieniony po kopii'
+        dst_digest = file_hash(dst_path)
+        src_digest = known_hashes.get(rel_path) or file_hash(src_path)
+        if src_digest != dst_digest:
+            return 'mismatch', {'path': rel_path, 'source': src_digest, 'backup': dst_digest}
+        return 'ok', None
+
+    def on_result(rel_path, result):
+        status, detail = result
+        if status == 'ok':
+            report['ok'] += 1
+        elif status == 'skipped':
+            report['skipped'].append({'path': rel_path, 'reason': detail})
+        else:
+            report['mismatches'].append(detail)
+
+    def on_error(rel_path, error):
+        target = report['permission_errors'] if isinstance(error, PermissionError) else report['errors']
+        target.append({'path': rel_path, 'phase': 'verify', 'error': str(error)})
+
+    run_parallel(check, sorted(snapshot_files), workers, on_result, on_error)
+    report['finished'] = datetime.datetime.now().isoformat(timespec='seconds')
+    write_json_atomic(os.path.join(snapshot_folder, VERIFY_REPORT_NAME), report)
+
+    fields = {'ok': report['ok'], 'mismatches': len(report['mismatches']), 'missing': len(report['missing']),
+              'skipped': len(report['skipped']), 'permission_errors': len(report['permission_errors']),
+              'verify_errors': len(report['errors'])}
+    msg = (f"Weryfikacja {report['snapshot']}: zgodnych {fields['ok']}, niezgodnych {fields['mismatches']}, "
+           f"brakujących {fields['missing']}, pominiętych {fields['skipped']}, "
+           f"brak dostępu {fields['permission_errors']}, innych błędów {fields['verify_errors']}")
+    problems = fields['mismatches'] + fields['missing'] + fields['permission_errors'] + fields['verify_errors']
+    log.log(logging.ERROR if problems else logging.INFO, msg, extra=fields)
+    return report
+
+# ====== Magazyn adresowany treścią (deduplikacja) =============================
+#
+# <dst>/store/objects/ab/abcdef…   – bloki (fragmenty plików) zapisane raz, pod swoim SHA-256
+# <dst>/store/snapshots/backup_YYYYMMDD_HHMMSS.json – manifest migawki (plik → lista bloków)
+
+def store_path(dst_folder):
+    return os.path.join(dst_folder, STORE_DIR)
+
+def _blob_path(store_dir, digest):
+    return os.path.join(store_dir, 'objects', digest[:2], digest)
+
+def _store_blob(store_dir, digest, data):
+    # Zwraca liczbę faktycznie zapisanych bajtów (0, gdy blok już jest w magazynie)
+    path = _blob_path(store_dir, digest)
+    if os.path.exists(path):
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+def store_file(store_dir, src_path, chunk_size=CHUNK_SIZE):
+    """Dzieli plik na bloki i zapisuje brakujące; zwraca (lista_hashy, zapisane_bajty)."""
+    chunks = []
+    written = 0
+    with open(src_path, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_size), b''):
+            digest = hashlib.sha256(data).hexdigest()
+            written += _store_blob(store_dir, digest, data)
+            chunks.append(digest)
+    return chunks, written
+
+def list_store_snapshots(dst_folder):
+    snapshots_dir = os.path.join(store_path(dst_folder), 'snapshots')
+    if not os.path.isdir(snapshots_dir):
+        return []
+    return sorted(name[:-5] for name in os.listdir(snapshots_dir) if name.endswith('.json'))
+
+def load_store_snapshot(dst_folder, name):
+    path = os.path.join(store_path(dst_folder), 'snapshots', f'{name}.json')
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def backup_to_store(src_folder, dst_folder, changed_paths=None, workers=DEFAULT_COPY_WORKERS, observer=None):
+    """
+    Migawka w magazynie z deduplikacją: zapisywane są tylko bloki, których jeszcze
+    nie ma, a migawka to mały manifest. Pliki z niezmienionym rozmiarem i mtime
+    nie są nawet czytane – lista bloków jest przepisywana z poprzedniej migawki.
+    """
+    if not os.path.exists(src_folder):
+        log.error("Folder źródłowy nie istnieje!")
+        return None
+
+    store_dir = store_path(dst_folder)
+    snapshots_dir = os.path.join(store_dir, 'snapshots')
+    previous = list_store_snapshots(dst_folder)
+    prev = load_store_snapshot(dst_folder, previous[-1]) if previous else {'files': {}, 'dirs': []}
+    prev_files = prev['files']
+    if changed_paths is not None and not previous:
+        changed_paths = None  # brak poprzedniej migawki – pełne skanowanie
+    files = {}
+    dirs = []
+    stats = CopyStats(observer)
+
+    def store_job(job):
+        kind, rel_path = job
+        if kind == 'reuse':
+            return prev_files[rel_path], 0, True
+        src_path = os.path.join(src_folder, rel_path)
+        if not os.access(src_path, os.R_OK):
+            raise PermissionError(src_path)
+        st = os.stat(src_path)
+        old = prev_files.get(rel_path)
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            return old, 0, True
+        chunks, written = store_file(store_dir, src_path)
+        return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'chunks': chunks}, written, False
+
+    def on_result(job, result):
+        entry, written, reused = result
+        files[job[1]] = entry
+        if reused:
+            stats.linked += 1
+        else:
+            stats.files += 1
+            stats.bytes += written
+
+    def on_error(job, error):
+        _report_error(stats, os.path.join(src_folder, job[1]), store_dir, error)
+
+    def scan(start=''):
+        for rel_path, entry in scan_tree(src_folder, start):
+            if entry.is_dir():
+                dirs.append(rel_path)
+            else:
+                yield 'store', rel_path
+
+    def watched_jobs():
+        dirs.extend(d for d in prev.get('dirs', []) if not _is_affected(d, changed_paths))
+        for rel_path in prev_files:
+            if not _is_affected(rel_path, changed_paths):
+                yield 'reuse', rel_path
+        for rel_path in sorted(changed_paths):
+            src_path = os.path.join(src_folder, rel_path)
+            if _is_affected(rel_path.rpartition('/')[0], changed_paths):
+                continue
+            if os.path.isdir(src_path):
+                dirs.append(rel_path)
+                yield from scan(rel_path)
+            elif os.path.isfile(src_path):
+                yield 'store', rel_path
+
+    try:
+        os.makedirs(snapshots_dir, exist_ok=True)
+        jobs = scan() if changed_paths is None else watched_jobs()
+        run_parallel(store_job, jobs, workers, on_result, on_error, stats=stats)
+        snapshot_path = new_backup_folder(snapshots_dir, suffix='.json')
+        write_json_atomic(snapshot_path, {'version': 1, 'files': files, 'dirs': sorted(dirs)})
+    except Exception as e:
+        log.error(f"Błąd podczas tworzenia kopii zapasowej: {e}")
+    return stats.finish()
+
+def restore_snapshot(dst_folder, snapshot_name, target_folder, paths=None,
+                     workers=DEFAULT_COPY_WORKERS):
+    """Odtwarza migawkę z magazynu (całą lub tylko wskazane ścieżki względne)."""
+    store_dir = store_path(dst_folder)
+    snapshot = load_store_snapshot(dst_folder, snapshot_name)
+    wanted = set(paths) if paths else None
+    stats = CopyStats()
+
+    for rel_dir in snapshot.get('dirs', []):
+        if wanted is None or _is_affected(rel_dir, wanted):
+            os.makedirs(os.path.join(target_folder, rel_dir), exist_ok=True)
+
+    def restore_one(item):
+        rel_path, entry = item
+        dst_path = os.path.join(target_folder, rel_path)
+        os.makedirs(os.path.dirname(dst_path) or target_folder, exist_ok=True)
+        tmp_path = dst_path + '.tmp'
+        with open(tmp_path, 'wb') as out:
+            for digest in entry['chunks']:
+                with open(_blob_path(store_dir, digest), 'rb') as blob:
+                    shutil.copyfileobj(blob, out)
+        os.replace(tmp_path, dst_path)
+        os.utime(dst_path, ns=(entry['mtime_ns'], entry['mtime_ns']))
+        return entry['size']
+
+    def on_result(item, size):
+        stats.files += 1
+        stats.bytes += size
+
+    def on_error(item, error):
+        _report_error(stats, item[0], os.path.join(target_folder, item[0]), error)
+
+    items = ((rel_path, entry) for rel_path, entry in snapshot['files'].items()
+             if wanted is None or _is_affected(rel_path, wanted))
+    run_parallel(restore_one, items, workers, on_result, on_error)
+    log.info(f"Przywrócono {snapshot_name}. {stats.finish().summary()}", extra=stats.as_fields())
+    return stats
+
+def verify_store(dst_folder, snapshot_name=None, workers=DEFAULT_COPY_WORKERS):
+    """
+    Sprawdza, czy wszystkie bloki używane przez migawkę (lub wszystkie migawki)
+    istnieją i mają zgodny hash. Zwraca listę problemów [(hash, opis, przykładowy_plik)].
+    """
+    store_dir = store_path(dst_folder)
+    names = [snapshot_name] if snapshot_name else list_store_snapshots(dst_folder)
+    referenced = {}
+    for name in names:
+        for rel_path, entry in load_store_snapshot(dst_folder, name)['files'].items():
+            for digest in entry['chunks']:
+                referenced.setdefault(digest, f'{name}:{rel_path}')
+
+    def check(digest):
+        path = _blob_path(store_dir, digest)
+        if not os.path.exists(path):
+            return 'brak bloku'
+        if file_hash(path) != digest:
+            return 'uszkodzony blok'
+        return None
+
+    problems = []
+
+    def on_result(digest, problem):
+        if problem:
+            problems.append((digest, problem, referenced[digest]))
+
+    def on_error(digest, error):
+        problems.append((digest, str(error), referenced[digest]))
+
+    run_parallel(check, referenced, workers, on_result, on_error)
+    if problems:
+        log.error(f"Weryfikacja magazynu: {len(problems)} problemów "
+                  f"(np. {problems[0][2]}: {problems[0][1]}).", extra={'problems': len(problems)})
+    else:
+        log.info(f"Weryfikacja magazynu OK: {len(names)} migawek, {len(referenced)} bloków.")
+    return problems
+
+# ====== Migawki jako archiwum (tar.zst / zip) ================================
+#
+# Archiwum powstaje w jednym przebiegu ze skanera, bez kopii tymczasowej plików.
+# tar.zst: członkowie tar są pakowani w niezależne ramki zstd (kompresja wielowątkowa),
+# a indeks <archiwum>.index.json zapisuje, od której ramki zaczyna się każdy plik –
+# pojedynczy plik można odtworzyć bez dekompresji całego archiwum. Całość nadal
+# jest zwykłym .tar.zst (tar --zstd -xf). zip ma własny indeks (central directory).
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Format tar.zst wymaga pakietu 'zstandard' (pip install zstandard).")
+    return zstandard
+
+def _tar_header(rel_path, st, is_dir):
+    info = tarfile.TarInfo(rel_path + ('/' if is_dir else ''))
+    info.type = tarfile.DIRTYPE if is_dir else tarfile.REGTYPE
+    info.size = 0 if is_dir else st.st_size
+    info.mtime = st.st_mtime
+    info.mode = st.st_mode & 0o7777
+    return info.tobuf(tarfile.PAX_FORMAT, 'utf-8', 'surrogateescape')
+
+def _iter_archive_entries(src_folder, changed_paths=None):
+    # (ścieżka_względna, DirEntry); przy changed_paths tylko zmienione pliki/katalogi
+    if changed_paths is None:
+        yield from scan_tree(src_folder)
+        return
+    for rel_path in sorted(changed_paths):
+        if _is_affected(rel_path.rpartition('/')[0], changed_paths):
+            continue
+        src_path = os.path.join(src_folder, rel_path)
+        if os.path.isdir(src_path):
+            yield from scan_tree(src_folder, rel_path)
+        elif os.path.isfile(src_path):
+            yield rel_path, _PathEntry(src_path)
+
+class _PathEntry:
+    # minimalny odpowiednik os.DirEntry dla pojedynczej ścieżki
+    def __init__(self, path):
+        self.path = path
+
+    def is_dir(self):
+        return os.path.isdir(self.path)
+
+    def stat(self):
+        return os.stat(self.path)
+
+def _write_tar_zst(archive_path, entries, stats, workers, level):
+    zstd = _zstd()
+    index = {}
+    cctx = zstd.ZstdCompressor(level=level, threads=workers)
+    with open(archive_path, 'wb') as raw:
+        writer = cctx.stream_writer(raw, closefd=False)
+        frame_start, frame_used = 0, 0
+
+        def write(data):
+            nonlocal frame_used
+            writer.write(data)
+            frame_used += len(data)
+
+        for rel_path, entry in entries:
+            stats.scanned += 1
+            if frame_used >= ARCHIVE_FRAME_SIZE:
+                writer.flush(zstd.FLUSH_FRAME)
+                frame_start, frame_used = raw.tell(), 0
+            is_dir = entry.is_dir()
+            try:
+                if not is_dir and not os.access(entry.path, os.R_OK):
+                    raise PermissionError(entry.path)
+                st = entry.stat()
+                if is_dir:
+                    write(_tar_header(rel_path, st, True))
+                    continue
+                header = _tar_header(rel_path, st, False)
+                started = time.monotonic()
+                with open(entry.path, 'rb') as f:
+                    index[rel_path] = {'frame': frame_start, 'offset': frame_used,
+                                       'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+                    write(header)
+                    remaining = st.st_size
+                    while remaining > 0:
+                        data = f.read(min(CHUNK_SIZE, remaining))
+                        if not data:
+                            # plik skrócił się w trakcie czytania – dopełniamy, by tar był spójny
+                            log.warning(f"Plik zmienił się podczas archiwizacji: {entry.path}")
+                            data = b'\0' * remaining
+                        write(data)
+                        remaining -= len(data)
+                    write(b'\0' * (-st.st_size % tarfile.BLOCKSIZE))
+                stats.record_file(rel_path, time.monotonic() - started)
+                stats.files += 1
+                stats.bytes += st.st_size
+            except Exception as e:
+                _report_error(stats, entry.path, archive_path, e)
+            stats.tick()
+        write(b'\0' * (2 * tarfile.BLOCKSIZE))
+        writer.flush(zstd.FLUSH_FRAME)
+    return index
+
+def _write_zip(archive_path, entries, stats):
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+        for rel_path, entry in entries:
+            stats.scanned += 1
+            try:
+                if entry.is_dir():
+                    zf.write(entry.path, rel_path + '/')
+                    continue
+                if not os.access(entry.path, os.R_OK):
+                    raise PermissionError(entry.path)
+                started = time.monotonic()
+                zf.write(entry.path, rel_path)
+                stats.record_file(rel_path, time.monotonic() - started)
+                stats.files += 1
+                stats.bytes += zf.getinfo(rel_path).file_size
+            except Exception as e:
+                _report_error(stats, entry.path, archive_path, e)
+            stats.tick()
+
+def backup_to_archive(src_folder, dst_folder, fmt='tar.zst', changed_paths=None,
+                      workers=DEFAULT_COPY_WORKERS, level=3, observer=None):
+    """
+    Zapisuje migawkę jako jedno archiwum backup_<znacznik>.<fmt> w dst_folder.
+    Przy changed_paths archiwizowane są tylko zmienione ścieżki.
+    """
+    if fmt not in ARCHIVE_FORMATS:
+        raise ValueError(f"Nieznany format archiwum: {fmt}")
+    if not os.path.exists(src_folder):
+        log.error("Folder źródłowy nie istnieje!")
+        return None
+
+    stats = CopyStats(observer)
+    try:
+        os.makedirs(dst_folder, exist_ok=True)
+        archive_path = new_backup_folder(dst_folder, suffix=f'.{fmt}')
+        partial_path = archive_path + '.partial'
+        entries = _iter_archive_entries(src_folder, changed_paths)
+        if fmt == 'tar.zst':
+            index = _write_tar_zst(partial_path, entries, stats, workers, level)
+            write_json_atomic(archive_path + '.index.json', {'version': 1, 'files': index})
+        else:
+            _write_zip(partial_path, entries, stats)
+        os.replace(partial_path, archive_path)
+        stats.archive = archive_path
+    except Exception as e:
+        log.error(f"Błąd podczas tworzenia kopii zapasowej: {e}")
+    return stats.finish()
+
+def _safe_target(target_folder, rel_path):
+    dst_path = os.path.normpath(os.path.join(target_folder, rel_path))
+    if os.path.commonpath([os.path.abspath(target_folder), os.path.abspath(dst_path)]) != os.path.abspath(target_folder):
+        raise ValueError(f"Niedozwolona ścieżka w archiwum: {rel_path}")
+    return dst_path
+
+def _extract_tar_member(tar, member, target_folder):
+    dst_path = _safe_target(target_folder, member.name)
+    if member.isdir():
+        os.makedirs(dst_path, exist_ok=True)
+        return 0
+    if not member.isfile():
+        return 0
+    os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+    with tar.extractfile(member) as src, open(dst_path, 'wb') as out:
+        shutil.copyfileobj(src, out, CHUNK_SIZE)
+    os.utime(dst_path, (member.mtime, member.mtime))
+    return member.size
+
+def restore_from_archive(archive_path, target_folder, paths=None):
+    """
+    Odtwarza archiwum (całe lub wybrane ścieżki). Dla tar.zst z indeksem pojedyncze
+    pliki są czytane od swojej ramki, bez dekompresji całości.
+    """
+    wanted = set(paths) if paths else None
+    stats = CopyStats()
+    name = os.path.basename(archive_path)
+
+    if archive_path.endswith('.zip'):
+        with zipfile.ZipFile(archive_path) as zf:
+            for info in zf.infolist():
+                rel_path = info.filename.rstrip('/')
+                if wanted is not None and not _is_affected(rel_path, wanted):
+                    continue
+                try:
+                    dst_path = zf.extract(info, target_folder)
+                    if not info.is_dir():
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        os.utime(dst_path, (mtime, mtime))
+                        stats.files += 1
+                        stats.bytes += info.file_size
+                except Exception as e:
+                    _report_error(stats, rel_path, target_folder, e)
+        log.info(f"Przywrócono {name}. {stats.finish().summary()}", extra=stats.as_fields())
+        return stats
+
+    zstd = _zstd()
+    dctx = zstd.ZstdDecompressor()
+    index_path = archive_path + '.index.json'
+    if wanted is not None and os.path.isfile(index_path):
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)['files']
+        with open(archive_path, 'rb') as raw:
+            for rel_path, entry in sorted(index.items(), key=lambda kv: (kv[1]['frame'], kv[1]['offset'])):
+                if not _is_affected(rel_path, wanted):
+                    continue
+                try:
+                    raw.seek(entry['frame'])
+                    reader = dctx.stream_reader(raw, read_across_frames=True, closefd=False)
+                    skip = entry['offset']
+                    while skip > 0:
+                        skip -= len(reader.read(min(skip, CHUNK_SIZE)))
+                    with tarfile.open(fileobj=reader, mode='r|') as tar:
+                        stats.bytes += _extract_tar_member(tar, tar.next(), target_folder)
+                        stats.files += 1
+                except Exception as e:
+                    _report_error(stats, rel_path, target_folder, e)
+    else:
+        with open(archive_path, 'rb') as raw:
+            reader = dctx.stream_reader(raw, read_across_frames=True)
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                for member in tar:
+                    rel_path = member.name.rstrip('/')
+                    if wanted is not None and not _is_affected(rel_path, wanted):
+                        continue
+                    try:
+                        size = _extract_tar_member(tar, member, target_folder)
+                        if member.isfile():
+                            stats.files += 1
+                            stats.bytes += size
+                    except Exception as e:
+                        _report_error(stats, rel_path, target_folder, e)
+    log.info(f"Przywrócono {name}. {stats.finish().summary()}", extra=stats.as_fields())
+    return stats
+
+# ====== Retencja i sprzątanie starych migawek =================================
+
+SNAPSHOT_NAME_RE = re.compile(r'^backup_(\d{8}_\d{6})(?:_\d+)?$')
+
+class RetentionPolicy:
+    """
+    Które migawki zachować: `keep_last` najnowszych oraz po jednej (najnowszej)
+    z każdej z ostatnich `hourly`/`daily`/`weekly`/`monthly` godzin/dni/tygodni/miesięcy.
+    `max_total_size` (bajty) – po regułach usuwane są najstarsze migawki, aż zajętość
+    spadnie poniżej limitu. Najnowsza migawka nigdy nie jest usuwana.
+    """
+    BUCKETS = (('hourly', '%Y-%m-%d %H'), ('daily', '%Y-%m-%d'),
+               ('weekly', '%G-%V'), ('monthly', '%Y-%m'))
+
+    def __init__(self, keep_last=0, hourly=0, daily=0, weekly=0, monthly=0, max_total_size=None):
+        self.keep_last = keep_last
+        self.hourly = hourly
+        self.daily = daily
+        self.weekly = weekly
+        self.monthly = monthly
+        self.max_total_size = max_total_size
+
+    def active(self):
+        return bool(self.keep_last or self.hourly or self.daily or self.weekly or self.monthly
+                    or self.max_total_size)
+
+    def select_keep(self, snapshots):
+        """snapshots: lista (nazwa, datetime); zwraca zbiór nazw do zachowania."""
+        newest_first = sorted(snapshots, key=lambda s: s[1], reverse=True)
+        if not newest_first:
+            return set()
+        if not (self.keep_last or self.hourly or self.daily or self.weekly or self.monthly):
+            return {name for name, _ in newest_first}  # tylko limit rozmiaru
+        keep = {newest_first[0][0]}
+        keep.update(name for name, _ in newest_first[:self.keep_last])
+        for attr, fmt in self.BUCKETS:
+            count = getattr(self, attr)
+            seen = set()
+            for name, ts in newest_first:
+                if len(seen) >= count:
+                    break
+                bucket = ts.strftime(fmt)
+                if bucket not in seen:
+                    seen.add(bucket)
+                    keep.add(name)
+        return keep
+
+class Snapshot:
+    """Migawka w folderze docelowym: 'tree' (folder), 'archive' (plik) lub 'store' (manifest)."""
+    def __init__(self, name, kind, path, timestamp):
+        self.name = name
+        self.kind = kind
+        self.path = path
+        self.timestamp = timestamp
+
+def _snapshot_time(name):
+    match = SNAPSHOT_NAME_RE.match(name)
+    return datetime.datetime.strptime(match.group(1), '%Y%m%d_%H%M%S') if match else None
+
+def list_snapshots(dst_folder):
+    """Wszystkie migawki w dst_folder, od najstarszej."""
+    found = []
+    if os.path.isdir(dst_folder):
+        with os.scandir(dst_folder) as it:
+            for entry in it:
+                name = entry.name
+                if entry.is_dir():
+                    kind = 'tree'
+                else:
+                    kind = 'archive'
+                    for fmt in ARCHIVE_FORMATS:
+                        if name.endswith('.' + fmt):
+                            name = name[:-len(fmt) - 1]
+                            break
+                    else:
+                        continue
+                ts = _snapshot_time(name)
+                if ts:
+                    found.append(Snapshot(name, kind, entry.path, ts))
+    for name in list_store_snapshots(dst_folder):
+        ts = _snapshot_time(name)
+        if ts:
+            found.append(Snapshot(name, 'store',
+                                  os.path.join(store_path(dst_folder), 'snapshots', f'{name}.json'), ts))
+    return sorted(found, key=lambda s: (s.timestamp, s.name))
+
+def _snapshot_usage(snapshot, store_dir, blob_sizes):
+    """
+    {klucz: bajty} zajmowane przez migawkę. Klucze są współdzielone między migawkami
+    (i-węzeł przy hard-linkach, hash bloku w magazynie), więc usunięcie migawki
+    zwalnia tylko to, czego nie używa już żadna inna.
+    """
+    usage = {}
+    if snapshot.kind == 'archive':
+        for path in (snapshot.path, snapshot.path + '.index.json'):
+            if os.path.exists(path):
+                usage[('file', path)] = os.path.getsize(path)
+    elif snapshot.kind == 'tree':
+        for dirpath, dirnames, filenames in os.walk(snapshot.path):
+            for name in filenames:
+                try:
+                    st = os.lstat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                usage[('inode', st.st_dev, st.st_ino)] = st.st_size
+    else:
+        with open(snapshot.path, 'r', encoding='utf-8') as f:
+            for entry in json.load(f)['files'].values():
+                for digest in entry['chunks']:
+                    if digest not in blob_sizes:
+                        try:
+                            blob_sizes[digest] = os.path.getsize(_blob_path(store_dir, digest))
+                        except OSError:
+                            blob_sizes[digest] = 0
+                    usage[('blob', digest)] = blob_sizes[digest]
+    return usage
+
+def plan_prune(dst_folder, policy):
+    """Zwraca listę migawek do usunięcia (od najstarszej) wg polityki retencji."""
+    snapshots = list_snapshots(dst_folder)
+    to_remove = []
+    kept = []
+    for kind in ('tree', 'archive', 'store'):
+        group = [s for s in snapshots if s.kind == kind]
+        keep = policy.select_keep([(s.name, s.timestamp) for s in group])
+        for s in group:
+            (kept if s.name in keep else to_remove).append(s)
+
+    if policy.max_total_size and len(kept) > 1:
+        store_dir = store_path(dst_folder)
+        blob_sizes = {}
+        usages = {s.name + s.kind: _snapshot_usage(s, store_dir, blob_sizes) for s in kept}
+        refcount = {}
+        distinct = {}
+        for usage in usages.values():
+            distinct.update(usage)
+            for key in usage:
+                refcount[key] = refcount.get(key, 0) + 1
+        total = sum(distinct.values())
+        kept.sort(key=lambda s: (s.timestamp, s.name))
+        newest = kept[-1]
+        for s in kept[:-1]:
+            if total <= policy.max_total_size:
+                break
+            for key, size in usages[s.name + s.kind].items():
+                refcount[key] -= 1
+                if refcount[key] == 0:
+                    total -= size
+            to_remove.append(s)
+        if total > policy.max_total_size:
+            log.warning(f"Limit rozmiaru przekroczony nawet po usunięciu starych migawek "
+                        f"(zostaje najnowsza: {newest.name}).")
+    return sorted(to_remove, key=lambda s: (s.timestamp, s.name))
+
+class RateLimiter:
+    """Najwyżej `rate` operacji na sekundę (0 = bez limitu)."""
+    def __init__(self, rate):
+        self.rate = rate
+        self.next_time = time.monotonic()
+
+    def wait(self):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        if self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(now, self.next_time) + 1.0 / self.rate
+
+class Pruner:
+    """
+    Usuwa migawki spoza polityki retencji w wątku w tle. Usuwanie jest
+    ograniczone (`max_deletes_per_s`) i wstrzymuje się, gdy trwa kopiowanie
+    (`lock` to blokada BackupHandler). Wspólne dane są bezpieczne: w folderach
+    z hard-linkami usuwane są tylko dowiązania, a bloki magazynu usuwa dopiero
+    GC, gdy żadna pozostała migawka się do nich nie odwołuje.
+    """
+    def __init__(self, dst_folder, policy, lock=None, max_deletes_per_s=200, observer=None):
+        self.dst_folder = dst_folder
+        self.observer = observer
+        self.policy = policy
+        self.lock = lock or threading.Lock()
+        self.limiter = RateLimiter(max_deletes_per_s)
+        self.wakeup = threading.Event()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+
+    def request(self):
+        self.wakeup.set()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.wakeup.wait()
+            self.wakeup.clear()
+            if not self.stop_event.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    log.error(f"Błąd podczas usuwania starych migawek: {e}")
+
+    def _throttle(self):
+        # ustępuje aktywnemu kopiowaniu i trzyma tempo usuwania
+        while self.lock.locked() and not self.stop_event.is_set():
+            time.sleep(0.5)
+        self.limiter.wait()
+        return not self.stop_event.is_set()
+
+    def _remove_tree(self, path):
+        for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+            for name in filenames:
+                if not self._throttle():
+                    return False
+                os.remove(os.path.join(dirpath, name))
+            os.rmdir(dirpath)
+        return True
+
+    def run_once(self, dry_run=False):
+        """Jeden przebieg sprzątania; zwraca listę usuniętych (lub planowanych) migawek."""
+        started = time.monotonic()
+        removed = self._prune(dry_run)
+        if self.observer and not dry_run:
+            self.observer('phase', phase='prune', seconds=time.monotonic() - started, removed=len(removed))
+        return removed
+
+    def _prune(self, dry_run):
+        with self.lock:
+            plan = plan_prune(self.dst_folder, self.policy)
+        removed = []
+        store_touched = False
+        for snapshot in plan:
+            if dry_run:
+                removed.append(snapshot)
+                continue
+            if not self._throttle():
+                break
+            try:
+                if snapshot.kind == 'tree':
+                    if not self._remove_tree(snapshot.path):
+                        break
+                elif snapshot.kind == 'archive':
+                    os.remove(snapshot.path)
+                    if os.path.exists(snapshot.path + '.index.json'):
+                        os.remove(snapshot.path + '.index.json')
+                else:
+                    os.remove(snapshot.path)
+                    store_touched = True
+                removed.append(snapshot)
+                log.info(f"Usunięto starą migawkę: {snapshot.name} ({snapshot.kind})",
+                         extra={'snapshot': snapshot.name, 'kind': snapshot.kind})
+            except OSError as e:
+                log.warning(f"Nie udało się usunąć migawki {snapshot.name}: {e}")
+        if store_touched:
+            self.collect_garbage()
+        return removed
+
+    def _referenced_blobs(self):
+        referenced = set()
+        names = list_store_snapshots(self.dst_folder)
+        for name in names:
+            for entry in load_store_snapshot(self.dst_folder, name)['files'].values():
+                referenced.update(entry['chunks'])
+        return referenced, names
+
+    def collect_garbage(self, batch=500):
+        """
+        Usuwa bloki magazynu, do których nie odwołuje się żadna migawka. Usuwanie
+        idzie paczkami pod blokadą kopii; jeśli w międzyczasie powstała nowa
+        migawka, zbiór używanych bloków jest liczony od nowa.
+        """
+        objects_dir = os.path.join(store_path(self.dst_folder), 'objects')
+        if not os.path.isdir(objects_dir):
+            return 0
+        with self.lock:
+            referenced, names = self._referenced_blobs()
+        candidates = [entry.path for sub in os.scandir(objects_dir) if sub.is_dir()
+                      for entry in os.scandir(sub.path)
+                      if entry.name.split('.')[0] not in referenced]
+        removed = 0
+        for start in range(0, len(candidates), batch):
+            while self.lock.locked() and not self.stop_event.is_set():
+                time.sleep(0.5)
+            if self.stop_event.is_set():
+                break
+            with self.lock:
+                if list_store_snapshots(self.dst_folder) != names:
+                    referenced, names = self._referenced_blobs()
+                for path in candidates[start:start + batch]:
+                    if os.path.basename(path).split('.')[0] in referenced:
+                        continue
+                    self.limiter.wait()
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        if removed:
+            log.info(f"GC magazynu: usunięto {removed} nieużywanych bloków.", extra={'blobs_removed': removed})
+        return removed
+
+# ====== Kolejka zdarzeń z debouncingiem (tryb obserwacji zmian) ===============
+
+class EventCoalescer:
+    """
+    Zbiera ścieżki ze zdarzeń watchdoga w kolejce, usuwa duplikaty i po
+    `quiet_window` sekundach ciszy przekazuje je jednym wywołaniem `callback(paths)`
+    w osobnym wątku roboczym. `max_delay` ogranicza opóźnienie przy ciągłym strumieniu zdarzeń.
+    """
+    _STOP = object()
+
+    def __init__(self, callback, quiet_window=2.0, max_delay=60.0, observer=None):
+        self.callback = callback
+        self.observer = observer  # dostaje 'event_queued' z głębokością kolejki i 'batch' z rozmiarem paczki
+        self.quiet_window = quiet_window
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self.worker = None
+
+    def start(self):
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    def stop(self):
+        if self.worker:
+            self.queue.put(self._STOP)
+            self.worker.join()
+            self.worker = None
+
+    def put(self, path):
+        self.queue.put(path)
+        if self.observer:
+            self.observer('event_queued', depth=self.queue.qsize())
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is self._STOP:
+                return
+            batch = {item}
+            deadline = time.monotonic() + self.max_delay
+            stopping = False
+            while True:
+                timeout = min(self.quiet_window, deadline - time.monotonic())
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                batch.add(item)
+            # błąd jednej kopii (np. pełny lub odłączony dysk docelowy) nie może zatrzymać wątku –
+            # kolejne zmiany mają dalej uruchamiać kopię
+            try:
+                if self.observer:
+                    self.observer('batch', paths=len(batch), depth=self.queue.qsize())
+                self.callback(batch)
+            except Exception:
+                log.exception(f"Błąd kopii zapasowej po zmianach ({len(batch)} ścieżek) – obserwacja trwa dalej")
+            if stopping:
+                return
@@ -0,0 +1,196 @@
+"""
+Metryki i postęp kopii zapasowych.
+
+Silnik wysyła zdarzenia przez funkcję observer(zdarzenie, **pola) przekazaną do
+BackupHandler (lub copy_files / backup_to_store / ...). BackupMetrics zbiera je
+w liczniki i rozsyła dalej do subskrybentów, np. JsonLinesWriter (jedna linia
+JSON na zdarzenie) albo lokalnego endpointu w formacie tekstowym Prometheusa.
+
+    metrics = BackupMetrics()
+    metrics.subscribe(JsonLinesWriter('backup-metrics.jsonl'))
+    serve_prometheus(metrics, 9469)
+    handler = BackupHandler(src, dst, 'automatic', observer=metrics.emit)
+
+Zdarzenia silnika:
+    backup_started   paths (None = pełne skanowanie)
+    progress         scanned, files, linked, bytes, errors  (co ~0.5 s w trakcie kopii)
+    phase            phase ('scan' / 'copy' / 'verify' / 'prune'), seconds
+    backup_finished  ok, scanned, files, skipped, linked, bytes, errors, elapsed_s, slowest
+    event_queued     depth (głębokość kolejki zdarzeń w trybie obserwacji)
+    batch            paths, depth (paczka zdarzeń przekazana do kopii)
+"""
+import datetime
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger('backup')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# (nazwa, typ, opis) – kolejność eksportu
+_METRICS = [
+    ('backup_runs_total', 'counter', "Zakończone przebiegi kopii."),
+    ('backup_runs_failed_total', 'counter', "Przebiegi zakończone błędem lub z błędami plików."),
+    ('backup_files_scanned_total', 'counter', "Pliki przekazane przez skaner do kopii."),
+    ('backup_files_copied_total', 'counter', "Pliki skopiowane (zapisane)."),
+    ('backup_files_skipped_total', 'counter', "Pliki niezmienione (hard-link / ponowne użycie bloków)."),
+    ('backup_files_failed_total', 'counter', "Pliki, których nie udało się skopiować."),
+    ('backup_bytes_copied_total', 'counter', "Zapisane bajty."),
+    ('backup_events_received_total', 'counter', "Zdarzenia systemu plików przyjęte do kolejki."),
+    ('backup_phase_seconds_total', 'counter', "Łączny czas faz kopii [s]."),
+    ('backup_running', 'gauge', "1 w trakcie kopii."),
+    ('backup_event_queue_depth', 'gauge', "Bieżąca głębokość kolejki zdarzeń (tryb obserwacji)."),
+    ('backup_last_run_timestamp_seconds', 'gauge', "Czas zakończenia ostatniej kopii (epoch)."),
+    ('backup_last_run_duration_seconds', 'gauge', "Czas trwania ostatniej kopii [s]."),
+    ('backup_last_run_success', 'gauge', "1, gdy ostatnia kopia przeszła bez błędów."),
+    ('backup_slowest_file_seconds', 'gauge', "Najwolniejsze pliki ostatniej kopii [s]."),
+]
+
+
+class BackupMetrics:
+    """
+    Odbiorca zdarzeń silnika: liczniki skumulowane od startu procesu, gauge
+    z ostatniego przebiegu oraz rozsyłanie zdarzeń do subskrybentów.
+    emit() jest wołane z wątków roboczych, więc stan chroni blokada.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self.counters = {name: 0 for name, kind, _ in _METRICS if kind == 'counter'}
+        self.phase_seconds = {}
+        self.running = 0
+        self.queue_depth = 0
+        self.last_run = {}
+        self.slowest = []
+
+    def subscribe(self, callback):
+        """callback(rekord) dostaje każde zdarzenie jako słownik z polami 'ts' i 'event'."""
+        self.subscribers.append(callback)
+        return callback
+
+    def emit(self, event, **fields):
+        with self.lock:
+            self._update(event, fields)
+        record = {'ts': datetime.datetime.now().isoformat(timespec='milliseconds'), 'event': event}
+        record.update(fields)
+        for callback in self.subscribers:
+            try:
+                callback(record)
+            except Exception as e:
+                log.warning(f"Błąd subskrybenta metryk: {e}")
+
+    def _update(self, event, fields):
+        counters = self.counters
+        if event == 'backup_started':
+            self.running = 1
+        elif event == 'phase':
+            phase = fields['phase']
+            self.phase_seconds[phase] = self.phase_seconds.get(phase, 0.0) + fields['seconds']
+        elif event == 'backup_finished':
+            self.running = 0
+            counters['backup_runs_total'] += 1
+            if not fields.get('ok'):
+                counters['backup_runs_failed_total'] += 1
+            counters['backup_files_scanned_total'] += fields.get('scanned', 0)
+            counters['backup_files_copied_total'] += fields.get('files', 0)
+            counters['backup_files_skipped_total'] += fields.get('skipped', 0)
+            counters['backup_files_failed_total'] += fields.get('errors', 0)
+            counters['backup_bytes_copied_total'] += fields.get('bytes', 0)
+            self.last_run = {'timestamp': time.time(), 'duration': fields.get('elapsed_s', 0.0),
+                             'success': 1 if fields.get('ok') else 0}
+            self.slowest = fields.get('slowest', [])
+        elif event == 'event_queued':
+            counters['backup_events_received_total'] += 1
+            self.queue_depth = fields['depth']
+        elif event == 'batch':
+            self.queue_depth = fields['depth']
+
+    def snapshot(self):
+        """Kopia bieżącego stanu (słownik) – dla GUI, testów i eksportu."""
+        with self.lock:
+            return {'counters': dict(self.counters), 'phase_seconds': dict(self.phase_seconds),
+                    'running': self.running, 'queue_depth': self.queue_depth,
+                    'last_run': dict(self.last_run), 'slowest': list(self.slowest)}
+
+    def prometheus_text(self):
+        state = self.snapshot()
+        last = state['last_run']
+        samples = {name: [('', value)] for name, value in state['counters'].items()}
+        samples['backup_phase_seconds_total'] = [(f'{{phase="{phase}"}}', seconds)
+                                                 for phase, seconds in sorted(state['phase_seconds'].items())]
+        samples['backup_running'] = [('', state['running'])]
+        samples['backup_event_queue_depth'] = [('', state['queue_depth'])]
+        if last:
+            samples['backup_last_run_timestamp_seconds'] = [('', last['timestamp'])]
+            samples['backup_last_run_duration_seconds'] = [('', last['duration'])]
+            samples['backup_last_run_success'] = [('', last['success'])]
+        samples['backup_slowest_file_seconds'] = [(f'{{path="{_escape_label(item["path"])}"}}', item['seconds'])
+                                                  for item in state['slowest']]
+        lines = []
+        for name, kind, help_text in _METRICS:
+            if not samples.get(name):
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(f'{name}{labels} {value}' for labels, value in samples[name])
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class JsonLinesWriter:
+    """
+    Subskrybent zapisujący każde zdarzenie jako jedną linię JSON (plik otwierany
+    w trybie dopisywania). Domyślnie pomija pojedyncze 'event_queued' – przy
+    burzy zdarzeń głębokość kolejki i tak trafia do logu ze zdarzeniem 'batch'.
+    """
+    def __init__(self, path, skip=('event_queued',)):
+        self.lock = threading.Lock()
+        self.skip = set(skip)
+        self.file = open(path, 'a', encoding='utf-8')
+
+    def __call__(self, record):
+        if record['event'] in self.skip:
+            return
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.lock:
+            self.file.write(line + '\n')
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+def serve_prometheus(metrics, port, host='127.0.0.1'):
+    """
+    Uruchamia w wątku w tle serwer HTTP z metrykami w formacie tekstowym
+    Prometheusa pod /metrics. Domyślnie nasłuchuje tylko lokalnie.
+    Zwraca serwer (server.shutdown() go zatrzymuje).
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # bez logu dostępu przy każdym odczycie
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    log.info(f"Metryki Prometheus: http://{host}:{server.server_address[1]}/metrics",
+             extra={'metrics_port': server.server_address[1]})
+    return server
@@ -0,0 +1,68 @@
+"""
+Pomiar czasu agregacji planera (TaskSummary: agregat, szczegóły, pivot) na syntetycznej tabeli zadań.
+
+    python bench_aggregate.py [--rows 1000000] [--people 300] [--text-dates]
+
+Tabela ma kolumny jak arkusz zadań: zasobnik (imiona w różnej wielkości liter, z odstępami,
+puste i kosze TO DO / HOLD), data utworzenia i ukończenia (~35% nieukończonych). Domyślnie daty
+są już datami (jak z read_excel), --text-dates – tekst dd.mm.rrrr (mierzone jest też parsowanie).
+Mierzone osobno: parsowanie dat, jedno przejście TaskSummary i budowa trzech wyników.
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from planner import TaskSummary, column_datetime
+
+COLUMNS = ('Zasobnik', 'Data utworzenia', 'Data ukończenia')
+
+
+def make_tasks(rows, people, text_dates, seed=0):
+    rng = np.random.default_rng(seed)
+    names = [f"Osoba {i}" for i in range(people)]
+    names += [n.upper() for n in names[:people // 10]] + [f" {n}  " for n in names[:people // 10]]
+    names += ['', 'TO DO', 'HOLD', None]
+    person = np.array(names, dtype=object)[rng.integers(0, len(names), rows)]
+    created = pd.Timestamp('2022-01-01') + pd.to_timedelta(rng.integers(0, 4 * 365, rows), 'D')
+    completed = pd.Series(created + pd.to_timedelta(rng.integers(0, 200, rows), 'D'))
+    completed[rng.random(rows) < 0.35] = pd.NaT
+    created = pd.Series(created)
+    if text_dates:
+        created, completed = created.dt.strftime('%d.%m.%Y'), completed.dt.strftime('%d.%m.%Y')
+    return pd.DataFrame(dict(zip(COLUMNS, (person, created, completed))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_aggregate.py', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--people', type=int, default=300)
+    parser.add_argument('--text-dates', action='store_true', help="daty jako tekst dd.mm.rrrr")
+    args = parser.parse_args(argv)
+
+    df = make_tasks(args.rows, args.people, args.text_dates)
+    timings = {}
+    started = time.perf_counter()
+    for col in COLUMNS[1:]:
+        column_datetime(df, col)
+    timings['daty'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    summary = TaskSummary(df, *COLUMNS)
+    timings['TaskSummary'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    aggr, details, pivot = summary.aggregate(), summary.details(), summary.pivot()
+    timings['wyniki'] = time.perf_counter() - started
+
+    print(f"{args.rows} wierszy, {len(summary.people)} osób: agregat {len(aggr)}, szczegóły {len(details)}, "
+          f"pivot {len(pivot)} wierszy")
+    print(" | ".join(f"{name} {seconds:.2f} s" for name, seconds in timings.items())
+          + f" | razem {sum(timings.values()):.2f} s")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,16 @@
+import glob
+import hashlib
+import json
+import multiprocessing
 import os
+import queue
+import threading
+import weakref
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
+import numpy as np
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from typing import Optional  # ← ważne
 
@@ -13,6 +22,7 @@ DEFAULT_MASTER_PATH = r"C:\Sciezka\do\Excel1_master.xlsx"
 
 # ==== KONFIG – data „fałszywa” z nowego systemu (Panasonic) ==================
 SENTINEL_CREATED = datetime(2025, 4, 10).date()   # 10.04.2025
+ID_COLUMN = "Identyfikator zadania"               # kolumna ID używana jako klucz, jeśli istnieje
 
 # ====== Pomocnicze ============================================================
 
@@ -37,12 +47,16 @@ def best_guess_column(columns, candidates):
                 best, best_len = col, len(c)
     return best or (columns[0] if columns else None)
 
+def pick_sheet(sheet_names):
+    preferred = [s for s in sheet_names
+                 if str(s).strip().lower() in {'data','dane','tasks','zadania','sheet1','arkusz1'}]
+    return preferred[0] if preferred else (sheet_names[0] if sheet_names else None)
+
 def detect_sheet(path):
+    """Arkusz z danymi; path może być ścieżką albo otwartym pd.ExcelFile (bez ponownego otwierania)."""
     try:
-        xls = pd.ExcelFile(path)
-        preferred = [s for s in xls.sheet_names
-                     if str(s).strip().lower() in {'data','dane','tasks','zadania','sheet1','arkusz1'}]
-        return preferred[0] if preferred else xls.sheet_names[0]
+        xls = path if isinstance(path, pd.ExcelFile) else pd.ExcelFile(path)
+        return pick_sheet(xls.sheet_names)
     except Exception:
         return None
 
@@ -53,21 +67,93 @@ def norm_text(s: pd.Series) -> pd.Series:
               .str.replace('\u200b', '', regex=False)  # zero-width space
               .replace({'nan':'', 'None':''}))
 
+# Formaty sprawdzane przy wykrywaniu formatu kolumny (PL dd.mm.rrrr, ISO, z godziną i bez)
+DATE_FORMATS = ('%d.%m.%Y', '%d.%m.%Y %H:%M', '%d.%m.%Y %H:%M:%S', 'ISO8601',
+                '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d-%m-%Y', '%d.%m.%y')
+DATE_SAMPLE = 200            # tyle unikalnych wartości wystarcza do wykrycia formatu
+_format_hints = {}           # nazwa kolumny -> ostatnio wykryty format (sprawdzany jako pierwszy)
+_frame_memo = {}             # id(DataFrame) -> (weakref, {klucz: (liczba wierszy, wynik)})
+
+def _detect_format(values: pd.Series, hint=None):
+    """Format pasujący do największej części próbki wartości (tekst, bez pustych)."""
+    sample = values.iloc[:DATE_SAMPLE]
+    best, best_count = None, 0
+    for fmt in ([hint] if hint else []) + [f for f in DATE_FORMATS if f != hint]:
+        count = pd.to_datetime(sample, format=fmt, errors='coerce').notna().sum()
+        if count > best_count:
+            best, best_count = fmt, count
+        if count == len(sample):
+            break
+    return best
+
+def _parse_unique(values: pd.Series, hint=None):
+    # values – unikalne wartości; tekst: wykryty format, potem pozostałe formaty tylko dla
+    # niesparsowanych, na końcu rozpoznawanie pandas (dzień pierwszy); daty/liczby – bez formatu
+    is_text = values.map(type).eq(str).to_numpy()
+    out = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if (~is_text).any():
+        out.loc[~is_text] = pd.to_datetime(values[~is_text], errors='coerce')
+    text = values[is_text].str.strip()
+    text = text[text != '']
+    fmt = _detect_format(text, hint) if len(text) else None
+    for candidate in ([fmt] if fmt else []) + [f for f in DATE_FORMATS if f != fmt]:
+        if not len(text):
+            break
+        parsed = pd.to_datetime(text, format=candidate, errors='coerce')
+        ok = parsed.notna()
+        out.loc[ok[ok].index] = parsed[ok]
+        text = text[~ok]
+    if len(text):
+        out.loc[text.index] = pd.to_datetime(text, errors='coerce', dayfirst=True, format='mixed')
+    return out, fmt
+
 def smart_datetime(s: pd.Series) -> pd.Series:
-    """Solidne parsowanie dat (PL dd.mm.rrrr i ISO). Zwraca datetime64[ns]."""
+    """
+    Solidne parsowanie dat (PL dd.mm.rrrr i ISO). Zwraca datetime64[ns].
+    Parsowane są tylko unikalne wartości (daty mocno się powtarzają), a format jest
+    wykrywany raz dla kolumny (próbka) i zapamiętywany dla kolumn o tej samej nazwie.
+    """
     if not isinstance(s, pd.Series):
         s = pd.Series(s)
-    dt = pd.to_datetime(s, errors='coerce', dayfirst=True, infer_datetime_format=True)
-    # dopalacz dla  dd.mm.yyyy HH:MM  /  dd.mm.yyyy
-    mask = dt.isna() & s.astype(str).str.contains(r"\d{1,2}\.\d{1,2}\.\d{2,4}")
-    if mask.any():
-        vals = s[mask].astype(str).str.strip()
-        dt2 = pd.to_datetime(vals, format='%d.%m.%Y', errors='coerce')
-        still = dt2.isna()
-        if still.any():
-            dt2.loc[still] = pd.to_datetime(vals[still], format='%d.%m.%Y %H:%M', errors='coerce')
-        dt.loc[mask] = dt2
-    return dt
+    if pd.api.types.is_datetime64_any_dtype(s.dtype):
+        return s.astype('datetime64[ns]')
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    parsed, fmt = _parse_unique(pd.Series(uniques, dtype=object), _format_hints.get(s.name))
+    if fmt and s.name is not None:
+        _format_hints[s.name] = fmt
+    # NaT na końcu: kod -1 (brak wartości) wskazuje na niego – także gdy kolumna jest cała pusta
+    values = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))[codes]
+    return pd.Series(values, index=s.index, name=s.name)
+
+def _memo_slot(df: pd.DataFrame) -> dict:
+    # wyniki zapamiętane dla tej ramki; znikają razem z nią (weakref)
+    entry = _frame_memo.get(id(df))
+    if entry is None or entry[0]() is not df:
+        entry = (weakref.ref(df), {})
+        _frame_memo[id(df)] = entry
+        weakref.finalize(df, _frame_memo.pop, id(df), None)
+    return entry[1]
+
+def _memoized(df: pd.DataFrame, key, compute):
+    slot = _memo_slot(df)
+    cached = slot.get(key)
+    if cached is None or cached[0] != len(df):
+        cached = (len(df), compute())
+        slot[key] = cached
+    return cached[1]
+
+def remember(df: pd.DataFrame, key, value):
+    """Zapisuje gotowy wynik (np. z cache mastera) jako zapamiętany dla ramki."""
+    _memo_slot(df)[key] = (len(df), value)
+
+def column_datetime(df: pd.DataFrame, col) -> pd.Series:
+    """
+    smart_datetime(df[col]) zapamiętany dla tej ramki i kolumny – podgląd, zapis i klucze
+    korzystają z jednego parsowania. Brak kolumny -> same NaT.
+    """
+    if col not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    return _memoized(df, ('date', col), lambda: smart_datetime(df[col]))
 
 def norm_date_string(s: pd.Series) -> pd.Series:
     dt = smart_datetime(s)
@@ -77,32 +163,103 @@ def filter_bins(person: pd.Series) -> pd.Series:
     up = person.str.upper()
     return ~(up.isin(["TO DO", "INSTRUKCJA", "HOLD"]))
 
+# ====== Agregacja (wspólny rdzeń: agregat, szczegóły, pivot) ==================
+
+def _quarters(dt: pd.Series):
+    # numer kwartału liczony od 1970 (rok = q // 4 + 1970, kwartał = q % 4 + 1) i maska dat
+    values = dt.to_numpy(dtype='datetime64[ns]')
+    valid = ~np.isnat(values)
+    return values.astype('datetime64[M]').view(np.int64) // 3, valid
+
+class TaskSummary:
+    """
+    Znormalizowane kolumny zadań (osoba po norm_text + filter_bins, daty, kwartały) i liczniki
+    osoba × kwartał: utworzone, ukończone, nieukończone – policzone jednym przejściem (kody + np.bincount).
+    Z tego wyniku powstają agregat, szczegóły i pivot. Kolejność wierszy jak dotąd:
+    osoba bez rozróżniania wielkości liter, rok, kwartał.
+    """
+    def __init__(self, df, col_person, col_created, col_completed):
+        # osoba: normalizacja tylko unikalnych wartości (kod -1 = brak -> ostatni element)
+        codes, uniques = pd.factorize(df[col_person])
+        # brak osoby (także NaN, który norm_text w kolumnie tekstowej zostawia) -> '—'
+        names = norm_text(pd.Series(uniques)).replace('', '—').fillna('—')
+        names = pd.concat([names, pd.Series(['—'])], ignore_index=True)
+        keep_names = filter_bins(names).to_numpy()
+        name_codes, people = pd.factorize(names)
+        people = np.asarray(people, dtype=object)
+        order = sorted(range(len(people)), key=lambda i: (people[i].casefold(), people[i]))
+        rank = np.empty(len(people), dtype=np.int64)
+        rank[order] = np.arange(len(people))
+        self.people = people[order]
+        self.fold = pd.factorize(pd.Series([p.casefold() for p in self.people], dtype=object))[0]
+
+        keep = keep_names[codes]
+        self.person = rank[name_codes[codes[keep]]]
+        self.created = column_datetime(df, col_created).to_numpy(dtype='datetime64[ns]')[keep]
+        self.completed = column_datetime(df, col_completed).to_numpy(dtype='datetime64[ns]')[keep]
+        self.created_q, self.created_valid = _quarters(pd.Series(self.created))
+        self.completed_q, self.completed_valid = _quarters(pd.Series(self.completed))
+        self.not_done = ~self.completed_valid & self.created_valid
+
+        # jedna siatka osoba × kwartał dla wszystkich trzech liczników
+        self.quarters = np.unique(np.concatenate([self.created_q[self.created_valid],
+                                                  self.completed_q[self.completed_valid]]))
+        size = len(self.people) * len(self.quarters)
+        created_cell = self.person * len(self.quarters) + np.searchsorted(self.quarters, self.created_q)
+        completed_cell = self.person * len(self.quarters) + np.searchsorted(self.quarters, self.completed_q)
+        self.n_created = np.bincount(created_cell[self.created_valid], minlength=size)
+        self.n_done = np.bincount(completed_cell[self.completed_valid], minlength=size)
+        self.n_not_done = np.bincount(created_cell[self.not_done], minlength=size)
+
+    def _cells(self, used):
+        # niezerowe komórki w kolejności: osoba (casefold), kwartał, osoba (dokładnie)
+        cells = np.flatnonzero(used)
+        person, quarter = np.divmod(cells, len(self.quarters))
+        cells = cells[np.lexsort((person, quarter, self.fold[person]))]
+        person, quarter = np.divmod(cells, len(self.quarters))
+        q = self.quarters[quarter]
+        return cells, self.people[person], q // 4 + 1970, q % 4 + 1
+
+    def pivot(self) -> pd.DataFrame:
+        cells, person, year, quarter = self._cells((self.n_created > 0) | (self.n_done > 0))
+        return pd.DataFrame({'osoba': person, 'rok': year, 'kwartał': quarter,
+                             'Liczba UTWORZONYCH': self.n_created[cells],
+                             'Liczba ZAKOŃCZONYCH': self.n_done[cells]})
+
+    def aggregate(self) -> pd.DataFrame:
+        cells, person, year, quarter = self._cells((self.n_done > 0) | (self.n_not_done > 0))
+        return pd.DataFrame({'rok': year, 'kwartał': quarter, 'zasobnik': person,
+                             'zadania_ukończone': self.n_done[cells],
+                             'zadania_nieukończone': self.n_not_done[cells]})
+
+    def details(self) -> pd.DataFrame:
+        # ukończone wg daty ukończenia, nieukończone wg daty utworzenia
+        done, not_done = np.flatnonzero(self.completed_valid), np.flatnonzero(self.not_done)
+        rows = np.concatenate([done, not_done])
+        q = np.concatenate([self.completed_q[done], self.created_q[not_done]])
+        created, completed = self.created[rows], self.completed[rows]
+        nat_last = np.iinfo(np.int64).max
+        order = np.lexsort((np.where(np.isnat(completed), nat_last, completed.view(np.int64)),
+                            np.where(np.isnat(created), nat_last, created.view(np.int64)),
+                            q, self.fold[self.person[rows]]))
+        status = np.array(['ukończone', 'nieukończone'], dtype=object)[(np.arange(len(rows)) >= len(done)).astype(int)]
+        return pd.DataFrame({'osoba': self.people[self.person[rows]][order],
+                             'data_utworzenia': created[order], 'data_ukonczenia': completed[order],
+                             'status': status[order], 'rok': (q // 4 + 1970)[order], 'kwartał': (q % 4 + 1)[order]})
+
+def task_summary(df, col_person, col_created, col_completed) -> TaskSummary:
+    """TaskSummary zapamiętany dla ramki i mapowania – podgląd i zapis liczą go raz."""
+    return _memoized(df, ('summary', col_person, col_created, col_completed),
+                     lambda: TaskSummary(df, col_person, col_created, col_completed))
+
 def make_chart_df(df, col_person, col_created, col_completed):
     # Osoba/rok/kwartał + 2 serie: utworzone (wg Data utworzenia), zakończone (wg Data ukończenia)
-    person = norm_text(df[col_person]).replace('', '—')
-    keep = filter_bins(person)
-    person = person[keep]
-    created = smart_datetime(df[col_created])[keep]
-    completed = smart_datetime(df[col_completed])[keep]
-
-    created_df = (
-        pd.DataFrame({'osoba': person, 'rok': created.dt.year, 'kwartał': created.dt.quarter})
-        .dropna(subset=['osoba','rok','kwartał'])
-        .groupby(['osoba','rok','kwartał']).size()
-        .rename('Liczba UTWORZONYCH').reset_index()
-    )
-    done_df = (
-        pd.DataFrame({'osoba': person, 'rok': completed.dt.year, 'kwartał': completed.dt.quarter})
-        .dropna(subset=['rok','kwartał'])
-        .groupby(['osoba','rok','kwartał']).size()
-        .rename('Liczba ZAKOŃCZONYCH').reset_index()
-    )
-    pivot = pd.merge(created_df, done_df, on=['osoba','rok','kwartał'], how='outer')
-    pivot['Liczba UTWORZONYCH']  = pivot['Liczba UTWORZONYCH'].fillna(0).astype(int)
-    pivot['Liczba ZAKOŃCZONYCH'] = pivot['Liczba ZAKOŃCZONYCH'].fillna(0).astype(int)
-    pivot = pivot.sort_values(by=['osoba','rok','kwartał'],
-                              key=lambda s: s.str.casefold() if s.name=='osoba' else s).reset_index(drop=True)
-    return pivot
+    return task_summary(df, col_person, col_created, col_completed).pivot()
+
+def aggregate_and_details(df, col_person, col_created, col_completed):
+    """(agregat osoba/rok/kwartał: ukończone + nieukończone, szczegóły zadań) z jednego TaskSummary."""
+    summary = task_summary(df, col_person, col_created, col_completed)
+    return summary.aggregate(), summary.details()
 
 def write_excel_with_chart(path, pivot_df, aggr_df=None, details_df=None, title="ZADANIE UTWORZONE DO ZAKOŃCZONE"):
     with pd.ExcelWriter(path, engine="xlsxwriter") as writer:
@@ -203,7 +360,7 @@ def build_unique_key(df: pd.DataFrame,
                      col_task: Optional[str],
                      col_created: str,
                      col_completed: str,
-                     id_col: str = "Identyfikator zadania") -> pd.Series:
+                     id_col: str = ID_COLUMN) -> pd.Series:
     """
     Klucz unikalności:
       1) Jeśli istnieje kolumna z ID – użyj jej.
@@ -212,15 +369,20 @@ def build_unique_key(df: pd.DataFrame,
          - jeśli data_utworzenia == 12.04.2025 (SENTINEL) → POMIŃ ją w kluczu
            i dołóż data_ukończenia (jeśli jest), aby rozróżnić różne zadania.
          - jeśli brak kolumny nazwy, użyj (osoba, [data_utworzenia?], [data_ukończenia?]) z powyższą regułą.
+    Wynik jest zapamiętany dla ramki i mapowania kolumn.
     """
+    return _memoized(df, ('key', col_person, col_task, col_created, col_completed, id_col),
+                     lambda: _unique_key(df, col_person, col_task, col_created, col_completed, id_col))
+
+def _unique_key(df, col_person, col_task, col_created, col_completed, id_col):
     cols = list(df.columns)
     if id_col in cols:
         return norm_text(df[id_col])
 
     person = norm_text(df.get(col_person, pd.Series(['']*len(df)))).str.lower()
     task   = norm_text(df.get(col_task,   pd.Series(['']*len(df)))).str.lower() if col_task else pd.Series(['']*len(df))
-    created_dt   = smart_datetime(df.get(col_created,   pd.Series(['']*len(df))))
-    completed_dt = smart_datetime(df.get(col_completed, pd.Series(['']*len(df))))
+    created_dt   = column_datetime(df, col_created)
+    completed_dt = column_datetime(df, col_completed)
 
     created_date   = created_dt.dt.date
     completed_date = completed_dt.dt.date
@@ -238,6 +400,163 @@ def build_unique_key(df: pd.DataFrame,
     )
     return key
 
+class KeyIndex:
+    """
+    Indeks kluczy unikalności zestawu: 64-bitowe skróty kluczy w posortowanych blokach numpy.
+    Sprawdzenie i dopisanie kosztują O(nowe wiersze · log n) – zestaw nie jest ponownie skanowany.
+    Puste klucze (NaN) nigdy nie pasują i nie są dopisywane.
+    """
+    MAX_BLOCKS = 8  # po przekroczeniu bloki są scalane w jeden
+
+    def __init__(self, keys: Optional[pd.Series] = None):
+        self._blocks = []
+        if keys is not None:
+            self.add(keys)
+
+    @staticmethod
+    def _hash(keys: pd.Series):
+        valid = keys.notna().to_numpy()
+        hashes = pd.util.hash_array(keys.to_numpy(dtype=object)[valid])
+        return hashes, valid
+
+    def contains(self, keys: pd.Series) -> np.ndarray:
+        """Maska: klucz jest już w indeksie."""
+        hashes, valid = self._hash(keys)
+        found = np.zeros(len(hashes), dtype=bool)
+        for block in self._blocks:
+            pos = np.searchsorted(block, hashes)
+            found |= block[np.minimum(pos, len(block) - 1)] == hashes
+        mask = np.zeros(len(keys), dtype=bool)
+        mask[valid] = found
+        return mask
+
+    def add(self, keys: pd.Series):
+        hashes = np.unique(self._hash(keys)[0])
+        if len(hashes):
+            self._blocks.append(hashes)
+        if len(self._blocks) > self.MAX_BLOCKS:
+            self._blocks = [np.unique(np.concatenate(self._blocks))]
+
+    def __len__(self):
+        return sum(len(block) for block in self._blocks)
+
+# ====== Pliki użytkownika (Excel #2) ===========================================
+
+USER_CREATED_AFTER = datetime(2025, 4, 12).date()  # dopisujemy tylko zadania utworzone później
+USER_PATTERNS = ('*.xlsx', '*.xlsm', '*.xls')
+
+def prepare_user_frame(df2: pd.DataFrame, key_args):
+    """Filtr dat pliku użytkownika + klucze pozostałych wierszy -> (df2, klucze)."""
+    created_dt = column_datetime(df2, key_args[2]).dt.date
+    mask_keep = (created_dt > USER_CREATED_AFTER).to_numpy()
+    # UWAGA: wszystkie <= 09.04.2025 i == 12.04.2025 odrzucamy
+    keys = build_unique_key(df2, *key_args)[mask_keep]  # daty sparsowane raz, dla całego pliku
+    return df2.loc[mask_keep], keys
+
+def read_user_workbook(path, key_args):
+    """Wczytanie i przygotowanie jednego pliku – funkcja dla puli procesów (scalanie wsadowe)."""
+    with pd.ExcelFile(path) as xls:
+        df2 = xls.parse(detect_sheet(xls) or 0)
+    return prepare_user_frame(df2, key_args)
+
+def user_workbooks(source):
+    """Pliki Excel z folderu albo pasujące do wzorca (np. C:\\raporty\\*_tydz*.xlsx), posortowane."""
+    patterns = [os.path.join(source, p) for p in USER_PATTERNS] if os.path.isdir(source) else [source]
+    paths = {os.path.abspath(p) for pattern in patterns for p in glob.glob(pattern)}
+    return sorted(p for p in paths if not os.path.basename(p).startswith('~$'))  # bez plików blokady Excela
+
+# ====== Cache wczytanego mastera ==============================================
+# Master po parsowaniu trafia do katalogu cache (Parquet, a gdy kolumn nie da się zapisać
+# w Parquet – pickle) razem z kluczami unikalności i sparsowanymi datami. Wpis jest ważny,
+# dopóki ścieżka, rozmiar i czas modyfikacji pliku się nie zmienią.
+
+MASTER_CACHE_VERSION = 1
+
+def master_cache_dir():
+    return os.environ.get('PLANNER_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'planner')
+
+def _master_cache_base(path):
+    digest = hashlib.sha1(os.path.normcase(os.path.abspath(path)).encode('utf-8')).hexdigest()[:20]
+    return os.path.join(master_cache_dir(), digest)
+
+def _source_stamp(path):
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+def _write_frame(df: pd.DataFrame, base: str) -> str:
+    # zapis przez plik tymczasowy + os.replace: przerwany zapis nie zostawia uszkodzonego wpisu
+    try:
+        df.to_parquet(base + '.parquet.tmp', index=False)
+        os.replace(base + '.parquet.tmp', base + '.parquet')
+        fmt = 'parquet'
+    except Exception:  # brak pyarrow, kolumny o mieszanych typach, nazwy kolumn nie-tekstowe
+        if os.path.exists(base + '.parquet.tmp'):
+            os.remove(base + '.parquet.tmp')
+        df.to_pickle(base + '.pkl.tmp')
+        os.replace(base + '.pkl.tmp', base + '.pkl')
+        fmt = 'pickle'
+    stale = base + ('.pkl' if fmt == 'parquet' else '.parquet')
+    if os.path.exists(stale):
+        os.remove(stale)
+    return fmt
+
+def _read_frame(base: str, fmt: str) -> pd.DataFrame:
+    return pd.read_parquet(base + '.parquet') if fmt == 'parquet' else pd.read_pickle(base + '.pkl')
+
+def load_master_cache(path):
+    """
+    (df, meta) z cache albo None, gdy wpisu brak lub plik się zmienił. Zapisane klucze
+    i daty są od razu zapamiętane dla df (build_unique_key / column_datetime ich nie liczą).
+    """
+    base = _master_cache_base(path)
+    try:
+        with open(base + '.json', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != MASTER_CACHE_VERSION or meta.get('source') != _source_stamp(path):
+            return None
+        df = _read_frame(base, meta['format'])
+        derived = _read_frame(base + '.derived', meta['derived_format'])
+    except Exception:
+        return None
+    if len(derived) != len(df):
+        return None
+    for name, col in meta['dates'].items():
+        dates = derived[name].to_numpy(dtype='datetime64[ns]')
+        remember(df, ('date', col), pd.Series(dates, index=df.index, name=col))
+    if meta.get('key') is not None:
+        remember(df, ('key', *meta['key']), pd.Series(derived['key'].to_numpy(), index=df.index))
+    return df, meta
+
+def save_master_cache(path, stamp, df: pd.DataFrame, sheet_names, sheet, key_args=None):
+    """
+    Zapisuje master do cache. stamp – _source_stamp sprzed parsowania (zmiana pliku
+    w trakcie czytania unieważni wpis). key_args – mapowanie kolumn, dla którego zapisać klucze.
+    Błędy zapisu są tylko zgłaszane – cache jest opcjonalny.
+    """
+    base = _master_cache_base(path)
+    try:
+        os.makedirs(master_cache_dir(), exist_ok=True)
+        derived, dates = {}, {}
+        for col in dict.fromkeys(key_args[2:4] if key_args else ()):
+            if col in df.columns:
+                dates[f"date{len(dates)}"] = col
+        for name, col in dates.items():
+            derived[name] = column_datetime(df, col).to_numpy()
+        if key_args:
+            derived['key'] = build_unique_key(df, *key_args).to_numpy(dtype=object)
+        meta = {'version': MASTER_CACHE_VERSION, 'source': stamp,
+                'sheet_names': [str(s) for s in sheet_names], 'sheet': str(sheet),
+                'dates': dates, 'key': [*key_args, ID_COLUMN] if key_args else None}
+        meta['format'] = _write_frame(df, base)
+        meta['derived_format'] = _write_frame(pd.DataFrame(derived, index=range(len(df))), base + '.derived')
+        with open(base + '.json.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(base + '.json.tmp', base + '.json')
+        return True
+    except Exception as e:
+        print(f"Nie udało się zapisać cache mastera: {e}")
+        return False
+
 # ====== GUI ===================================================================
 
 class App(tk.Tk):
@@ -260,6 +579,8 @@ class App(tk.Tk):
         self.df_master = None   # Excel #1
         self.df = None          # scalony master + user
         self.columns = []
+        self.key_index = None   # KeyIndex kluczy self.df (dla mapowania self.key_index_args)
+        self.key_index_args = None
 
         self.create_widgets()
         self.load_master_on_start()
@@ -287,6 +608,8 @@ class App(tk.Tk):
         r1 = ttk.Frame(row1); r1.pack(fill='x', **pad)
         ttk.Entry(r1, textvariable=self.path_user).pack(side='left', fill='x', expand=True, padx=6)
         ttk.Button(r1, text="➕ Wczytaj plik 2 i scal", command=self.load_and_merge_user).pack(side='left')
+        self.batch_button = ttk.Button(r1, text="📂 Scal folder…", command=self.merge_folder)
+        self.batch_button.pack(side='left', padx=6)
 
         # Mapowanie
         box = ttk.LabelFrame(frm, text="Mapowanie kolumn")
@@ -343,12 +666,20 @@ class App(tk.Tk):
             self.log("Brak/nieprawidłowa ścieżka Excel #1 – pomiń wczytanie.")
             return
         try:
-            xls = pd.ExcelFile(path)
-            self.sheet_combo_master['values'] = xls.sheet_names
-            preferred = detect_sheet(path)
-            self.sheet_master.set(preferred or (xls.sheet_names[0] if xls.sheet_names else ""))
-            self.df_master = pd.read_excel(path, sheet_name=self.sheet_master.get() or 0)
-            self.df = self.df_master.copy()  # na starcie zestaw = master
+            cached = load_master_cache(path)
+            if cached is not None:
+                self.df_master, meta = cached
+                sheet_names, sheet = meta['sheet_names'], meta['sheet']
+            else:
+                stamp = _source_stamp(path)
+                with pd.ExcelFile(path) as xls:  # jedno otwarcie: lista arkuszy, wybór, dane
+                    sheet_names = xls.sheet_names
+                    sheet = detect_sheet(xls) or ""
+                    self.df_master = xls.parse(sheet or 0)
+            self.sheet_combo_master['values'] = sheet_names
+            self.sheet_master.set(sheet)
+            self.df = self.df_master  # na starcie zestaw = master (kopia przy zmianie – copy-on-write)
+            self.key_index = None
             self.columns = list(self.df_master.columns)
 
             # mapowanie
@@ -370,11 +701,28 @@ class App(tk.Tk):
             if completed_guess: self.completed_var.set(completed_guess)
             if task_guess: self.task_var.set(task_guess)
 
-            self.log(f"Załadowano Excel #1: {os.path.basename(path)} | Arkusz: {self.sheet_master.get()} | Wierszy: {len(self.df_master)}")
+            if cached is None:
+                save_master_cache(path, stamp, self.df_master, sheet_names, sheet, self._key_args())
+            self.log(f"Załadowano Excel #1: {os.path.basename(path)} | Arkusz: {self.sheet_master.get()} | "
+                     f"Wierszy: {len(self.df_master)}{' (z cache)' if cached is not None else ''}")
         except Exception as e:
             messagebox.showerror("Błąd", f"Nie udało się wczytać Excel #1:\n{e}")
             self.log(f"Błąd wczytywania Excel #1: {e}")
 
+    def _key_args(self):
+        # mapowanie kolumn dla build_unique_key (bez id_col – domyślna)
+        return (self.person_var.get(),
+                self.task_var.get() if self.task_var.get() else None,
+                self.created_var.get(),
+                self.completed_var.get())
+
+    def _merge_index(self, key_args):
+        # indeks kluczy bieżącego zestawu; pełne budowanie tylko przy pierwszym scalaniu lub zmianie mapowania
+        if self.key_index is None or self.key_index_args != key_args:
+            self.key_index = KeyIndex(build_unique_key(self.df, *key_args))
+            self.key_index_args = key_args
+        return self.key_index
+
     # --- Merge user file ---
     def load_and_merge_user(self):
         if self.df_master is None:
@@ -385,43 +733,141 @@ class App(tk.Tk):
         if not path:
             return
         try:
-            df2 = pd.read_excel(path, sheet_name=detect_sheet(path) or 0)
-
-            # filtr dat (tylko po dacie utworzenia)
-            created_col = self.created_var.get()
-            created_dt = smart_datetime(df2[created_col]).dt.date
-            mask_keep = (created_dt > datetime(2025, 4, 12).date())  # tylko > 12.04.2025
-            # UWAGA: wszystkie <= 09.04.2025 i == 12.04.2025 odrzucamy
-            df2 = df2.loc[mask_keep].copy()
-
-            # zbuduj klucze
-            key_master = build_unique_key(
-                self.df_master,
-                self.person_var.get(),
-                self.task_var.get() if self.task_var.get() else None,
-                self.created_var.get(),
-                self.completed_var.get()
-            )
-            key_new = build_unique_key(
-                df2,
-                self.person_var.get(),
-                self.task_var.get() if self.task_var.get() else None,
-                self.created_var.get(),
-                self.completed_var.get()
-            )
-
-            df2['__key__'] = key_new
-            master_keys = set(key_master.dropna().tolist())
-            before = len(df2)
-            df2_new = df2[~df2['__key__'].isin(master_keys)].drop(columns='__key__', errors='ignore')
-            added = len(df2_new)
+            key_args = self._key_args()
+            df2, key_new = read_user_workbook(path, key_args)
+
+            index = self._merge_index(key_args)
+            is_new = ~index.contains(key_new)
+            df2_new = df2.loc[is_new]
+            before, added = len(df2), len(df2_new)
+            summary = (f"Excel #2: {os.path.basename(path)} | wierszy po filtrze: {before} | "
+                       f"już w zestawie: {before - added} | nowych: {added}")
+            if not added:
+                self.log(summary + " | nic do dopisania")
+                return
+            self.log(summary)
+            if not messagebox.askyesno("Scalanie", f"{summary}\n\nDopisać {added} nowych wierszy do zestawu "
+                                                    f"({len(self.df)} → {len(self.df) + added})?"):
+                self.log("Anulowano scalanie.")
+                return
 
-            self.df = pd.concat([self.df_master, df2_new], ignore_index=True)
-            self.log(f"Excel #2: {os.path.basename(path)} | wierszy po filtrze: {before} | nowych dopisano: {added} | razem: {len(self.df)}")
+            self.df = pd.concat([self.df, df2_new], ignore_index=True)
+            index.add(key_new[is_new])
+            self.log(f"Dopisano {added} wierszy | razem: {len(self.df)}")
         except Exception as e:
             messagebox.showerror("Błąd", f"Scalanie nie powiodło się:\n{e}")
             self.log(f"Błąd scalania: {e}")
 
+    # --- Scalanie wsadowe (folder / wzorzec) ---
+    def merge_folder(self):
+        """
+        Scalanie wielu plików: folder z pola Excel #2 (lub wzorzec z * / ?), a gdy puste – wybór folderu.
+        Pliki czyta pula procesów, GUI dostaje postęp przez kolejkę (after), wynik jest dopisywany raz.
+        """
+        if self.df_master is None:
+            messagebox.showwarning("Uwaga", "Najpierw wczytaj lub ustaw Excel #1 (master).")
+            return
+        source = self.path_user.get().strip()
+        if not source or not (os.path.isdir(source) or glob.has_magic(source)):
+            source = filedialog.askdirectory(title="Wybierz folder z plikami Excel #2")
+            if not source:
+                return
+            self.path_user.set(source)
+        paths = user_workbooks(source)
+        if not paths:
+            messagebox.showwarning("Uwaga", f"Brak plików Excel w: {source}")
+            return
+        self.batch_button.configure(state='disabled')
+        self.log(f"Scalanie wsadowe: {len(paths)} plików z {source}")
+        key_args = self._key_args()
+        # wątek tła dostaje tylko migawkę: zestaw i (jeśli pasuje) gotowy indeks – self.key_index
+        # zmienia się wyłącznie w wątku Tk (_poll_batch), po sprawdzeniu, że zestaw się nie zmienił
+        index = self.key_index if self.key_index_args == key_args else None
+        batch = {'paths': paths, 'base': self.df, 'key_args': key_args, 'results': {}, 'index': None,
+                 'progress': queue.Queue()}
+        threading.Thread(target=self._read_batch, args=(paths, self.df, key_args, index, batch['progress']),
+                         daemon=True).start()
+        self.after(100, self._poll_batch, batch)
+
+    @staticmethod
+    def _read_batch(paths, base, key_args, index, progress):
+        # wątek tła: pula procesów czyta pliki, w tym czasie budujemy indeks kluczy zestawu base
+        # (bez dostępu do stanu App)
+        try:
+            # spawn: bez kopiowania procesu z działającym Tk (domyślne i tak na Windows / macOS)
+            with ProcessPoolExecutor(max_workers=min(len(paths), os.cpu_count() or 1),
+                                     mp_context=multiprocessing.get_context('spawn')) as pool:
+                futures = {pool.submit(read_user_workbook, path, key_args): path for path in paths}
+                progress.put(('index', None, index if index is not None else
+                              KeyIndex(build_unique_key(base, *key_args))))
+                for future in as_completed(futures):
+                    try:
+                        progress.put(('file', futures[future], future.result()))
+                    except Exception as e:
+                        progress.put(('error', futures[future], e))
+        except Exception as e:
+            progress.put(('error', None, e))
+        progress.put(('done', None, None))
+
+    def _poll_batch(self, batch):
+        paths, results = batch['paths'], batch['results']
+        while True:
+            try:
+                kind, path, value = batch['progress'].get_nowait()
+            except queue.Empty:
+                self.after(100, self._poll_batch, batch)
+                return
+            if kind == 'file':
+                results[path] = value
+                self.log(f"[{len(results)}/{len(paths)}] {os.path.basename(path)}: wierszy po filtrze {len(value[0])}")
+            elif kind == 'error':
+                self.log(f"Błąd pliku {os.path.basename(path) if path else '(pula procesów)'}: {value}")
+            elif kind == 'index':
+                batch['index'] = value
+            else:
+                break
+        self.batch_button.configure(state='normal')
+        if batch['index'] is None or not results:
+            self.log("Scalanie wsadowe: brak danych do dopisania.")
+            return
+        if self.df is not batch['base']:
+            self.log("Zestaw zmienił się w trakcie scalania wsadowego – wynik odrzucony, uruchom ponownie.")
+            return
+        self.key_index, self.key_index_args = batch['index'], batch['key_args']
+        try:
+            self._finish_batch(paths, results, batch['index'])
+        except Exception as e:
+            messagebox.showerror("Błąd", f"Scalanie wsadowe nie powiodło się:\n{e}")
+            self.log(f"Błąd scalania wsadowego: {e}")
+
+    def _finish_batch(self, paths, results, index):
+        # kolejność plików jak w user_workbooks: wiersz z kluczem z wcześniejszego pliku nie jest dublowany
+        seen, frames, new_keys, total = KeyIndex(), [], [], 0
+        for path in paths:
+            if path not in results:
+                continue
+            df2, keys = results[path]
+            is_new = ~index.contains(keys) & ~seen.contains(keys)
+            seen.add(keys[is_new])
+            frames.append(df2.loc[is_new])
+            new_keys.append(keys[is_new])
+            total += len(df2)
+            self.log(f"{os.path.basename(path)}: wierszy po filtrze: {len(df2)} | nowych: {int(is_new.sum())}")
+        added = sum(len(f) for f in frames)
+        summary = (f"Scalanie wsadowe: {len(frames)} plików | wierszy po filtrze: {total} | "
+                   f"duplikaty (master / inne pliki): {total - added} | nowych: {added}")
+        self.log(summary)
+        if not added:
+            return
+        if not messagebox.askyesno("Scalanie", f"{summary}\n\nDopisać {added} nowych wierszy do zestawu "
+                                                f"({len(self.df)} → {len(self.df) + added})?"):
+            self.log("Anulowano scalanie wsadowe.")
+            return
+        self.df = pd.concat([self.df, *frames], ignore_index=True)
+        for keys in new_keys:
+            index.add(keys)
+        self.log(f"Dopisano {added} wierszy | razem: {len(self.df)}")
+
     # --- Podgląd / zapis ---
     def preview(self):
         if self.df is None:
@@ -476,62 +922,7 @@ class App(tk.Tk):
 
     # --- Agregaty / szczegóły ---
     def _aggregate_and_details(self, df, col_person, col_created, col_completed):
-        person_raw = norm_text(df[col_person])
-        person = person_raw.replace('', '—')
-        keep = filter_bins(person)
-        person = person[keep]
-        created = smart_datetime(df[col_created])[keep]
-        completed = smart_datetime(df[col_completed])[keep]
-
-        # Ukończone wg daty ukończenia
-        done = (pd.DataFrame({'rok': completed.dt.year, 'kwartał': completed.dt.quarter, 'zasobnik': person})
-                .dropna(subset=['rok','kwartał'])
-                .groupby(['rok','kwartał','zasobnik'], dropna=False).size()
-                .rename('zadania_ukończone').reset_index())
-
-        # Nieukończone wg braku ukończenia – liczone po dacie utworzenia
-        not_done_mask = completed.isna()
-        not_done_created = created.where(not_done_mask)
-        not_done = (pd.DataFrame({'rok': not_done_created.dt.year,
-                                  'kwartał': not_done_created.dt.quarter,
-                                  'zasobnik': person.where(not_done_mask)})
-                    .dropna(subset=['rok','kwartał','zasobnik'])
-                    .groupby(['rok','kwartał','zasobnik'], dropna=False).size()
-                    .rename('zadania_nieukończone').reset_index())
-
-        out = pd.merge(done, not_done, on=['rok','kwartał','zasobnik'], how='outer')
-        out['zadania_ukończone'] = out['zadania_ukończone'].fillna(0).astype(int)
-        out['zadania_nieukończone'] = out['zadania_nieukończone'].fillna(0).astype(int)
-        out.sort_values(by=['zasobnik','rok','kwartał'],
-                        key=lambda col: col.str.casefold() if col.name=='zasobnik' else col,
-                        inplace=True)
-        out.reset_index(drop=True, inplace=True)
-
-        # Szczegóły – oba zbiory (ukończone i nieukończone)
-        det_done = pd.DataFrame({
-            'osoba': person,
-            'data_utworzenia': created,
-            'data_ukonczenia': completed,
-            'status': pd.Series(['ukończone']*len(person)),
-            'rok': completed.dt.year,
-            'kwartał': completed.dt.quarter,
-        }).dropna(subset=['rok','kwartał'])
-
-        det_not_done = pd.DataFrame({
-            'osoba': person.where(not_done_mask),
-            'data_utworzenia': created.where(not_done_mask),
-            'data_ukonczenia': completed.where(not_done_mask),
-            'status': pd.Series(['nieukończone']*len(person)).where(not_done_mask),
-            'rok': not_done_created.dt.year,
-            'kwartał': not_done_created.dt.quarter,
-        }).dropna(subset=['osoba','rok','kwartał'])
-
-        details = pd.concat([det_done, det_not_done], ignore_index=True).sort_values(
-            by=['osoba','rok','kwartał','data_utworzenia','data_ukonczenia'],
-            key=lambda col: col.str.casefold() if col.name=='osoba' else col
-        ).reset_index(drop=True)
-
-        return out, details
+        return aggregate_and_details(df, col_person, col_created, col_completed)
 
 # ---- run ---------------------------------------------------------------------
 
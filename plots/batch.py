@@ -0,0 +1,230 @@
+"""
+Wsadowe generowanie wykresów bez okien (np. nocne wykresy na serwerze).
+
+    python batch.py jobs.yaml [--workers 4] [--no-cache]
+    python batch.py                      # bez pliku zadań – okna Tk (wykresy.py)
+
+Plik zadań (YAML lub JSON):
+
+    output_dir: wyniki/
+    defaults:                            # opcjonalne, nadpisywane w zadaniu
+      max_points: 5000                   # punkty na serię po redukcji
+      method: minmax                     # minmax / lttb / null (bez redukcji)
+      webgl: true
+      tolerance: 5                       # [s] dopasowanie próbek DBF po pm_time
+      resample: null                     # np. 1s – wspólna siatka czasu
+      how: mean                          # mean / last / minmax
+      stream: false                      # true – logi większe niż RAM: blokami przez Parquet (stream.py)
+      memory_budget: 512M                # budżet pamięci trybu strumieniowego
+      time_range: ["2024-05-01 06:00", "2024-05-01 14:00"]   # tylko ten zakres pm_time (null – całość)
+      filters: ["STAN in 1, 2", "TEMP > 80"]                # warunki na kolumnach plików (AND)
+      plotlyjs: directory                # directory – plotly.min.js raz w output_dir / cdn / true – w każdym pliku
+    jobs:
+      - name: kociol
+        inputs: ["dane/kociol_*.dbf"]    # ścieżki lub wzorce glob
+        columns: [pm_time, TEMP, PRESS]  # dla wszystkich plików albo {wzorzec_nazwy_pliku: [kolumny]}
+        x: pm_time
+        y: ["*_TEMP", "*_PRESS"]          # nazwy kolumn wyniku (z prefiksem pliku), wzorce fnmatch
+        output: kociol.html              # domyślnie <name>.html
+      - name: zestawienie                # kilka paneli jeden pod drugim, wspólna oś X, jeden plik HTML
+        inputs: ["dane/*.dbf"]
+        x: pm_time
+        panels:
+          - {y: ["*_TEMP"], title: Temperatury}
+          - {y: ["*_PRESS"]}
+        parquet: kociol.parquet          # tryb strumieniowy: wynik połączenia, domyślnie <name>.parquet
+
+W trybie strumieniowym pliki z kolumną czasu są łączone na siatce `resample`
+(domyślnie 1s, gdy nie podano), pozostałe – po numerze wiersza.
+
+Zadania są wykonywane równolegle w puli procesów; tkinter nie jest importowany.
+"""
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+JOB_DEFAULTS = {'max_points': 5000, 'method': 'minmax', 'webgl': True,
+                'tolerance': None, 'resample': None, 'how': 'mean',
+                'stream': False, 'memory_budget': '512M', 'plotlyjs': 'directory',
+                'time_range': None, 'filters': None}
+
+
+def load_spec(path):
+    with open(path, encoding='utf-8') as f:
+        if path.lower().endswith(('.yaml', '.yml')):
+            import yaml  # PyYAML potrzebny tylko dla plików YAML
+            try:
+                spec = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise ValueError(str(e))
+        else:
+            spec = json.load(f)
+    if not isinstance(spec, dict) or not isinstance(spec.get('jobs'), list):
+        raise ValueError("Plik zadań musi zawierać listę 'jobs'.")
+    base_dir = os.path.dirname(os.path.abspath(path))
+    output_dir = os.path.join(base_dir, spec.get('output_dir', '.'))
+    defaults = {**JOB_DEFAULTS, **(spec.get('defaults') or {})}
+    jobs = []
+    for i, job in enumerate(spec['jobs']):
+        for key in ('inputs', 'x', 'y' if 'panels' not in job else 'panels'):
+            if key not in job:
+                raise ValueError(f"Zadanie {job.get('name', i + 1)}: brak pola '{key}'.")
+        job = {**defaults, 'name': f'wykres_{i + 1}', **job}
+        job['inputs'] = [os.path.join(base_dir, pattern) for pattern in _as_list(job['inputs'])]
+        job['output'] = os.path.join(output_dir, job.get('output') or f"{job['name']}.html")
+        job['parquet'] = os.path.join(output_dir, job.get('parquet') or f"{job['name']}.parquet")
+        jobs.append(job)
+    return jobs
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value)
+
+
+def expand_inputs(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files.extend(m for m in matches if m not in files)
+    return files
+
+
+def job_panels(job, columns):
+    """Panele zestawienia zadania dla kolumn wyniku (pipeline.build_dashboard)."""
+    return [{'x_col': match_columns(columns, panel.get('x', job['x']))[0],
+             'y_cols': match_columns(columns, panel['y']), 'title': panel.get('title'),
+             'max_points': job['max_points'], 'method': job['method'], 'use_webgl': job['webgl']}
+            for panel in job['panels']]
+
+
+def job_filters(job):
+    """Warunki zadania: zakres czasu + lista 'filters' (tekst 'KOLUMNA op wartość')."""
+    from filters import time_range_filters
+    start, end = job['time_range'] or (None, None)
+    return time_range_filters(start, end) + list(job['filters'] or [])
+
+
+def columns_for(file, columns):
+    """Kolumny dla pliku: lista wspólna, słownik {wzorzec nazwy pliku: kolumny} albo None (wszystkie)."""
+    if columns is None or isinstance(columns, list):
+        return columns
+    name = os.path.basename(file)
+    for pattern, cols in columns.items():
+        if fnmatch.fnmatch(name, pattern):
+            return cols
+    return None
+
+
+def match_columns(available, patterns):
+    selected = []
+    for pattern in _as_list(patterns):
+        matches = [col for col in available if fnmatch.fnmatchcase(str(col), pattern)]
+        if not matches:
+            raise ValueError(f"Brak kolumny pasującej do '{pattern}'.")
+        selected.extend(col for col in matches if col not in selected)
+    return selected
+
+
+def run_job(job, cache_dir=None):
+    """Jedno zadanie: wczytanie, połączenie, wykres HTML. Zwraca (ścieżka, liczba_wierszy, czas)."""
+    from loaders import read_files
+    from pipeline import build_final_frame, build_figure, build_dashboard, write_figure_html
+
+    started = time.monotonic()
+    files = expand_inputs(job['inputs'])
+    if not files:
+        raise ValueError(f"Brak plików dla wzorców: {job['inputs']}")
+    usecols = {file: columns_for(file, job.get('columns')) for file in files}
+    if job['stream']:
+        return _run_stream_job(job, files, usecols, started)
+    # jeden proces na zadanie – pliki zadania czytane kolejno (bez zagnieżdżonej puli)
+    files_columns = read_files(files, usecols=usecols, workers=1, compact=True, cache_dir=cache_dir, prefix=True,
+                               filters=job_filters(job))
+    sync_options = {'tolerance': job['tolerance'], 'resample': job['resample'], 'how': job['how']}
+    final_df = build_final_frame(files_columns, sync_options, prefixed=True)
+
+    title = job.get('title', job['name'])
+    if job.get('panels'):
+        fig = build_dashboard(final_df, job_panels(job, final_df.columns), title=title)
+    else:
+        x_col = match_columns(final_df.columns, job['x'])[0]
+        y_cols = match_columns(final_df.columns, job['y'])
+        fig = build_figure(final_df, x_col, y_cols, max_points=job['max_points'], method=job['method'],
+                           use_webgl=job['webgl'], title=title)
+    os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    write_figure_html(fig, job['output'], job['plotlyjs'])
+    return job['output'], len(final_df), time.monotonic() - started
+
+
+def _run_stream_job(job, files, usecols, started):
+    from loaders import read_columns
+    from pipeline import write_figure_html
+    from timesync import TIME_COLUMN
+    from stream import stream_to_parquet, parquet_columns, build_figure_from_parquet, build_dashboard_from_parquet
+
+    timed = all(any(TIME_COLUMN in str(col) for col in usecols[file] or read_columns(file)) for file in files)
+    os.makedirs(os.path.dirname(job['parquet']), exist_ok=True)
+    rows = stream_to_parquet(files, job['parquet'], usecols, align='time' if timed else 'position',
+                             resample=job['resample'] or '1s', how=job['how'],
+                             memory_budget=job['memory_budget'], filters=job_filters(job))
+    columns = parquet_columns(job['parquet'])
+    title = job.get('title', job['name'])
+    if job.get('panels'):
+        fig = build_dashboard_from_parquet(job['parquet'], job_panels(job, columns), title=title)
+    else:
+        x_col = match_columns(columns, job['x'])[0]
+        y_cols = match_columns(columns, job['y'])
+        fig = build_figure_from_parquet(job['parquet'], x_col, y_cols, max_points=job['max_points'],
+                                        method=job['method'], use_webgl=job['webgl'], title=title)
+    os.makedirs(os.path.dirname(job['output']), exist_ok=True)
+    write_figure_html(fig, job['output'], job['plotlyjs'])
+    return job['output'], rows, time.monotonic() - started
+
+
+def run_jobs(jobs, workers=None, cache_dir=None):
+    """Wykonuje zadania w puli procesów; zwraca liczbę zadań zakończonych błędem."""
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers or min(len(jobs), os.cpu_count() or 1)) as pool:
+        futures = {pool.submit(run_job, job, cache_dir): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                output, rows, elapsed = future.result()
+                print(f"[{job['name']}] {output} ({rows} wierszy, {elapsed:.1f} s)")
+            except Exception as e:
+                failed += 1
+                print(f"[{job['name']}] Błąd: {e}", file=sys.stderr)
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='batch.py', description="Wsadowe generowanie wykresów z pliku zadań.")
+    parser.add_argument('spec', nargs='?', help="plik zadań YAML/JSON (bez niego – okna Tk)")
+    parser.add_argument('--workers', type=int, help="liczba procesów (domyślnie liczba rdzeni)")
+    parser.add_argument('--no-cache', action='store_true', help="nie używaj cache wczytanych plików")
+    args = parser.parse_args(argv)
+
+    if args.spec is None:
+        from wykresy import main as gui_main  # tkinter ładowany dopiero tutaj
+        gui_main()
+        return 0
+
+    try:
+        jobs = load_spec(args.spec)
+    except (OSError, ValueError) as e:
+        print(f"Błąd pliku zadań: {e}", file=sys.stderr)
+        return 2
+    if not jobs:
+        return 0
+    from cache import default_cache_dir
+    failed = run_jobs(jobs, workers=args.workers, cache_dir=None if args.no_cache else default_cache_dir())
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
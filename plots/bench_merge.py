@@ -0,0 +1,105 @@
+"""
+Pomiar czasu i szczytowej pamięci budowy szerokiej ramki (build_final_frame).
+
+    python bench_merge.py [--files 10] [--rows 5000000] [--mode concat|asof|resample] [--impl new|old]
+
+--rows to łączna liczba wierszy (dzielona po równo na pliki). Ramki wejściowe są
+generowane w pamięci (jak po read_files(compact=True) – float32), więc mierzona jest sama
+budowa wyniku: czas i przyrost szczytowego RSS względem stanu po wczytaniu.
+--impl new – kolumny z prefiksem od wczytania (read_files(prefix=True)) i build_final_frame(prefixed=True),
+--impl old – poprzedni przebieg na tych samych ramkach: concat – add_prefix_to_columns (zmiana nazw
+w miejscu) i pd.concat(axis=1); asof / resample – prefiks nadawany przy łączeniu, kolumny pobierane
+przez Series.take / where, a wynik sklejany w bloki (DataFrame ze słownika Series).
+Każdy tryb uruchamiać w osobnym procesie. Szczytowy RSS: ru_maxrss (Linux / macOS),
+na Windows peak_wset z psutil (bez psutil – pomijany).
+"""
+import argparse
+import gc
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import timesync
+from pipeline import add_prefix_to_columns, build_final_frame
+
+SYNC_OPTIONS = {'concat': None, 'asof': {'tolerance': 5}, 'resample': {'resample': '10s'}}
+
+
+def _peak_rss_mb():
+    try:
+        import resource  # tylko POSIX
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 ** 2
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024  # macOS: bajty, Linux: KiB
+
+
+def _old_take(series, rows):
+    # poprzednie timesync._take: Series.take + where na całej kolumnie
+    if len(series) == 0:
+        return pd.Series(np.nan, index=pd.RangeIndex(len(rows)))
+    taken = series.take(np.maximum(rows, 0)).reset_index(drop=True)
+    return taken.where(pd.Series(rows >= 0)) if (rows < 0).any() else taken
+
+
+def build_old(frames, sync_options):
+    """Poprzedni przebieg budowy wyniku (ramki bez prefiksów, patrz opis modułu)."""
+    if sync_options is None:
+        return pd.concat(add_prefix_to_columns(frames), axis=1)
+    take = timesync._take
+    timesync._take = _old_take
+    try:
+        final_df = build_final_frame(frames, sync_options)
+    finally:
+        timesync._take = take
+    return pd.DataFrame(dict(final_df.items()))  # jak dawniej: słownik Series -> sklejone bloki
+
+
+def make_frames(files, rows, timed, columns=3, seed=0, prefixed=True):
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(files):
+        prefix = f"log{i}_" if prefixed else ""
+        data = {}
+        if timed:
+            # różne okresy próbkowania – osie czasu plików nie pokrywają się
+            data[f"{prefix}pm_time"] = pd.date_range('2024-01-01', periods=rows, freq=f"{1000 + 37 * i}ms")
+        for j in range(columns):
+            data[f"{prefix}V{j}"] = rng.random(rows, dtype=np.float32)
+        frames.append((f"log{i}.dbf" if timed else f"log{i}.csv", pd.DataFrame(data)))
+    return frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='bench_merge.py', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=10)
+    parser.add_argument('--rows', type=int, default=5_000_000, help="łączna liczba wierszy wszystkich plików")
+    parser.add_argument('--mode', choices=sorted(SYNC_OPTIONS), default='concat')
+    parser.add_argument('--impl', choices=('new', 'old'), default='new')
+    args = parser.parse_args(argv)
+
+    frames = make_frames(args.files, args.rows // args.files, args.mode != 'concat', prefixed=args.impl == 'new')
+    gc.collect()
+    before = _peak_rss_mb()
+    started = time.perf_counter()
+    if args.impl == 'new':
+        final_df = build_final_frame(frames, SYNC_OPTIONS[args.mode], prefixed=True)
+    else:
+        final_df = build_old(frames, SYNC_OPTIONS[args.mode])
+    elapsed = time.perf_counter() - started
+    peak = _peak_rss_mb()
+    peak = f"+{peak - before:.0f} MB" if peak is not None else "n/d (brak psutil)"
+    print(f"{args.mode} [{args.impl}]: {args.files} plików x {args.rows // args.files} wierszy -> {final_df.shape[0]} x "
+          f"{final_df.shape[1]}, {elapsed:.2f} s, szczyt RSS {peak}, "
+          f"wynik {final_df.memory_usage(deep=False).sum() / 1024 ** 2:.0f} MB")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+Podręczna pamięć (cache) wczytanych plików w formacie Arrow IPC / Feather (bez tkinter).
+
+Po pierwszym wczytaniu CSV / Excel / DBF ramka trafia do <katalog>/<klucz>.arrow.
+Klucz to skrót ścieżki bezwzględnej i opcji czytnika; rozmiar i mtime źródła są
+zapisane w metadanych pliku, więc zmieniony plik źródłowy unieważnia wpis.
+Kolejne odczyty mapują plik w pamięć (memory_map) i czytają tylko potrzebne kolumny;
+brakujące kolumny są doczytywane ze źródła, a wpis zastępowany pełniejszym.
+Łączny rozmiar jest ograniczony – najdawniej używane wpisy są usuwane (LRU wg mtime wpisu).
+Wpis jest zapisany w grupach po CACHE_GROUP_ROWS wierszy z min / max kolumn liczbowych i czasu
+każdej grupy w metadanych – przy filtrach (filters.py) czytane są tylko grupy, które mogą pasować.
+Bez pyarrow cache jest wyłączony, a pliki są czytane bezpośrednio.
+"""
+import hashlib
+import json
+import os
+
+from filters import filter_frame, group_stats, matching_groups
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.arrow'
+CACHE_GROUP_ROWS = 65536  # wiersze w jednej grupie (record batch) wpisu
+DEFAULT_CACHE_LIMIT = 2 * 1024 ** 3  # 2 GiB
+_META_KEY = b'wykresy_cache'
+
+
+def default_cache_dir():
+    """Katalog cache: $WYKRESY_CACHE_DIR albo ~/.cache/wykresy."""
+    return os.environ.get('WYKRESY_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'wykresy')
+
+
+def cache_key(file, options):
+    raw = json.dumps({'path': os.path.abspath(file), 'options': options, 'version': CACHE_VERSION}, sort_keys=True)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _source_stamp(file):
+    st = os.stat(file)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+class FrameCache:
+    """
+    cache = FrameCache(katalog, limit_bajtów)
+    df = cache.load(plik, usecols, options, reader)   # reader(plik, usecols) -> DataFrame
+    df = cache.load(plik, usecols, options, reader, filters)   # tylko wiersze spełniające filtry
+    """
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_LIMIT):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    @property
+    def enabled(self):
+        return pa is not None
+
+    def _entry_path(self, file, options):
+        return os.path.join(self.cache_dir, cache_key(file, options) + CACHE_SUFFIX)
+
+    def _cached_meta(self, path, stamp):
+        # tylko schemat (stopka pliku IPC) – bez czytania danych
+        try:
+            with pa.memory_map(path) as source:
+                schema = pa.ipc.open_file(source).schema
+        except (OSError, pa.ArrowInvalid):
+            return None
+        meta = json.loads((schema.metadata or {}).get(_META_KEY, b'{}'))
+        if meta.get('source') != stamp:
+            return None
+        return meta
+
+    def load(self, file, usecols, options, reader, filters=None):
+        if not self.enabled:
+            return filter_frame(reader(file, usecols), filters)
+        stamp = _source_stamp(file)
+        path = self._entry_path(file, options)
+        meta = self._cached_meta(path, stamp) if os.path.exists(path) else None
+        columns = meta.get('columns') if meta else None
+        if columns is not None and (usecols is None and columns.get('all')
+                                    or usecols is not None and set(usecols) <= set(columns['names'])):
+            wanted = columns['names'] if usecols is None else [c for c in columns['names'] if c in set(usecols)]
+            if filters:
+                table = self._read_groups(path, wanted, meta, filters)
+            else:
+                table = feather.read_table(path, columns=wanted, memory_map=True)
+            os.utime(path)  # znacznik ostatniego użycia dla LRU
+            return filter_frame(table.to_pandas(split_blocks=True), filters)
+
+        # brak wpisu lub brakuje kolumn: czytamy sumę kolumn (wpis rośnie zamiast się mnożyć)
+        read_cols = usecols
+        if usecols is not None and columns is not None and not columns.get('all'):
+            read_cols = list(dict.fromkeys(list(columns['names']) + list(usecols)))
+        # (cały plik, bez filtrów – wpis ma służyć też innym zakresom)
+        df = reader(file, read_cols)
+        self._store(path, df, stamp, read_cols is None)
+        if usecols is not None:
+            df = df[[c for c in df.columns if c in set(usecols)]]
+        return filter_frame(df, filters)
+
+    def _read_groups(self, path, wanted, meta, filters):
+        # tylko grupy wierszy, których min / max nie wykluczają dopasowania (mapowane, bez kopii)
+        with pa.memory_map(path) as source:
+            entry = pa.ipc.open_file(source)
+            stats = meta.get('stats', {})
+            groups = range(entry.num_record_batches)
+            if all(len(values) == entry.num_record_batches for values in stats.values()):
+                groups = matching_groups(stats, filters, entry.num_record_batches)
+            batches = [entry.get_batch(group).select(wanted) for group in groups]
+            schema = entry.schema
+        return pa.Table.from_batches(batches, schema=pa.schema([schema.field(name) for name in wanted]))
+
+    def _store(self, path, df, stamp, all_columns):
+        meta = {'source': stamp, 'columns': {'names': [str(c) for c in df.columns], 'all': all_columns},
+                'stats': group_stats(df, CACHE_GROUP_ROWS)}
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False).combine_chunks()
+            table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                                   _META_KEY: json.dumps(meta).encode('utf-8')})
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            # bez kompresji – odczyt przez mmap; grupy po CACHE_GROUP_ROWS wierszy odpowiadają statystykom
+            feather.write_feather(table, tmp_path, compression='uncompressed', chunksize=CACHE_GROUP_ROWS)
+            os.replace(tmp_path, path)
+        except (OSError, pa.ArrowException, TypeError, ValueError) as e:
+            print(f"Nie udało się zapisać pliku w cache ({os.path.basename(path)}): {e}")
+            return
+        self.evict()
+
+    def evict(self):
+        """Usuwa najdawniej używane wpisy, aż łączny rozmiar spadnie poniżej limitu."""
+        try:
+            entries = [e for e in os.scandir(self.cache_dir) if e.name.endswith(CACHE_SUFFIX)]
+        except FileNotFoundError:
+            return
+        entries = sorted(((e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in entries), reverse=True)
+        total = 0
+        for _, size, path in entries:
+            total += size
+            if total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # np. plik zmapowany w pamięci w innym procesie (Windows)
+
+    def clear(self):
+        for entry in os.scandir(self.cache_dir) if os.path.isdir(self.cache_dir) else ():
+            if entry.name.endswith(CACHE_SUFFIX):
+                os.remove(entry.path)
@@ -0,0 +1,97 @@
+"""
+Redukcja liczby punktów serii przed rysowaniem (bez tkinter).
+
+Funkcje zwracają indeksy wybranych wierszy (posortowane), więc działają dla
+dowolnych typów osi X (liczby, czas, tekst) – ramkę tnie się przez .iloc[indeksy].
+- minmax_indices: dla każdego przedziału pozycji min i max – zachowuje każdą szpilkę
+  i każde krótkie zadziałanie alarmu (0/1), dokładne dla wykresu liniowego,
+- lttb_indices: Largest-Triangle-Three-Buckets – zachowuje kształt przebiegu
+  przy mniejszej liczbie punktów.
+"""
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE_METHODS = ('minmax', 'lttb')
+DEFAULT_MAX_POINTS = 5000  # punktów na serię (rzędu szerokości ekranu w pikselach x 2)
+
+
+def _as_float(values):
+    # wartości osi jako float64; czas -> ns, tekst / kategorie -> pozycja wiersza
+    values = pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        out = values.to_numpy(dtype='datetime64[ns]').view(np.int64).astype(np.float64)
+        out[values.isna().to_numpy()] = np.nan
+        return out
+    if pd.api.types.is_bool_dtype(values.dtype) or pd.api.types.is_numeric_dtype(values.dtype):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.arange(len(values), dtype=np.float64)
+
+
+def minmax_indices(y, max_points=DEFAULT_MAX_POINTS):
+    """
+    Dzieli serię na max_points // 2 równych przedziałów pozycji i z każdego bierze
+    indeks minimum i maksimum (+ pierwszy i ostatni punkt serii). Przedział złożony
+    z samych NaN daje jeden punkt NaN, więc przerwy w danych zostają widoczne.
+    """
+    values = _as_float(y)
+    n = len(values)
+    if n <= max_points:
+        return np.arange(n)
+    buckets = max(1, max_points // 2)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = values
+    padded = padded.reshape(buckets, size)
+    nan = np.isnan(padded)
+    lo = np.where(nan, np.inf, padded).argmin(axis=1)
+    hi = np.where(nan, -np.inf, padded).argmax(axis=1)
+    offsets = np.arange(buckets) * size
+    picked = np.concatenate([[0, n - 1], offsets + lo, offsets + hi])
+    return np.unique(picked[picked < n])
+
+
+def lttb_indices(x, y, max_points=DEFAULT_MAX_POINTS):
+    """
+    Largest-Triangle-Three-Buckets: pierwszy i ostatni punkt zostają, z każdego
+    z max_points - 2 przedziałów wybierany jest punkt tworzący największy trójkąt
+    z punktem wybranym wcześniej i średnią następnego przedziału. Pętla idzie po
+    przedziałach, obliczenia w przedziale są wektorowe. Punkty NaN są pomijane.
+    """
+    xs, ys = _as_float(x), _as_float(y)
+    n = len(ys)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    valid = np.flatnonzero(~(np.isnan(xs) | np.isnan(ys)))
+    if len(valid) <= max_points:
+        return valid
+    xs, ys = xs[valid], ys[valid]
+    n = len(ys)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # średnie przedziałów (punkt C trójkąta) liczone z góry dla wszystkich przedziałów
+    means_x = np.add.reduceat(xs[:-1], edges[:-1]) / np.diff(edges)
+    means_y = np.add.reduceat(ys[:-1], edges[:-1]) / np.diff(edges)
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < max_points - 2:
+            cx, cy = means_x[i + 1], means_y[i + 1]
+        else:
+            cx, cy = xs[-1], ys[-1]
+        ax, ay = xs[a], ys[a]
+        area = np.abs((ax - cx) * (ys[start:end] - ay) - (ax - xs[start:end]) * (cy - ay))
+        a = start + int(area.argmax())
+        picked[i + 1] = a
+    return valid[picked]
+
+
+def downsample_indices(x, y, max_points=DEFAULT_MAX_POINTS, method='minmax'):
+    """Indeksy punktów do narysowania albo None, gdy seria jest dość krótka i redukcja nie jest potrzebna."""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Nieznana metoda redukcji punktów: {method}")
+    if not max_points or len(y) <= max_points:
+        return None
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    return minmax_indices(y, max_points)
@@ -0,0 +1,228 @@
+"""
+Filtry wierszy stosowane już przy wczytywaniu plików (bez tkinter).
+
+Filtr to lista warunków (kolumna, operator, wartość) łączonych przez AND, np.
+    [('pm_time', '>=', '2024-05-01 06:00'), ('pm_time', '<', '2024-05-01 14:00'), ('TEMP', '>', 80)]
+Wartości dla kolumn czasu (nazwa zawiera 'pm_time') są zamieniane na Timestamp, a kolumna
+parsowana przez parse_times. Warunek na kolumnie, której plik nie ma, jest dla tego pliku pomijany.
+Warunki są przenoszone do czytników (loaders):
+- CSV / DBF odrzucają wiersze blok po bloku (DBF dekoduje pozostałe pola tylko dla pasujących
+  rekordów) i kończą czytanie, gdy czas przekroczył górną granicę – dla plików posortowanych po czasie,
+- cache (cache.FrameCache) pomija grupy wierszy, których statystyki min / max wykluczają dopasowanie.
+"""
+import operator
+import re
+
+import numpy as np
+import pandas as pd
+
+from timesync import TIME_COLUMN, parse_times
+
+FILTER_OPS = ('==', '!=', '<', '<=', '>', '>=', 'in')
+_OPS = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le,
+        '>': operator.gt, '>=': operator.ge}
+_FILTER_RE = re.compile(r'^\s*(.+?)\s*(==|!=|<=|>=|<|>|=|\s+in\s+)\s*(.+?)\s*$')
+_NAT = np.iinfo(np.int64).min
+
+
+def is_time_column(col):
+    return TIME_COLUMN in str(col)
+
+
+def time_range_filters(start=None, end=None, time_col=TIME_COLUMN):
+    """Warunki dla zakresu czasu [start, end]; None – bez ograniczenia z tej strony."""
+    filters = []
+    if start not in (None, ''):
+        filters.append((time_col, '>=', start))
+    if end not in (None, ''):
+        filters.append((time_col, '<=', end))
+    return filters
+
+
+def parse_filter(text):
+    """'TEMP > 80', 'STAN in 1, 2', 'TRYB == auto' -> (kolumna, operator, wartość)."""
+    match = _FILTER_RE.match(text)
+    if not match:
+        raise ValueError(f"Niepoprawny warunek: {text!r} (oczekiwano np. 'TEMP > 80')")
+    col, op, value = match.group(1), match.group(2).strip(), match.group(3)
+    op = '==' if op == '=' else op
+    if op == 'in':
+        return col, op, [_parse_value(v) for v in value.split(',') if v.strip()]
+    return col, op, _parse_value(value)
+
+
+def _parse_value(text):
+    text = text.strip().strip('\'"')
+    try:
+        return float(text) if any(c in text for c in '.eE') else int(text)
+    except ValueError:
+        return text
+
+
+def resolve_filters(filters, columns):
+    """
+    Warunki dla jednego pliku: 'pm_time' wskazuje kolumnę czasu pliku, warunki na kolumnach
+    spoza `columns` są pomijane, wartości dla kolumn czasu -> Timestamp. Tekst warunku jest parsowany.
+    """
+    resolved = []
+    columns = list(columns)
+    time_col = next((col for col in columns if is_time_column(col)), None)
+    for condition in filters or ():
+        col, op, value = parse_filter(condition) if isinstance(condition, str) else condition
+        if op not in FILTER_OPS:
+            raise ValueError(f"Nieznany operator filtra: {op}")
+        if col not in columns:
+            if col != TIME_COLUMN or time_col is None:
+                continue
+            col = time_col
+        if is_time_column(col):
+            value = [pd.Timestamp(v) for v in value] if op == 'in' else pd.Timestamp(value)
+        resolved.append((col, op, value))
+    return resolved
+
+
+def filter_columns(filters):
+    return list(dict.fromkeys(col for col, _, _ in filters or ()))
+
+
+def columns_to_read(usecols, filters):
+    """usecols uzupełnione o kolumny warunków (ten sam obiekt, gdy nic nie trzeba dodawać)."""
+    if not filters or usecols is None:
+        return usecols
+    return list(usecols) + [col for col in filter_columns(filters) if col not in usecols]
+
+
+def filter_mask(df, filters):
+    """Maska wierszy spełniających wszystkie warunki (braki danych nie spełniają żadnego)."""
+    mask = np.ones(len(df), dtype=bool)
+    for col, op, value in filters:
+        values = parse_times(df[col]) if is_time_column(col) else df[col]
+        if op != 'in' and isinstance(values.dtype, pd.CategoricalDtype):
+            mask &= _category_mask(values, op, value)
+            continue
+        matched = values.isin(value) if op == 'in' else _OPS[op](values, value)
+        mask &= matched.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def _category_mask(values, op, value):
+    # kolumny 'category' (compact_dtypes, cache): warunek liczony dla kategorii i przenoszony przez kody –
+    # także <, > dla kategorii nieuporządkowanych (porównanie wartości, jak dla kolumny bez kategorii)
+    categories = pd.Series(values.cat.categories)
+    hits = _OPS[op](categories, value).fillna(False).to_numpy(dtype=bool)
+    return np.append(hits, False)[values.cat.codes.to_numpy()]  # kod -1 (brak) -> False
+
+
+def filter_frame(df, filters):
+    return df.loc[filter_mask(df, filters)].reset_index(drop=True) if filters else df
+
+
+class BlockFilter:
+    """
+    Filtr dla czytania blokami: mask(blok) -> maska wierszy; done – kolejne bloki nie mogą już
+    pasować (czas rośnie we wszystkich dotychczasowych blokach i przekroczył górną granicę).
+    """
+    def __init__(self, filters):
+        self.filters = filters
+        self.upper = [(col, op, value.value) for col, op, value in filters
+                      if is_time_column(col) and op in ('<', '<=', '==')]
+        self.columns = filter_columns(filters)
+        self.done = False
+        self._last = {}
+
+    def mask(self, df):
+        for col, op, bound in self.upper:
+            times = parse_times(df[col]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+            times = times[times != _NAT]
+            if not len(times):
+                continue
+            last = self._last.get(col)
+            if last is None or (last is not False and times[0] >= last and (np.diff(times) >= 0).all()):
+                self._last[col] = times[-1]
+                if times[-1] > bound or (op == '<' and times[-1] == bound):
+                    self.done = True
+            else:
+                self._last[col] = False  # plik nieposortowany – czytamy do końca
+        return filter_mask(df, self.filters)
+
+
+# ====== Statystyki grup wierszy (cache) =====================================
+
+def _stat_values(values):
+    # wartości kolumny jako liczby do porównań: czas -> int64 ns, liczby -> float64; inne -> None
+    if is_time_column(values.name) or pd.api.types.is_datetime64_any_dtype(values.dtype):
+        times = parse_times(values).to_numpy(dtype='datetime64[ns]').view(np.int64)
+        return times, times == _NAT
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        return numbers, np.isnan(numbers)
+    return None
+
+
+def group_stats(df, group_rows):
+    """{kolumna: [[min, max] lub None dla każdej grupy group_rows wierszy]} dla kolumn liczbowych i czasu."""
+    stats = {}
+    starts = np.arange(0, len(df), group_rows)
+    if not len(starts):
+        return stats
+    for col in df.columns:
+        converted = _stat_values(df[col])
+        if converted is None:
+            continue
+        values, missing = converted
+        if values.dtype.kind == 'i':
+            info = np.iinfo(np.int64)
+            lo = np.minimum.reduceat(np.where(missing, info.max, values), starts)
+            hi = np.maximum.reduceat(np.where(missing, info.min, values), starts)
+            empty = np.logical_and.reduceat(missing, starts)
+            stats[str(col)] = [None if e else [int(a), int(b)] for a, b, e in zip(lo, hi, empty)]
+        else:
+            lo = np.fmin.reduceat(values, starts)
+            hi = np.fmax.reduceat(values, starts)
+            stats[str(col)] = [None if np.isnan(a) else [float(a), float(b)] for a, b in zip(lo, hi)]
+    return stats
+
+
+def _may_match(bounds, op, value):
+    if bounds is None:
+        return False  # grupa bez wartości – żaden warunek nie jest spełniony
+    lo, hi = bounds
+    if op == '==':
+        return lo <= value <= hi
+    if op == '!=':
+        return not lo == hi == value
+    if op == '<':
+        return lo < value
+    if op == '<=':
+        return lo <= value
+    if op == '>':
+        return hi > value
+    if op == '>=':
+        return hi >= value
+    return any(lo <= v <= hi for v in value)
+
+
+def _stat_value(value):
+    if isinstance(value, pd.Timestamp):
+        return value.value
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def matching_groups(stats, filters, groups):
+    """Numery grup wierszy, które mogą zawierać pasujące wiersze (statystyki wykluczają pozostałe)."""
+    selected = []
+    for group in range(groups):
+        for col, op, value in filters:
+            column_stats = stats.get(str(col))
+            if column_stats is None:
+                continue
+            compared = [_stat_value(v) for v in value] if op == 'in' else _stat_value(value)
+            if compared is None or (op == 'in' and None in compared):
+                continue
+            if not _may_match(column_stats[group], op, compared):
+                break
+        else:
+            selected.append(group)
+    return selected
@@ -0,0 +1,308 @@
+"""
+Wczytywanie plików CSV / Excel / DBF dla wykresy.py (bez tkinter).
+
+- CSV: wielowątkowy silnik pyarrow, gdy jest zainstalowany (inaczej domyślny silnik pandas),
+- DBF: własny czytnik strumieniowy – kolumny budowane wprost z rekordów (NumPy), bez pośredniego CSV,
+- read_columns: same nagłówki (bez danych) – do wyboru kolumn przed wczytaniem,
+- usecols: parsowane są tylko wskazane kolumny,
+- compact_dtypes: float32 / mniejsze typy całkowite / category tam, gdzie nie tracimy danych,
+- read_files: wiele plików naraz w puli procesów (lub wątków, gdy wszystko czyta pyarrow),
+- cache_dir: wczytane ramki zapisywane w cache Arrow IPC (cache.FrameCache) i mapowane przy kolejnych odczytach,
+- filters: zakres czasu i warunki na kolumnach (filters.py) stosowane już w czytnikach.
+"""
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache import FrameCache, DEFAULT_CACHE_LIMIT
+from filters import BlockFilter, columns_to_read, filter_frame, resolve_filters
+
+try:
+    import pyarrow  # noqa: F401 – tylko sprawdzenie dostępności silnika CSV
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+CSV_EXTENSIONS = ('.csv',)
+EXCEL_EXTENSIONS = ('.xls', '.xlsx')
+DBF_EXTENSIONS = ('.dbf',)
+DBF_CHUNK_RECORDS = 65536  # rekordy czytane jednym blokiem przez read_dbf
+CSV_CHUNK_ROWS = 200000  # wiersze CSV czytane jednym blokiem, gdy są filtry (silnik pandas)
+CSV_BLOCK_BYTES = 16 * 1024 ** 2  # bajty CSV czytane jednym blokiem, gdy są filtry (pyarrow)
+CATEGORY_MAX_RATIO = 0.5  # tekst -> category, gdy unikalnych wartości jest najwyżej tyle co połowa wierszy
+FLOAT32_RTOL = 1e-6  # float64 -> float32 tylko, gdy względny błąd zaokrąglenia jest pomijalny
+
+
+def read_columns(file):
+    """Zwraca listę kolumn pliku, czytając tylko nagłówek (CSV), pierwszy wiersz arkusza lub opis pól DBF."""
+    ext = os.path.splitext(file)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        return list(pd.read_csv(file, nrows=0).columns)
+    elif ext in EXCEL_EXTENSIONS:
+        return list(pd.read_excel(file, nrows=0).columns)
+    elif ext in DBF_EXTENSIONS:
+        return [field[0] for field in read_dbf_fields(file)[3]]
+    raise ValueError(f"Nieobsługiwany format pliku: {file}")
+
+
+def read_file(file, usecols=None, compact=False, cache_dir=None, cache_limit=DEFAULT_CACHE_LIMIT, filters=None):
+    """
+    Wczytuje jeden plik CSV / Excel / DBF; usecols – lista nazw kolumn (None = wszystkie),
+    compact – zmniejsza typy kolumn (compact_dtypes), cache_dir – katalog cache (None = bez cache),
+    filters – warunki (filters.py); kolumny potrzebne tylko do filtra są czytane i potem usuwane.
+    """
+    filters = resolve_filters(filters, read_columns(file)) if filters else None
+    read_cols = columns_to_read(usecols, filters)
+    if cache_dir:
+        df = FrameCache(cache_dir, cache_limit).load(
+            file, read_cols, {'compact': compact}, lambda f, cols: _read_source(f, cols, compact), filters)
+    else:
+        df = _read_source(file, read_cols, compact, filters)
+    return df if read_cols is usecols else df[list(usecols)]
+
+
+def _read_source(file, usecols, compact, filters=None):
+    ext = os.path.splitext(file)[1].lower()
+    if ext in CSV_EXTENSIONS:
+        df = read_csv(file, usecols) if not filters else _read_csv_filtered(file, usecols, filters)
+    elif ext in EXCEL_EXTENSIONS:
+        df = filter_frame(pd.read_excel(file, usecols=usecols), filters)
+    elif ext in DBF_EXTENSIONS:
+        df = read_dbf(file, usecols, filters=filters)
+    else:
+        raise ValueError(f"Nieobsługiwany format pliku: {file}")
+    return compact_dtypes(df) if compact else df
+
+
+def file_prefix(file):
+    """Prefiks kolumn pliku w połączonej ramce: nazwa pliku bez rozszerzenia."""
+    return os.path.splitext(os.path.basename(file))[0]
+
+
+def read_files(files, usecols=None, workers=None, compact=False, cache_dir=None, cache_limit=DEFAULT_CACHE_LIMIT,
+               prefix=False, filters=None):
+    """
+    Wczytuje wiele plików równolegle; zwraca listę (plik, DataFrame) w kolejności `files`.
+    usecols – jedna lista dla wszystkich plików albo słownik {plik: lista kolumn}.
+    compact – typy zmniejszane już w procesie roboczym (mniej danych do przesłania),
+    cache_dir / cache_limit – cache Arrow IPC (patrz read_file),
+    prefix – kolumny od razu z prefiksem pliku ('<plik>_<kolumna>'; zmiana samych nazw, bez kopii danych),
+    filters – wspólne warunki dla wszystkich plików (patrz read_file).
+    Same pliki CSV przy dostępnym pyarrow czyta pula wątków (pyarrow zwalnia GIL, a wyniki
+    nie są kopiowane między procesami); pozostałe – pula procesów.
+    """
+    files = list(files)
+    cols = [usecols.get(file) if isinstance(usecols, dict) else usecols for file in files]
+    workers = min(len(files), workers or os.cpu_count() or 1)
+    if workers <= 1:
+        frames = [read_file(file, c, compact, cache_dir, cache_limit, filters) for file, c in zip(files, cols)]
+    else:
+        only_arrow_csv = HAS_PYARROW and all(os.path.splitext(f)[1].lower() in CSV_EXTENSIONS for f in files)
+        executor = ThreadPoolExecutor if only_arrow_csv else ProcessPoolExecutor
+        with executor(max_workers=workers) as pool:
+            n = len(files)
+            frames = list(pool.map(read_file, files, cols, [compact] * n, [cache_dir] * n, [cache_limit] * n,
+                                   [filters] * n))
+    if prefix:
+        frames = [df.set_axis([f"{file_prefix(file)}_{col}" for col in df.columns], axis=1)
+                  for file, df in zip(files, frames)]
+    return list(zip(files, frames))
+
+
+def read_csv(file, usecols=None):
+    if HAS_PYARROW:
+        try:
+            return pd.read_csv(file, usecols=usecols, engine='pyarrow')
+        except (ValueError, pyarrow.ArrowInvalid):
+            pass  # np. nierówna liczba pól w wierszach – zostaje silnik pandas
+    return pd.read_csv(file, usecols=usecols)
+
+
+def _read_csv_filtered(file, usecols, filters):
+    # blokami – w pamięci zostają tylko pasujące wiersze; koniec czytania po górnej granicy czasu.
+    # Strumień pyarrow daje te same typy co read_csv; gdy typ kolumny zmienia się w dalszych
+    # blokach (typy ustala pierwszy blok) – od nowa silnikiem pandas.
+    if HAS_PYARROW:
+        try:
+            return _filter_blocks(_iter_arrow_csv(file, usecols), BlockFilter(filters), file, usecols)
+        except pyarrow.ArrowInvalid:
+            pass
+    with pd.read_csv(file, usecols=usecols, chunksize=CSV_CHUNK_ROWS) as reader:
+        return _filter_blocks(reader, BlockFilter(filters), file, usecols)
+
+
+def _iter_arrow_csv(file, usecols):
+    import pyarrow.csv
+    reader = pyarrow.csv.open_csv(file, read_options=pyarrow.csv.ReadOptions(block_size=CSV_BLOCK_BYTES),
+                                  convert_options=pyarrow.csv.ConvertOptions(include_columns=usecols))
+    for batch in reader:
+        yield batch.to_pandas()
+
+
+def _filter_blocks(blocks, row_filter, file, usecols):
+    parts = []
+    for block in blocks:
+        parts.append(block.loc[row_filter.mask(block)])
+        if row_filter.done:
+            break
+    return pd.concat(parts, ignore_index=True) if parts else read_csv(file, usecols).iloc[0:0]
+
+
+def compact_dtypes(df):
+    """
+    Zmniejsza typy kolumn w miejscu i zwraca df: float64 -> float32 (gdy nie zmienia
+    wartości ponad FLOAT32_RTOL), liczby całkowite -> najmniejszy pasujący typ,
+    powtarzający się tekst -> category. Kolumny czasu nie są zmieniane.
+    """
+    for col in df.columns:
+        values = df[col]
+        kind = values.dtype.kind
+        if kind == 'f' and values.dtype.itemsize > 4:
+            as32 = values.astype(np.float32)
+            finite = np.isfinite(values.to_numpy())
+            if np.allclose(as32.to_numpy()[finite], values.to_numpy()[finite], rtol=FLOAT32_RTOL, atol=0):
+                df[col] = as32
+        elif kind in 'iu':
+            df[col] = pd.to_numeric(values, downcast='integer' if kind == 'i' else 'unsigned')
+        elif kind == 'O' or isinstance(values.dtype, pd.StringDtype):
+            if len(values) and values.nunique() <= len(values) * CATEGORY_MAX_RATIO:
+                df[col] = values.astype('category')
+    return df
+
+
+# ====== DBF (dBase III / FoxPro) ==============================================
+
+def read_dbf_fields(file, codec='utf-8'):
+    """Zwraca (liczba_rekordów, długość_nagłówka, długość_rekordu, pola); pole = (nazwa, typ, offset, długość, miejsca_dziesiętne)."""
+    with open(file, 'rb') as f:
+        numrec, lenheader, lenrecord = struct.unpack('<4xLHH20x', f.read(32))
+        fields = []
+        offset = 1  # pierwszy bajt rekordu to znacznik usunięcia
+        while f.tell() < lenheader - 1:
+            descriptor = f.read(32)
+            if not descriptor or descriptor[0] == 0x0D:
+                break
+            name, typ, size, decimals = struct.unpack('<11sc4xBB14x', descriptor)
+            fields.append((name.split(b'\x00')[0].decode(codec).strip(), typ.decode('ascii'),
+                           offset, size, decimals))
+            offset += size
+    return numrec, lenheader, lenrecord, fields
+
+
+def _select_dbf_fields(file, usecols, codec):
+    numrec, lenheader, lenrecord, fields = read_dbf_fields(file, codec)
+    if usecols is not None:
+        wanted = set(usecols)
+        missing = wanted - {field[0] for field in fields}
+        if missing:
+            raise ValueError(f"Brak kolumn w pliku {os.path.basename(file)}: {sorted(missing)}")
+        fields = [field for field in fields if field[0] in wanted]
+    return numrec, lenheader, lenrecord, fields
+
+
+def _iter_dbf_blocks(file, fields, numrec, lenheader, lenrecord, codec, chunk_records, filters=None):
+    # kolejne bloki rekordów jako {nazwa_pola: tablica}, bez rekordów usuniętych;
+    # przy filtrach najpierw dekodowane są pola warunków, pozostałe – tylko dla pasujących rekordów
+    row_filter = BlockFilter(filters) if filters else None
+    if row_filter:
+        all_fields = {field[0]: field for field in read_dbf_fields(file, codec)[3]}
+        filter_fields = [all_fields[name] for name in row_filter.columns]
+    with open(file, 'rb') as f:
+        f.seek(lenheader)
+        remaining = numrec
+        while remaining > 0:
+            count = min(chunk_records, remaining)
+            data = f.read(count * lenrecord)
+            count = len(data) // lenrecord
+            if count == 0:
+                break  # plik krótszy niż deklaruje nagłówek
+            remaining -= count
+            records = np.frombuffer(data, dtype=np.uint8, count=count * lenrecord).reshape(count, lenrecord)
+            records = records[records[:, 0] != ord('*')]
+            if row_filter:
+                mask = row_filter.mask(pd.DataFrame({field[0]: _decode_dbf_field(records, field, codec)
+                                                     for field in filter_fields}))
+                records = records[mask]
+            yield {field[0]: _decode_dbf_field(records, field, codec) for field in fields}
+            if row_filter and row_filter.done:
+                break
+
+
+def _decode_dbf_field(records, field, codec):
+    name, typ, offset, size, decimals = field
+    return _decode_dbf_column(np.ascontiguousarray(records[:, offset:offset + size]).view(f'S{size}').ravel(),
+                              typ, size, codec)
+
+
+def _finish_dbf_column(values, typ, decimals):
+    if typ in 'NF' and decimals == 0 and values.dtype.kind == 'f' and len(values) \
+            and not np.isnan(values).any() and np.array_equal(values, np.floor(values)):
+        return values.astype(np.int64)
+    if typ == 'L' and len(values) and not pd.isna(values).any():
+        return values.astype(bool)
+    return values
+
+
+def read_dbf(file, usecols=None, codec='utf-8', chunk_records=DBF_CHUNK_RECORDS, filters=None):
+    """
+    Czyta DBF blokami po `chunk_records` rekordów i buduje kolumny bezpośrednio z bajtów
+    (bez pośredniego CSV). Usunięte rekordy są pomijane, puste wartości to NaN,
+    pola N/F bez części dziesiętnej i bez braków dostają typ int64.
+    filters – warunki już rozwiązane dla pliku (filters.resolve_filters).
+    """
+    numrec, lenheader, lenrecord, fields = _select_dbf_fields(file, usecols, codec)
+    parts = {field[0]: [] for field in fields}
+    for block in _iter_dbf_blocks(file, fields, numrec, lenheader, lenrecord, codec, chunk_records, filters):
+        for name, values in block.items():
+            parts[name].append(values)
+
+    columns = {}
+    for name, typ, offset, size, decimals in fields:
+        values = np.concatenate(parts[name]) if parts[name] else np.array([], dtype=object)
+        columns[name] = _finish_dbf_column(values, typ, decimals)
+    return pd.DataFrame(columns)
+
+
+def iter_dbf(file, usecols=None, codec='utf-8', chunk_records=DBF_CHUNK_RECORDS, filters=None):
+    """Jak read_dbf, ale zwraca kolejne bloki jako osobne DataFrame (tryb strumieniowy)."""
+    numrec, lenheader, lenrecord, fields = _select_dbf_fields(file, usecols, codec)
+    for block in _iter_dbf_blocks(file, fields, numrec, lenheader, lenrecord, codec, chunk_records, filters):
+        yield pd.DataFrame({name: _finish_dbf_column(block[name], typ, decimals)
+                            for name, typ, offset, size, decimals in fields})
+
+
+def _decode_dbf_column(raw, typ, size, codec):
+    if typ in 'NF':
+        text = np.char.strip(raw)
+        text[text == b''] = b'nan'
+        try:
+            return text.astype(np.float64)
+        except ValueError:  # np. przepełnienie pola zapisane jako '****'
+            return pd.to_numeric(pd.Series(text).str.decode('ascii', errors='replace'),
+                                 errors='coerce').to_numpy(np.float64)
+    if typ == 'D':
+        return pd.to_datetime(pd.Series(raw).str.decode('ascii', errors='replace'),
+                              format='%Y%m%d', errors='coerce').to_numpy()
+    if typ == 'L':
+        values = np.full(len(raw), np.nan, dtype=object)
+        flag = np.frombuffer(raw.tobytes(), dtype=np.uint8)[::size]
+        values[np.isin(flag, list(b'TtYy'))] = True
+        values[np.isin(flag, list(b'FfNn'))] = False
+        return values
+    if typ == 'I' and size == 4:
+        return np.frombuffer(raw.tobytes(), dtype='<i4')
+    if typ in 'BO' and size == 8:
+        return np.frombuffer(raw.tobytes(), dtype='<f8')
+    if typ == 'Y' and size == 8:
+        return np.frombuffer(raw.tobytes(), dtype='<i8') / 10000.0
+    if typ in '@T' and size == 8:
+        # FoxPro: dzień juliański (int32) + milisekundy od północy (int32)
+        parts = np.frombuffer(raw.tobytes(), dtype='<i4').reshape(-1, 2).astype(np.int64)
+        ms = (parts[:, 0] - 2440588) * 86400000 + parts[:, 1]
+        return np.where(parts[:, 0] > 0, ms, np.iinfo(np.int64).min).astype('datetime64[ms]')
+    # C (tekst) i pozostałe typy: obcięte spacje, pusty tekst -> NaN
+    text = pd.Series(raw).str.decode(codec, errors='replace').str.strip()
+    return text.mask(text == '').to_numpy(dtype=object)
@@ -0,0 +1,157 @@
+"""
+Przetwarzanie danych dla wykresów bez GUI: synchronizacja po czasie, łączenie
+ramek i budowa wykresu plotly. Używane przez wykresy.py (okna Tk) i batch.py (wsadowo).
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+from plotly.subplots import make_subplots
+
+from loaders import file_prefix
+from timesync import TIME_COLUMN, find_time_column, align_asof, resample_align
+from downsample import DEFAULT_MAX_POINTS, downsample_indices
+
+WEBGL_MIN_POINTS = 50000  # od tylu punktów serii (po redukcji) Scattergl zamiast Scatter
+PANEL_HEIGHT = 300  # [px] wysokość jednego panelu w zestawieniu (build_dashboard)
+
+# Funkcja do sprawdzenia obecności kolumny czasu we wszystkich plikach
+def check_if_all_files_have_time_column(files_columns):
+    all_have_time = True
+    only_dbf_files = all(file.endswith('.dbf') for file, _ in files_columns)
+    
+    for _, df in files_columns:
+        if find_time_column(df) is None:  # też '<plik>_pm_time' przy prefiksie nadanym przy wczytaniu
+            all_have_time = False
+            break
+    
+    return all_have_time and only_dbf_files
+
+# Funkcja do synchronizacji plików DBF na podstawie kolumny z czasem 'pm_time'.
+# Pliki są łączone po znaczniku czasu (timesync), a nie po numerze wiersza:
+# resample=None – wspólna oś ze wszystkich znaczników, wartość z ostatniej próbki w granicach tolerance [s];
+# resample='1s' itp. – wspólna siatka czasu, agregacja how ('mean' / 'last' / 'minmax').
+# prefixed=True – kolumny mają już prefiks pliku (read_files(prefix=True)).
+def synchronize_dbf_data(files_columns, tolerance=None, resample=None, how='mean', prefixed=False):
+    frames = []
+    for file, df in files_columns:
+        if find_time_column(df) is None:
+            continue
+        frames.append((None if prefixed else file_prefix(file), df))
+
+    if not frames:
+        return None, None, None
+
+    try:
+        if resample:
+            merged_df = resample_align(frames, resample, how)
+        else:
+            merged_df = align_asof(frames, tolerance=tolerance)
+    except ValueError as e:
+        print(f"Błąd przy synchronizacji plików po kolumnie 'pm_time': {e}")
+        return None, None, None
+
+    times = merged_df[TIME_COLUMN]
+    min_time, max_time = times.min(), times.max()
+    merged_df.insert(1, 'TimeDiff', (times - min_time).dt.total_seconds())
+    return merged_df, min_time, max_time
+
+# Funkcja do dodania prefiksów do nazw kolumn w DataFrame na podstawie nazwy pliku
+# (nowe ramki z samymi nazwami zmienionymi – dane nie są kopiowane, ramki wejściowe bez zmian)
+def add_prefix_to_columns(files_columns):
+    prefixed_dataframes = []
+    for file, df in files_columns:
+        prefix = file_prefix(file)
+        prefixed_dataframes.append(df.set_axis([f"{prefix}_{col}" for col in df.columns], axis=1))
+    return prefixed_dataframes
+
+def generate_filename(prefix, extension, output_dir):
+    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return os.path.join(output_dir, f"{prefix}_{current_time}.{extension}")
+
+# Seria wykresu; czas zapisywany jako liczba ms od epoki (oś typu 'date' rysuje go tak samo),
+# bo plotly zapisuje tablice liczbowe binarnie (base64, typed array), a czas – jako listę tekstów ISO.
+# Zwraca (seria, czy_oś_czasu).
+def make_trace(x, y, name, use_webgl=True):
+    is_date = pd.api.types.is_datetime64_any_dtype(x.dtype)
+    if is_date:
+        ns = x.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        x = np.where(ns == np.iinfo(np.int64).min, np.nan, ns / 1e6)  # NaT -> przerwa w linii
+    else:
+        x = _numeric_array(x)
+    trace = go.Scattergl if use_webgl and len(y) >= WEBGL_MIN_POINTS else go.Scatter
+    return trace(x=x, y=_numeric_array(y), mode='lines', name=name), is_date
+
+def _numeric_array(values):
+    # liczby jako tablica numpy (zapis binarny); typy z brakami (Int64, Float32) -> float64 z NaN
+    if values.dtype.kind in 'fiu':
+        return values.to_numpy()
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        return values.to_numpy(dtype=np.float64, na_value=np.nan)
+    return values
+
+def _add_series(fig, df, x_col, y_cols, max_points, method, use_webgl, **position):
+    is_date = False
+    for y_col in y_cols:
+        x, y = df[x_col], df[y_col]
+        if method:
+            indices = downsample_indices(x, y, max_points, method)
+            if indices is not None:
+                x, y = x.iloc[indices], y.iloc[indices]
+        trace, is_date = make_trace(x, y, y_col, use_webgl)
+        fig.add_trace(trace, **position)
+    return is_date
+
+# Wykres plotly; każda seria jest przed rysowaniem redukowana do max_points punktów
+# (min-max zachowuje szpilki i krótkie alarmy, LTTB – kształt przebiegu)
+def build_figure(df, x_col, y_cols, max_points=DEFAULT_MAX_POINTS, method='minmax', use_webgl=True,
+                 title='Wykres dynamiczny'):
+    fig = go.Figure()
+    if _add_series(fig, df, x_col, y_cols, max_points, method, use_webgl):
+        fig.update_xaxes(type='date')
+    fig.update_layout(title=title, xaxis_title=x_col, yaxis_title="Wartość")
+    return fig
+
+# Zestawienie kilku wykresów jeden pod drugim w jednej figurze (jeden plik HTML na sesję).
+# panels – lista słowników: x_col, y_cols i opcjonalnie title, max_points, method, use_webgl.
+# Gdy wszystkie panele mają tę samą oś X, osie są połączone (przybliżenie / przesunięcie działa na wszystkich).
+def build_dashboard(df, panels, title='Zestawienie wykresów'):
+    def add_panel(fig, panel, **position):
+        return _add_series(fig, df, panel['x_col'], panel['y_cols'], panel.get('max_points', DEFAULT_MAX_POINTS),
+                           panel.get('method', 'minmax'), panel.get('use_webgl', True), **position)
+    return dashboard_figure(panels, add_panel, title)
+
+# Układ zestawienia; add_panel(fig, panel, row=, col=) dodaje serie panelu i zwraca True dla osi czasu
+# (build_dashboard – z ramki, stream.build_dashboard_from_parquet – z pliku Parquet)
+def dashboard_figure(panels, add_panel, title='Zestawienie wykresów'):
+    shared = len({panel['x_col'] for panel in panels}) == 1
+    fig = make_subplots(rows=len(panels), cols=1, shared_xaxes=shared, vertical_spacing=0.04,
+                        subplot_titles=[panel.get('title') or ', '.join(map(str, panel['y_cols'])) for panel in panels])
+    for row, panel in enumerate(panels, start=1):
+        is_date = add_panel(fig, panel, row=row, col=1)
+        fig.update_xaxes(type='date' if is_date else '-', row=row, col=1)
+    if shared:
+        fig.update_xaxes(title_text=panels[-1]['x_col'], row=len(panels), col=1)
+    fig.update_layout(title=title, height=max(400, PANEL_HEIGHT * len(panels)), hovermode='x')
+    return fig
+
+# Zapis HTML; plotlyjs='directory' – plotly.min.js zapisywany raz w katalogu wyników (pomijany,
+# gdy już tam jest) i tylko wskazywany z pliku HTML; 'cdn' – z sieci; True – wbudowany w każdy plik (~4.5 MB)
+def write_figure_html(fig, path, plotlyjs='directory'):
+    pio.write_html(fig, file=path, include_plotlyjs=plotlyjs, auto_open=False)
+
+# Jedna szeroka ramka z wczytanych plików: same pliki DBF z 'pm_time' – wyrównane po czasie
+# (pm_time + TimeDiff + kolumny z prefiksem pliku), pozostałe – kolumny z prefiksem obok siebie.
+# Ramka powstaje raz: przy prefiksie nadanym już przy wczytaniu (prefixed=True) nie ma zmiany nazw,
+# a kolumny ramek wejściowych nie są kopiowane ani sklejane w bloki (poza dopełnieniem krótszych plików NaN).
+def build_final_frame(files_columns, sync_options=None, prefixed=False):
+    final_df = None
+    if check_if_all_files_have_time_column(files_columns):
+        final_df, min_time, max_time = synchronize_dbf_data(files_columns, **(sync_options or {}), prefixed=prefixed)
+    if final_df is None:
+        frames = [df for _, df in files_columns] if prefixed else add_prefix_to_columns(files_columns)
+        final_df = pd.concat(frames, axis=1)
+    return final_df
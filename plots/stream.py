@@ -0,0 +1,308 @@
+"""
+Tryb strumieniowy dla logów większych niż pamięć RAM (bez tkinter).
+
+Pliki są czytane blokami, których rozmiar wynika z budżetu pamięci, a wynik trafia
+przyrostowo do pliku Parquet (grupa wierszy na blok). Nic nie jest trzymane w całości:
+- align='time': każdy plik jest agregowany do siatki czasu co `resample` (mean / last / minmax);
+  częściowe przedziały na granicy bloków są łączone, a pliki scalane po czasie (k-way) –
+  wiersz trafia do wyniku, gdy wszystkie pliki minęły jego przedział. Przedziały bez próbek
+  są pomijane. Pliki muszą być posortowane po czasie.
+- align='position': bloki o tej samej liczbie wierszy ze wszystkich plików obok siebie
+  (jak pd.concat(axis=1), ale blok po bloku).
+Etap wykresu (build_figure_from_parquet) czyta wynik grupami wierszy i redukuje
+każdą serię do zadanej liczby punktów.
+Excel nie ma czytnika strumieniowego – taki plik jest wczytywany w całości jako jeden blok.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+from loaders import CSV_EXTENSIONS, DBF_EXTENSIONS, file_prefix, read_columns, read_dbf_fields, iter_dbf, read_file
+from filters import BlockFilter, columns_to_read, resolve_filters
+from timesync import TIME_COLUMN, RESAMPLE_METHODS, find_time_column, parse_times
+from downsample import DEFAULT_MAX_POINTS, downsample_indices
+
+DEFAULT_MEMORY_BUDGET = 512 * 1024 ** 2
+PARSE_OVERHEAD = 4  # ramka w pamięci jest ~tyle razy większa niż rekord w pliku (szacunek)
+MIN_CHUNK_ROWS = 10000
+_COMBINE = {'sum': 'sum', 'count': 'sum', 'min': 'min', 'max': 'max', 'last': 'last'}
+
+
+def parse_size(value):
+    """'512M', '2G', 1048576 -> bajty."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    value = str(value).strip().upper().rstrip('B')
+    unit = value[-1:] if value[-1:] in units else ''
+    return int(float(value[:len(value) - len(unit)]) * units[unit])
+
+
+def chunk_rows_for(file, budget):
+    """Liczba wierszy bloku tak, by sparsowany blok zmieścił się w `budget` bajtach."""
+    if os.path.splitext(file)[1].lower() in DBF_EXTENSIONS:
+        row_bytes = read_dbf_fields(file)[2]
+    else:
+        with open(file, 'rb') as f:
+            sample = f.read(1024 * 1024)
+        row_bytes = len(sample) / max(1, sample.count(b'\n'))
+    return max(MIN_CHUNK_ROWS, int(budget / (max(row_bytes, 1) * PARSE_OVERHEAD)))
+
+
+def iter_chunks(file, usecols=None, chunk_rows=MIN_CHUNK_ROWS, filters=None):
+    """Kolejne bloki pliku; filters – warunki (filters.py) stosowane blok po bloku."""
+    ext = os.path.splitext(file)[1].lower()
+    if ext not in CSV_EXTENSIONS + DBF_EXTENSIONS:
+        yield read_file(file, usecols, filters=filters)
+        return
+    filters = resolve_filters(filters, read_columns(file)) if filters else None
+    read_cols = columns_to_read(usecols, filters)
+    if ext in DBF_EXTENSIONS:
+        chunks = iter_dbf(file, read_cols, chunk_records=chunk_rows, filters=filters)
+    else:
+        chunks = _iter_csv(file, read_cols, chunk_rows, filters)
+    for chunk in chunks:
+        yield chunk if read_cols is usecols else chunk[list(usecols)]
+
+
+def _iter_csv(file, usecols, chunk_rows, filters):
+    row_filter = BlockFilter(filters) if filters else None
+    with pd.read_csv(file, usecols=usecols, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            if row_filter is None:
+                yield chunk
+                continue
+            yield chunk.loc[row_filter.mask(chunk)]
+            if row_filter.done:
+                return
+
+
+# ====== Wyrównanie po czasie ===================================================
+
+def _partial_bins(chunk, time_col, step, how):
+    # częściowe agregaty przedziałów bloku; indeks = początek przedziału [ns]
+    times = parse_times(chunk[time_col]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valid = times != np.iinfo(np.int64).min
+    values = chunk.loc[valid].drop(columns=time_col)
+    grouped = values.groupby((times[valid] - times[valid] % step), sort=True)
+    parts = {}
+    for col in values.columns:
+        dtype = values[col].dtype
+        if pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+            stats = {'mean': ('sum', 'count'), 'last': ('last',), 'minmax': ('min', 'max')}[how]
+        else:
+            stats = ('last',)
+        for stat in stats:
+            parts[(col, stat)] = getattr(grouped[col], stat)()
+    return pd.DataFrame(parts)
+
+
+def _finalize_bins(partial, prefix):
+    out = {}
+    for col, stat in partial.columns:
+        name = f"{prefix}_{col}"
+        if stat == 'sum':
+            out[name] = partial[(col, 'sum')] / partial[(col, 'count')].replace(0, np.nan)
+        elif stat in ('min', 'max'):
+            out[f"{name}_{stat}"] = partial[(col, stat)]
+        elif stat == 'last':
+            out[name] = partial[(col, stat)]
+    return pd.DataFrame(out, index=partial.index)
+
+
+def _binned_pieces(file, prefix, usecols, chunk_rows, step, how, filters=None):
+    """Kolejne gotowe przedziały jednego pliku; ostatni (może być niepełny) czeka na następny blok."""
+    carry = None
+    for chunk in iter_chunks(file, usecols, chunk_rows, filters):
+        time_col = find_time_column(chunk)
+        if time_col is None:
+            raise ValueError(f"Brak kolumny czasu w pliku {os.path.basename(file)}")
+        part = _partial_bins(chunk, time_col, step, how)
+        if carry is not None:
+            part = pd.concat([carry, part]).groupby(level=0, sort=True).agg(
+                {key: _COMBINE[key[1]] for key in part.columns})
+        if len(part) == 0:
+            continue
+        carry = part.iloc[-1:]
+        if len(part) > 1:
+            yield _finalize_bins(part.iloc[:-1], prefix)
+    if carry is None:
+        # bez tego plik znikałby z wyniku bez śladu (schemat Parquet bierze kolumny z pierwszego bloku)
+        raise ValueError(f"Brak danych do zapisania z pliku {os.path.basename(file)} – filtry wykluczyły "
+                         f"wszystkie wiersze albo nie udało się odczytać czasu")
+    yield _finalize_bins(carry, prefix)
+
+
+def _merge_by_time(pieces):
+    """k-way scalanie strumieni przedziałów po czasie; zwraca kolejne szerokie bloki."""
+    buffers = [None] * len(pieces)
+    active = set(range(len(pieces)))
+
+    def horizon(i):
+        return buffers[i].index[-1] if buffers[i] is not None and len(buffers[i]) else -np.inf
+
+    while active or any(b is not None and len(b) for b in buffers):
+        if active:
+            # doczytujemy plik, który najbardziej wstrzymuje postęp
+            i = min(active, key=horizon)
+            piece = next(pieces[i], None)
+            if piece is None:
+                active.discard(i)
+            else:
+                buffers[i] = piece if buffers[i] is None else pd.concat([buffers[i], piece])
+        watermark = min((horizon(i) for i in active), default=np.inf)
+        ready = [b.loc[b.index <= watermark] for b in buffers if b is not None]
+        if any(len(part) for part in ready):
+            yield pd.concat(ready, axis=1).sort_index()
+            buffers = [None if b is None else b.loc[b.index > watermark] for b in buffers]
+
+
+# ====== Łączenie po pozycji ====================================================
+
+def _merge_by_position(files, usecols, chunk_rows, filters=None):
+    readers = [iter_chunks(file, usecols.get(file), chunk_rows, filters) for file in files]
+    prefixes = [file_prefix(file) for file in files]
+    empty = [None] * len(files)
+    offset = 0
+    while True:
+        parts = []
+        for i, reader in enumerate(readers):
+            chunk = next(reader, None)
+            if chunk is None:
+                parts.append(empty[i] if empty[i] is not None else pd.DataFrame())
+                continue
+            chunk = chunk.set_axis([f"{prefixes[i]}_{col}" for col in chunk.columns], axis=1)
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+            empty[i] = chunk.iloc[0:0]
+            parts.append(chunk)
+        if all(part is empty[i] or not len(part) for i, part in enumerate(parts)):
+            return
+        out = pd.concat(parts, axis=1)
+        offset += len(out)
+        yield out
+
+
+# ====== Zapis i wykres ==========================================================
+
+def stream_to_parquet(files, output, usecols=None, align='time', resample='1s', how='mean',
+                      memory_budget=DEFAULT_MEMORY_BUDGET, filters=None):
+    """
+    Łączy pliki blokami i zapisuje wynik przyrostowo do `output` (Parquet).
+    usecols – jedna lista albo {plik: lista}; memory_budget – bajty lub np. '512M'
+    (dzielony między pliki; szacunek – rzeczywiste zużycie zależy od typów kolumn),
+    filters – zakres czasu / warunki (filters.py) stosowane przy czytaniu bloków.
+    Zwraca liczbę zapisanych wierszy.
+    """
+    if pq is None:
+        raise RuntimeError("Tryb strumieniowy wymaga pakietu pyarrow.")
+    if how not in RESAMPLE_METHODS:
+        raise ValueError(f"Nieznana metoda agregacji: {how}")
+    files = list(files)
+    usecols = usecols if isinstance(usecols, dict) else {file: usecols for file in files}
+    budget = parse_size(memory_budget) // (2 * max(1, len(files)))  # blok w pracy + bufor scalania
+    chunk_rows = min(chunk_rows_for(file, budget) for file in files)
+
+    if align == 'time':
+        step = pd.Timedelta(pd.tseries.frequencies.to_offset(resample)).value
+        pieces = [_binned_pieces(file, file_prefix(file), usecols.get(file),
+                                 chunk_rows, step, how, filters) for file in files]
+        blocks = _merge_by_time(pieces)
+    elif align == 'position':
+        blocks = _merge_by_position(files, usecols, chunk_rows, filters)
+    else:
+        raise ValueError(f"Nieznany tryb łączenia: {align}")
+
+    tmp_path = output + '.partial'
+    writer = None
+    rows = 0
+    try:
+        for block in blocks:
+            if align == 'time':
+                block.insert(0, TIME_COLUMN, block.index.to_numpy(dtype=np.int64).view('datetime64[ns]'))
+            table = _to_table(block, writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+            rows += len(block)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise ValueError("Brak danych do zapisania.")
+    os.replace(tmp_path, output)
+    return rows
+
+
+def _to_table(block, schema):
+    # kolejne bloki rzutowane na schemat pierwszego; kolumna bez próbek w bloku (NaN) -> null
+    if schema is None:
+        return pa.Table.from_pandas(block, preserve_index=False)
+    block = block.reindex(columns=schema.names)
+    for col in block.columns[block.isna().all().to_numpy()]:
+        block[col] = pd.Series(None, index=block.index, dtype=object)
+    return pa.Table.from_pandas(block, schema=schema, preserve_index=False)
+
+
+def parquet_columns(path):
+    return list(pq.ParquetFile(path).schema_arrow.names)
+
+
+def _read_downsampled(path, series):
+    """
+    Serie z wyniku stream_to_parquet: series – lista (x_col, y_col, max_points, method), wynik –
+    lista (x, y). Plik czytany grupami wierszy, każda seria redukowana w grupie proporcjonalnie
+    do udziału grupy w max_points.
+    """
+    parquet = pq.ParquetFile(path)
+    total = max(1, parquet.metadata.num_rows)
+    columns = list(dict.fromkeys(col for x_col, y_col, _, _ in series for col in (x_col, y_col)))
+    pieces = [([], []) for _ in series]
+    for group in range(parquet.num_row_groups):
+        df = parquet.read_row_group(group, columns=columns).to_pandas()
+        for (x_col, y_col, max_points, method), (xs, ys) in zip(series, pieces):
+            share = max(4, int(max_points * len(df) / total))
+            indices = downsample_indices(df[x_col], df[y_col], share, method) if method else None
+            xs.append(df[x_col] if indices is None else df[x_col].iloc[indices])
+            ys.append(df[y_col] if indices is None else df[y_col].iloc[indices])
+    return [(pd.concat(xs, ignore_index=True), pd.concat(ys, ignore_index=True)) for xs, ys in pieces]
+
+
+def build_figure_from_parquet(path, x_col, y_cols, max_points=DEFAULT_MAX_POINTS, method='minmax',
+                              use_webgl=True, title='Wykres dynamiczny'):
+    """Wykres z wyniku stream_to_parquet (serie zredukowane przez _read_downsampled)."""
+    import plotly.graph_objs as go
+    from pipeline import make_trace
+
+    fig = go.Figure()
+    for y, (xs, ys) in zip(y_cols, _read_downsampled(path, [(x_col, y, max_points, method) for y in y_cols])):
+        trace, is_date = make_trace(xs, ys, y, use_webgl)
+        fig.add_trace(trace)
+        if is_date:
+            fig.update_xaxes(type='date')
+    fig.update_layout(title=title, xaxis_title=x_col, yaxis_title="Wartość")
+    return fig
+
+
+def build_dashboard_from_parquet(path, panels, title='Zestawienie wykresów'):
+    """Zestawienie paneli (jak pipeline.build_dashboard) z wyniku stream_to_parquet – jedno czytanie pliku."""
+    from pipeline import dashboard_figure, make_trace
+
+    series = [(panel['x_col'], y, panel.get('max_points', DEFAULT_MAX_POINTS), panel.get('method', 'minmax'))
+              for panel in panels for y in panel['y_cols']]
+    data = iter(_read_downsampled(path, series))
+
+    def add_panel(fig, panel, **position):
+        is_date = False
+        for y in panel['y_cols']:
+            xs, ys = next(data)
+            trace, is_date = make_trace(xs, ys, y, panel.get('use_webgl', True))
+            fig.add_trace(trace, **position)
+        return is_date
+    return dashboard_figure(panels, add_panel, title)
@@ -0,0 +1,172 @@
+"""
+Wyrównywanie w czasie danych z wielu plików (bez tkinter).
+
+Pliki próbkowane z różną częstotliwością są łączone po znaczniku czasu, a nie po
+numerze wiersza:
+- align_asof: wspólna oś czasu = scalone (k-way) posortowane znaczniki wszystkich plików;
+  dla każdego pliku brana jest ostatnia (lub najbliższa) próbka w granicach tolerancji –
+  jak pd.merge_asof, ale indeksy liczy np.searchsorted, więc szeroka ramka powstaje raz,
+- resample_align: wspólna siatka co `rule` (np. '1s', '1min') z agregacją mean / last / minmax.
+"""
+import numpy as np
+import pandas as pd
+
+TIME_COLUMN = 'pm_time'
+PM_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+RESAMPLE_METHODS = ('mean', 'last', 'minmax')
+
+
+def find_time_column(df):
+    """Pierwsza kolumna, której nazwa zawiera 'pm_time' (lub None)."""
+    return next((col for col in df.columns if TIME_COLUMN in str(col)), None)
+
+
+def parse_times(values, fmt=PM_TIME_FORMAT):
+    """
+    Zamienia kolumnę czasu na datetime64. Tekst parsowany jest wektorowo z jawnym
+    formatem i cache (każda unikalna wartość tylko raz); gdy format nie pasuje
+    do żadnej wartości – ponownie z rozpoznawaniem formatu. Kolumny już typu
+    datetime są zwracane bez zmian.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.to_datetime(values, format=fmt, errors='coerce', cache=True)
+    if parsed.isna().all() and values.notna().any():
+        parsed = pd.to_datetime(values, format='mixed', errors='coerce', cache=True)
+    return parsed
+
+
+def _sorted_times(df, time_col):
+    """Zwraca (czasy int64 ns posortowane, kolejność wierszy), pomijając puste znaczniki."""
+    times = parse_times(df[time_col]).to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valid = np.flatnonzero(times != np.iinfo(np.int64).min)
+    if len(valid) == len(times) and (np.diff(times) >= 0).all():
+        return times, valid  # logi zwykle są już posortowane – bez argsort i kopii
+    order = valid[np.argsort(times[valid], kind='stable')]
+    return times[order], order
+
+
+def _merge_sorted(arrays):
+    # k-way merge posortowanych znaczników bez duplikatów; sortowanie stabilne (timsort)
+    # wykrywa posortowane serie, więc koszt jest bliski liniowemu
+    merged = np.sort(np.concatenate(arrays or [np.array([], dtype=np.int64)]), kind='stable')
+    return merged[np.r_[True, merged[1:] != merged[:-1]]] if len(merged) else merged
+
+
+def _take(series, rows):
+    # wiersze wg indeksów z zachowaniem typu (np. category); -1 = brak dopasowania (NaN / NaT).
+    # Na tablicy, nie na Series – bez budowania indeksu i bez where() na całej kolumnie.
+    if len(series) == 0:
+        return np.full(len(rows), np.nan)
+    values = series.array if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) else series.to_numpy()
+    return pd.api.extensions.take(values, rows, allow_fill=bool((rows < 0).any()))
+
+
+def _column_name(prefix, col):
+    # prefiks None – nazwy kolumn mają już prefiks pliku (nadany przy wczytaniu)
+    return str(col) if prefix is None else f"{prefix}_{col}"
+
+
+def _is_numeric(dtype):
+    return pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype)
+
+
+def align_asof(frames, tolerance=None, direction='backward'):
+    """
+    frames – lista (prefiks, DataFrame); każda ramka musi mieć kolumnę czasu.
+    Zwraca jedną ramkę: 'pm_time' (wspólna oś) + kolumny '<prefiks>_<kolumna>'
+    (prefiks None – nazwy kolumn bez zmian). Kolumny wyniku nie są kopiowane ani sklejane w bloki.
+    tolerance – maksymalny odstęp do dopasowanej próbki (sekundy / Timedelta / None = bez limitu),
+    direction – 'backward' (ostatnia znana wartość) lub 'nearest'.
+    """
+    if direction not in ('backward', 'nearest'):
+        raise ValueError(f"Nieznany kierunek dopasowania: {direction}")
+    if isinstance(tolerance, (int, float)):
+        tolerance = pd.Timedelta(seconds=tolerance)
+    tol = None if tolerance is None else pd.Timedelta(tolerance).value
+
+    prepared = []
+    for prefix, df in frames:
+        time_col = find_time_column(df)
+        times, order = _sorted_times(df, time_col)
+        prepared.append((prefix, df, time_col, times, order))
+
+    timeline = _merge_sorted([times for _, _, _, times, _ in prepared])
+    columns = {TIME_COLUMN: timeline.view('datetime64[ns]')}
+    for prefix, df, time_col, times, order in prepared:
+        n = len(times)
+        rows = np.full(len(timeline), -1, dtype=np.int64)
+        if n:
+            pos = np.searchsorted(times, timeline, side='right') - 1
+            if direction == 'nearest':
+                nxt = pos + 1
+                use_next = (nxt < n) & ((pos < 0) | (times[np.minimum(nxt, n - 1)] - timeline
+                                                     < timeline - times[np.maximum(pos, 0)]))
+                pos = np.where(use_next, nxt, pos)
+            matched = pos >= 0
+            if tol is not None:
+                matched &= np.abs(timeline - times[np.maximum(pos, 0)]) <= tol
+            rows = np.where(matched, order[np.maximum(pos, 0)], -1)
+        for col in df.columns:
+            if col != time_col:
+                columns[_column_name(prefix, col)] = _take(df[col], rows)
+    return pd.DataFrame(columns, copy=False)
+
+
+def resample_align(frames, rule, how='mean'):
+    """
+    Agreguje każdy plik do wspólnej siatki czasu co `rule` i łączy wyniki po siatce.
+    how – 'mean', 'last' albo 'minmax' (kolumny '<...>_min' i '<...>_max', zachowują szpilki).
+    Kolumny nieliczbowe zawsze biorą ostatnią wartość w przedziale.
+    """
+    if how not in RESAMPLE_METHODS:
+        raise ValueError(f"Nieznana metoda agregacji: {how}")
+    step = pd.Timedelta(pd.tseries.frequencies.to_offset(rule)).value
+    binned = []
+    for prefix, df in frames:
+        time_col = find_time_column(df)
+        times, order = _sorted_times(df, time_col)
+        bins = times - times % step  # początek przedziału (jak floor(rule))
+        starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]]) if len(bins) else np.array([], dtype=np.int64)
+        binned.append((prefix, df, time_col, order, bins[starts], starts))
+
+    used = [bin_times for *_, bin_times, _ in binned if len(bin_times)]
+    first = min((b[0] for b in used), default=0)
+    grid = np.arange(first, max((b[-1] for b in used), default=first - step) + step, step, dtype=np.int64)
+    columns = {TIME_COLUMN: grid.view('datetime64[ns]')}
+    for prefix, df, time_col, order, bin_times, starts in binned:
+        slot = (bin_times - first) // step
+        ends = np.r_[starts[1:], len(order)][:len(starts)] - 1  # ostatni wiersz każdego przedziału
+        for col in df.columns:
+            if col == time_col:
+                continue
+            name = _column_name(prefix, col)
+            if not _is_numeric(df[col].dtype):
+                rows = np.full(len(grid), -1, dtype=np.int64)
+                rows[slot] = order[ends]
+                columns[name] = _take(df[col], rows)
+                continue
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+            out_dtype = df[col].dtype if df[col].dtype.kind == 'f' else np.float64  # float32 zostaje float32
+            if how == 'mean':
+                aggregated = {name: _bin_mean(values, starts)}
+            elif how == 'last':
+                aggregated = {name: values[ends]}
+            else:
+                empty = not len(values)
+                aggregated = {f"{name}_min": values if empty else np.fmin.reduceat(values, starts),
+                              f"{name}_max": values if empty else np.fmax.reduceat(values, starts)}
+            for out_name, agg in aggregated.items():
+                full = np.full(len(grid), np.nan, dtype=out_dtype)
+                full[slot] = agg
+                columns[out_name] = full
+    return pd.DataFrame(columns, copy=False)
+
+
+def _bin_mean(values, starts):
+    if not len(values):
+        return values
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    return np.divide(sums, counts, out=np.full(len(sums), np.nan), where=counts > 0)
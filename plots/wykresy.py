@@ -1,72 +1,15 @@
 import pandas as pd
 import matplotlib.pyplot as plt
-import plotly.graph_objs as go
-import plotly.io as pio
 import tkinter as tk
 from tkinter import filedialog, messagebox, StringVar, IntVar, Checkbutton, Frame, Button, Radiobutton, DISABLED, NORMAL
 import os
-from simpledbf import Dbf5
-from datetime import datetime
-
-# Funkcja do sprawdzenia obecności kolumny czasu we wszystkich plikach
-def check_if_all_files_have_time_column(files_columns):
-    all_have_time = True
-    only_dbf_files = all(file.endswith('.dbf') for file, _ in files_columns)
-    
-    for _, df in files_columns:
-        if 'pm_time' not in df.columns:
-            all_have_time = False
-            break
-    
-    return all_have_time and only_dbf_files
-
-# Funkcja do synchronizacji plików DBF na podstawie kolumny z czasem 'pm_time'
-def synchronize_dbf_data(files_columns):
-    min_time = None
-    max_time = None
-    synced_dataframes = []
-    time_col_found = False
-
-    for file, df in files_columns:
-        pm_time_columns = [col for col in df.columns if 'pm_time' in col]
-        if len(pm_time_columns) == 0:
-            continue
-
-        time_col_found = True
-
-        try:
-            df[pm_time_columns[0]] = pd.to_datetime(df[pm_time_columns[0]], format='%Y-%m-%d %H:%M:%S', errors='coerce')
-        except Exception as e:
-            print(f"Błąd przy konwersji kolumny 'pm_time' w pliku {file}: {e}")
-            continue
-        
-        if min_time is None or df[pm_time_columns[0]].min() < min_time:
-            min_time = df[pm_time_columns[0]].min()
-        if max_time is None or df[pm_time_columns[0]].max() > max_time:
-            max_time = df[pm_time_columns[0]].max()
-
-        synced_dataframes.append(df)
-
-    if not time_col_found:
-        return None, None, None
-
-    for df in synced_dataframes:
-        pm_time_columns = [col for col in df.columns if 'pm_time' in col]
-        if len(pm_time_columns) > 0:
-            df['TimeDiff'] = (df[pm_time_columns[0]] - min_time).dt.total_seconds()
-
-    merged_df = pd.concat(synced_dataframes, axis=1) if synced_dataframes else None
-    
-    return merged_df, min_time, max_time
-
-# Funkcja do dodania prefiksów do nazw kolumn w DataFrame na podstawie nazwy pliku
-def add_prefix_to_columns(files_columns):
-    prefixed_dataframes = []
-    for file, df in files_columns:
-        prefix = os.path.splitext(os.path.basename(file))[0]
-        df.columns = [f"{prefix}_{col}" for col in df.columns]
-        prefixed_dataframes.append(df)
-    return prefixed_dataframes
+from loaders import read_columns, read_files
+from cache import default_cache_dir
+from timesync import RESAMPLE_METHODS
+from downsample import DOWNSAMPLE_METHODS, DEFAULT_MAX_POINTS
+from filters import parse_filter, time_range_filters
+from pipeline import (check_if_all_files_have_time_column, generate_filename, build_dashboard, write_figure_html,
+                      build_final_frame)
 
 # Funkcja do wybierania plików z różnych folderów
 def select_files_from_different_folders():
@@ -106,16 +49,7 @@ def select_files_from_different_folders():
 
     root.wait_window()
 
-    return [(file, read_file(file)) for file in selected_files] if selected_files else None
-
-def read_file(file):
-    if file.endswith('.csv'):
-        return pd.read_csv(file)
-    elif file.endswith(('.xls', '.xlsx')):
-        return pd.read_excel(file)
-    elif file.endswith('.dbf'):
-        dbf = Dbf5(file)
-        return dbf.to_dataframe()
+    return selected_files if selected_files else None
 
 # Funkcja wyboru formatu wyjściowego
 def select_output_format():
@@ -142,9 +76,80 @@ def select_output_format():
     format_window.wait_window()
     return output_format.get()
 
-# Nowa funkcja do wyboru kolumn z każdego pliku
-def select_columns_for_file(file, df):
-    columns = df.columns
+# Opcje synchronizacji plików po czasie: tolerancja dopasowania albo wspólna siatka (resampling)
+def select_sync_options():
+    window = tk.Toplevel()
+    window.title("Synchronizacja po czasie")
+
+    tolerance = tk.StringVar(value='5')
+    resample = tk.StringVar(value='')
+    how = tk.StringVar(value='mean')
+    result = {}
+
+    def submit_options():
+        try:
+            result['tolerance'] = float(tolerance.get()) if tolerance.get().strip() else None
+            result['resample'] = resample.get().strip() or None
+            if result['resample']:
+                pd.tseries.frequencies.to_offset(result['resample'])
+        except ValueError:
+            messagebox.showwarning("Ostrzeżenie", "Tolerancja to liczba sekund, a krok siatki np. 1s, 10s, 1min.")
+            return
+        result['how'] = how.get()
+        window.destroy()
+
+    tk.Label(window, text="Tolerancja dopasowania próbek [s] (puste = bez limitu):").pack(anchor=tk.W)
+    tk.Entry(window, textvariable=tolerance, width=10).pack(anchor=tk.W)
+    tk.Label(window, text="Wspólna siatka czasu, np. 1s / 1min (puste = bez resamplingu):").pack(anchor=tk.W)
+    tk.Entry(window, textvariable=resample, width=10).pack(anchor=tk.W)
+    tk.Label(window, text="Agregacja w przedziale siatki:").pack(anchor=tk.W)
+    for method in RESAMPLE_METHODS:
+        Radiobutton(window, text=method, variable=how, value=method).pack(anchor=tk.W)
+
+    Button(window, text="Zatwierdź", command=submit_options).pack(pady=10)
+
+    window.wait_window()
+    return result or {'tolerance': None, 'resample': None, 'how': 'mean'}
+
+# Okno filtrów wczytywania: zakres czasu (pm_time) i warunki na kolumnach, po jednym w wierszu
+# (np. TEMP > 80, STAN in 1, 2) – stosowane już przy czytaniu plików (filters.py)
+def select_filters():
+    window = tk.Toplevel()
+    window.title("Filtry wczytywania")
+
+    start = tk.StringVar(value='')
+    end = tk.StringVar(value='')
+    result = []
+
+    def submit_filters():
+        conditions = [line.strip() for line in conditions_text.get('1.0', tk.END).splitlines() if line.strip()]
+        try:
+            for value in (start.get().strip(), end.get().strip()):
+                if value:
+                    pd.Timestamp(value)
+            for condition in conditions:
+                parse_filter(condition)
+        except ValueError as e:
+            messagebox.showwarning("Ostrzeżenie", f"Niepoprawny filtr: {e}")
+            return
+        result.extend(time_range_filters(start.get().strip(), end.get().strip()) + conditions)
+        window.destroy()
+
+    tk.Label(window, text="Czas od (np. 2024-05-01 06:00, puste = od początku):").pack(anchor=tk.W)
+    tk.Entry(window, textvariable=start, width=25).pack(anchor=tk.W)
+    tk.Label(window, text="Czas do (puste = do końca):").pack(anchor=tk.W)
+    tk.Entry(window, textvariable=end, width=25).pack(anchor=tk.W)
+    tk.Label(window, text="Warunki, po jednym w wierszu (np. TEMP > 80, STAN in 1, 2):").pack(anchor=tk.W)
+    conditions_text = tk.Text(window, width=40, height=5)
+    conditions_text.pack(anchor=tk.W)
+
+    Button(window, text="Zatwierdź", command=submit_filters).pack(pady=10)
+
+    window.wait_window()
+    return result
+
+# Nowa funkcja do wyboru kolumn z każdego pliku (lista kolumn z samego nagłówka – read_columns)
+def select_columns_for_file(file, columns):
     selected_columns = []
 
     def select_all():
@@ -186,10 +191,6 @@ def select_columns_for_file(file, df):
 
     return selected_columns
 
-def generate_filename(prefix, extension, output_dir):
-    current_time = datetime.now().strftime("%Y%m%d_%H%M%S")
-    return os.path.join(output_dir, f"{prefix}_{current_time}.{extension}")
-
 def generate_plots(df, output_dir, files_columns):
     columns = df.columns
 
@@ -200,6 +201,10 @@ def generate_plots(df, output_dir, files_columns):
         selected_x_column = StringVar()
         selected_y_columns = []
         use_time_as_x = IntVar()
+        max_points = StringVar(value=str(DEFAULT_MAX_POINTS))
+        downsample_method = StringVar(value='minmax')
+        use_webgl = IntVar(value=1)
+        plot_options = {}
 
         def on_x_checkbox_selected(col, var):
             # Zablokuj wszystkie inne checkboxy dla osi X po wybraniu jednej kolumny
@@ -222,6 +227,13 @@ def generate_plots(df, output_dir, files_columns):
             if not selected_x_column.get() or not selected_y_columns:
                 messagebox.showwarning("Ostrzeżenie", "Wybierz kolumnę dla osi X i przynajmniej jedną kolumnę dla osi Y.")
                 return
+            try:
+                plot_options['max_points'] = int(max_points.get())
+            except ValueError:
+                messagebox.showwarning("Ostrzeżenie", "Liczba punktów musi być liczbą całkowitą.")
+                return
+            plot_options['method'] = downsample_method.get() or None
+            plot_options['use_webgl'] = bool(use_webgl.get())
             plot_window.destroy()
 
         # Kolumny dla osi X
@@ -259,28 +271,36 @@ def generate_plots(df, output_dir, files_columns):
         if not enable_time_checkbox:
             time_checkbox.config(state=DISABLED)
 
+        tk.Label(options_frame, text="Maks. punktów na serię:").pack(anchor=tk.W, pady=(10, 0))
+        tk.Entry(options_frame, textvariable=max_points, width=10).pack(anchor=tk.W)
+        for method, label in zip(DOWNSAMPLE_METHODS, ("Min-max (zachowuje szpilki)", "LTTB (kształt przebiegu)")):
+            Radiobutton(options_frame, text=label, variable=downsample_method, value=method).pack(anchor=tk.W)
+        Radiobutton(options_frame, text="Bez redukcji", variable=downsample_method, value='').pack(anchor=tk.W)
+        Checkbutton(options_frame, text="WebGL (Scattergl) dla dużych serii", variable=use_webgl).pack(anchor=tk.W)
+
         submit_button = Button(options_frame, text="Zatwierdź", command=submit_plot_columns)
         submit_button.pack(pady=20)
 
         plot_window.wait_window()
-        return selected_x_column.get(), selected_y_columns
+        return selected_x_column.get(), selected_y_columns, plot_options
 
     enable_time_checkbox = check_if_all_files_have_time_column(files_columns)
+    panels = []
     while True:
-        generate_more = messagebox.askyesno("Generowanie wykresu", "Czy chcesz wygenerować wykres?")
+        generate_more = messagebox.askyesno("Generowanie wykresu", "Czy chcesz dodać wykres do zestawienia?")
         if not generate_more:
             break
 
-        x_col, y_cols = select_columns_for_plot(enable_time_checkbox)
-
+        x_col, y_cols, plot_options = select_columns_for_plot(enable_time_checkbox)
         if x_col and y_cols:
-                fig = go.Figure()
-                for y_col in y_cols:
-                    fig.add_trace(go.Scatter(x=df[x_col], y=df[y_col], mode='lines', name=y_col))
-                fig.update_layout(title='Wykres dynamiczny', xaxis_title=x_col, yaxis_title="Wartość")
-                plot_path_html = os.path.join(output_dir, "wykres.html")
-                pio.write_html(fig, file=plot_path_html, auto_open=False)
-                messagebox.showinfo("Informacja", "Wykres został pomyślnie wygenerowany.")  
+            panels.append({'x_col': x_col, 'y_cols': y_cols, **plot_options})
+
+    # wszystkie wykresy sesji w jednym pliku HTML – panele jeden pod drugim, ze wspólną osią X
+    if panels:
+        fig = build_dashboard(df, panels)
+        plot_path_html = generate_filename("wykresy", "html", output_dir)
+        write_figure_html(fig, plot_path_html)
+        messagebox.showinfo("Informacja", f"Zestawienie wykresów zapisano w pliku:\n{plot_path_html}")
 
 def main():
     root = tk.Tk()
@@ -291,23 +311,29 @@ def main():
         messagebox.showerror("Błąd", "Nie wybrano folderu. Proces został przerwany.")
         return
 
-    files_columns = select_files_from_different_folders()
-    if files_columns is None:
+    selected_files = select_files_from_different_folders()
+    if selected_files is None:
         return
 
-    # Wybór kolumn dla każdego pliku
-    for i, (file, df) in enumerate(files_columns):
-        selected_columns = select_columns_for_file(file, df)
-        files_columns[i] = (file, df[selected_columns])
+    # Wybór kolumn dla każdego pliku – na podstawie samych nagłówków, dane nie są jeszcze wczytane
+    usecols = {file: select_columns_for_file(file, read_columns(file)) for file in selected_files}
 
-    if check_if_all_files_have_time_column(files_columns):
-        merged_df, min_time, max_time = synchronize_dbf_data(files_columns)
-    else:
-        dataframes = [df for _, df in files_columns]
-        merged_df = pd.concat(dataframes, axis=1)
+    # Opcjonalny zakres czasu / warunki – wczytywane są tylko pasujące wiersze
+    filters = select_filters()
+
+    # Wczytanie równoległe tylko wybranych kolumn, ze zmniejszonymi typami (float32, category)
+    # ... przez cache Arrow IPC – ponowne wczytanie tych samych plików nie parsuje ich od nowa,
+    # ... z prefiksem pliku w nazwach kolumn już przy wczytaniu (szeroka ramka powstaje potem raz)
+    try:
+        files_columns = read_files(selected_files, usecols=usecols, compact=True, cache_dir=default_cache_dir(),
+                                   prefix=True, filters=filters)
+    except (ValueError, TypeError) as e:  # np. warunek nie pasujący do typu kolumny ('TEMP > abc')
+        messagebox.showerror("Błąd", f"Nie udało się wczytać plików z podanymi filtrami:\n{e}")
+        return
 
-    prefixed_dataframes = add_prefix_to_columns(files_columns)
-    final_df = pd.concat(prefixed_dataframes, axis=1)
+    # dla samych plików DBF z 'pm_time' ramka jest wyrównana po czasie (opcje z okna synchronizacji)
+    sync_options = select_sync_options() if check_if_all_files_have_time_column(files_columns) else None
+    final_df = build_final_frame(files_columns, sync_options, prefixed=True)
 
     generate_plots(final_df, output_dir, files_columns)
     print("Proces zakończony.")